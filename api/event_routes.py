@@ -0,0 +1,57 @@
+import json
+from flask import Blueprint, Response, request, jsonify
+from utils.stream_registry import registry
+
+event_bp = Blueprint('events', __name__)
+
+# Seconds a feed connection waits for an event before sending a keep-alive
+KEEPALIVE_INTERVAL = 15
+# Client reconnect delay advertised to EventSource, in milliseconds
+RECONNECT_DELAY_MS = 3000
+
+def format_event(event):
+    """One Server-Sent Events message"""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+@event_bp.route('/events', methods=['GET'])
+def stream_events():
+    """
+    Change feed of overlay and stream events as Server-Sent Events.
+    Reconnecting clients resume after the Last-Event-ID header (or the
+    last_event_id query parameter); 'resync' means events were missed and
+    full state must be re-fetched. types=overlay,stream filters by prefix.
+    """
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Last-Event-ID must be an integer'
+        }), 400
+    prefixes = tuple(f'{prefix}.' for prefix in request.args.get('types', '').split(',') if prefix)
+
+    def generate(cursor):
+        yield f'retry: {RECONNECT_DELAY_MS}\n\n'
+        while True:
+            events, resync, cursor = registry.events_since(cursor, KEEPALIVE_INTERVAL)
+            if resync:
+                yield f'id: {cursor}\nevent: resync\ndata: {{}}\n\n'
+                continue
+            matching = [event for event in events if not prefixes or event['type'].startswith(prefixes)]
+            for event in matching:
+                yield format_event(event)
+            if events and not matching:
+                # Advance the client's resume point past filtered-out events
+                yield f'id: {cursor}\n\n'
+            elif not events:
+                # Keeps proxies from closing the idle connection
+                yield ': keep-alive\n\n'
+
+    if last_id is None:
+        # New subscriber: start at the current head
+        _, _, last_id = registry.events_since(None)
+    response = Response(generate(last_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,228 @@
+import os
+import time
+from flask import Blueprint, Response, request, jsonify, send_from_directory
+from models import StreamSettings
+from sqlalchemy.exc import SQLAlchemyError
+from utils.on_demand import on_demand
+from utils.stream_registry import registry
+from utils.segment_cache import segment_cache
+from utils.gop_cache import gop_cache
+from utils.ll_hls import LLPlaylistBuilder, LL_INIT_NAME, wait_for_fragment
+from utils.rtsp_handler import LL_SEGMENT_DURATION, LL_PART_DURATION
+
+hls_bp = Blueprint('hls', __name__)
+
+MIME_TYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.ts': 'video/mp2t',
+    '.m4s': 'video/iso.segment',
+    '.mp4': 'video/mp4'
+}
+
+PLAYLIST_CACHE_CONTROL = 'public, max-age=1'
+SEGMENT_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Low-latency segments grow while parts are fetched from them
+LL_MEDIA_CACHE_CONTROL = 'no-cache'
+
+# How far ahead of the live edge a blocking playlist request may ask
+BLOCKING_RELOAD_MAX_AHEAD = 2
+# How long a fast-start request for a cold stream waits for its first GOP
+FAST_START_TIMEOUT = 10
+
+def _cached_response(entry, mimetype, cache_control):
+    """Response from an in-memory entry with ETag and Range support"""
+    response = Response(entry['data'], mimetype=mimetype)
+    response.headers['Cache-Control'] = cache_control
+    response.set_etag(entry['etag'])
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(entry['data']))
+
+def _wait_for_sequence(path, msn):
+    """
+    Blocking playlist reload: hold the request until the playlist contains
+    media sequence msn. Returns the playlist entry, or an error response.
+    """
+    entry = segment_cache.get_playlist(path)
+    if entry is None:
+        return None
+    if msn > entry['last_sequence'] + BLOCKING_RELOAD_MAX_AHEAD:
+        return jsonify({
+            'success': False,
+            'error': '_HLS_msn is too far ahead of the live edge'
+        }), 400
+
+    deadline = time.time() + 3 * (entry['target_duration'] or 2)
+    while entry['last_sequence'] < msn:
+        if time.time() >= deadline:
+            return jsonify({
+                'success': False,
+                'error': 'Timed out waiting for the requested segment'
+            }), 503
+        time.sleep(0.1)
+        entry = segment_cache.get_playlist(path) or entry
+    return entry
+
+def not_started_response(stream_key):
+    """503 for a stream whose playlist is not available yet, or was not admitted"""
+    rejection = registry.start_error(stream_key)
+    response = jsonify({
+        'success': False,
+        'error': rejection['error'] if rejection else 'Stream is starting, retry shortly'
+    })
+    response.headers['Retry-After'] = str(rejection['retry_after'] if rejection else 1)
+    return response, 503
+
+def _serve_ll_playlist(directory, stream_key):
+    """LL-HLS playlist generated from the CMAF parts on disk"""
+    builder = LLPlaylistBuilder(directory, LL_SEGMENT_DURATION, LL_PART_DURATION)
+    msn = request.args.get('_HLS_msn', type=int)
+    part = request.args.get('_HLS_part', type=int)
+    if msn is not None:
+        edge = builder.live_edge()
+        if edge and msn > edge[0] + BLOCKING_RELOAD_MAX_AHEAD:
+            return jsonify({
+                'success': False,
+                'error': '_HLS_msn is too far ahead of the live edge'
+            }), 400
+        if not builder.wait_for_part(msn, part, timeout=3 * LL_SEGMENT_DURATION):
+            return jsonify({
+                'success': False,
+                'error': 'Timed out waiting for the requested part'
+            }), 503
+
+    playlist = builder.build()
+    if playlist is None:
+        return not_started_response(stream_key)
+
+    response = Response(playlist, mimetype=MIME_TYPES['.m3u8'])
+    response.headers['Cache-Control'] = PLAYLIST_CACHE_CONTROL
+    response.add_etag()
+    return response.make_conditional(request)
+
+def _serve_ll_media(directory, filename, mimetype):
+    """
+    CMAF init segment or (part of) a segment. A preload-hint request
+    (bytes=N-) for bytes not yet written is held until that fragment is
+    complete and answered with exactly the rest of that fragment, never
+    with whatever else the growing file holds by then.
+    """
+    byte_range = request.range
+    if filename != LL_INIT_NAME and byte_range and len(byte_range.ranges) == 1:
+        start, stop = byte_range.ranges[0]
+        if start is not None and start >= 0:
+            path = os.path.join(directory, filename)
+            fragment = wait_for_fragment(path, start, timeout=3 * LL_SEGMENT_DURATION)
+            if fragment and stop is None:
+                end = sum(fragment)
+                try:
+                    with open(path, 'rb') as f:
+                        f.seek(start)
+                        data = f.read(end - start)
+                except OSError:
+                    data = b''
+                if len(data) == end - start:
+                    response = Response(data, status=206, mimetype=mimetype)
+                    # The segment is still growing, so its total length is unknown
+                    response.headers['Content-Range'] = f'bytes {start}-{end - 1}/*'
+                    response.headers['Cache-Control'] = LL_MEDIA_CACHE_CONTROL
+                    return response
+    response = send_from_directory(directory, filename, mimetype=mimetype, conditional=True, etag=True)
+    response.headers['Cache-Control'] = LL_MEDIA_CACHE_CONTROL
+    return response
+
+@hls_bp.route('/<int:stream_id>/fast_start.mp4', methods=['GET'])
+def serve_fast_start(stream_id):
+    """
+    Newest GOP of a stream as a fragmented MP4 from memory, so a new viewer
+    renders a frame after one download instead of waiting for the player to
+    buffer a segment. A cold stream is started and the request is held
+    until its first segment is written.
+    """
+    key = str(stream_id)
+    registry.touch(key, request.remote_addr)
+    try:
+        stream = StreamSettings.query.get(stream_id)
+    except SQLAlchemyError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Database error: {str(e)}'
+        }), 500
+
+    if not stream or not stream.is_active:
+        return jsonify({
+            'success': False,
+            'error': 'Stream not found'
+        }), 404
+
+    registry.ensure_started(key, stream.rtsp_url, **stream.pipeline_options())
+    deadline = time.time() + FAST_START_TIMEOUT
+    entry = gop_cache.fast_start(key)
+    while entry is None:
+        if time.time() >= deadline or registry.start_error(key):
+            return not_started_response(key)
+        time.sleep(0.1)
+        entry = gop_cache.fast_start(key)
+
+    return _cached_response(entry, MIME_TYPES['.mp4'], 'no-cache')
+
+@hls_bp.route('/<int:stream_id>/<path:filename>', methods=['GET'])
+def serve_hls(stream_id, filename):
+    """Serve HLS playlists and segments, starting the stream on first request"""
+    key = str(stream_id)
+    registry.touch(key, request.remote_addr)
+    directory = on_demand.output_dir(key)
+    path = os.path.normpath(os.path.join(directory, filename))
+    if os.path.dirname(path) != os.path.normpath(directory):
+        return jsonify({
+            'success': False,
+            'error': 'File not found'
+        }), 404
+    mimetype = MIME_TYPES.get(os.path.splitext(filename)[1])
+
+    if filename.endswith('.m3u8'):
+        try:
+            stream = StreamSettings.query.get(stream_id)
+        except SQLAlchemyError as e:
+            return jsonify({
+                'success': False,
+                'error': f'Database error: {str(e)}'
+            }), 500
+
+        if not stream or not stream.is_active:
+            return jsonify({
+                'success': False,
+                'error': 'Stream not found'
+            }), 404
+
+        registry.ensure_started(key, stream.rtsp_url, **stream.pipeline_options())
+        if stream.low_latency:
+            on_demand.wait_for_playlist(key, filename=LL_INIT_NAME)
+            return _serve_ll_playlist(directory, key)
+
+        if not on_demand.wait_for_playlist(key):
+            return not_started_response(key)
+
+        msn = request.args.get('_HLS_msn', type=int)
+        if msn is not None:
+            entry = _wait_for_sequence(path, msn)
+        else:
+            entry = segment_cache.get_playlist(path)
+        if isinstance(entry, tuple):
+            return entry
+        if entry is None:
+            return jsonify({
+                'success': False,
+                'error': 'Playlist not found'
+            }), 404
+        return _cached_response(entry, mimetype, PLAYLIST_CACHE_CONTROL)
+
+    if mimetype in (MIME_TYPES['.m4s'], MIME_TYPES['.mp4']):
+        return _serve_ll_media(directory, filename, mimetype)
+
+    entry = segment_cache.get_segment(path)
+    if entry is not None:
+        return _cached_response(entry, mimetype, SEGMENT_CACHE_CONTROL)
+
+    # Cold segment: stream it from disk (sendfile through wsgi.file_wrapper)
+    response = send_from_directory(directory, filename, mimetype=mimetype, conditional=True, etag=True)
+    response.headers['Cache-Control'] = SEGMENT_CACHE_CONTROL
+    return response
@@ -0,0 +1,100 @@
+import os
+import re
+from flask import Blueprint, request, jsonify, redirect, send_file
+from utils.logo_assets import logo_assets, LOGO_URL_PREFIX, MAX_LOGO_BYTES
+
+logo_bp = Blueprint('logo', __name__)
+
+# Logo files never change under their content hash
+LOGO_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+def valid_asset_id(asset_id):
+    return re.match(r'^[0-9a-f]{64}$', asset_id) is not None
+
+def serve_logo(path):
+    response = send_file(path, mimetype='image/png', conditional=True, etag=True)
+    response.headers['Cache-Control'] = LOGO_CACHE_CONTROL
+    return response
+
+@logo_bp.route('/logos', methods=['POST'])
+def upload_logo():
+    """
+    Store a logo from a multipart 'file' upload or a JSON {'url'} to fetch
+    once. Returns its id and URL, usable as a logo overlay's content.
+    """
+    try:
+        upload = request.files.get('file')
+        if upload:
+            data = upload.read(MAX_LOGO_BYTES + 1)
+        else:
+            body = request.get_json(silent=True)
+            url = body.get('url') if isinstance(body, dict) else None
+            if not isinstance(url, str) or not url:
+                return jsonify({
+                    'success': False,
+                    'error': "Provide a multipart 'file' or a JSON 'url'"
+                }), 400
+            data = logo_assets.fetch(url)
+        if len(data) > MAX_LOGO_BYTES:
+            return jsonify({
+                'success': False,
+                'error': f'Logo is larger than {MAX_LOGO_BYTES // (1024 * 1024)} MB'
+            }), 413
+        info, created = logo_assets.ingest(data)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Unexpected error: {str(e)}'
+        }), 500
+
+    return jsonify({
+        'success': True,
+        'data': info,
+        'message': 'Logo stored successfully' if created else 'Logo already stored'
+    }), 201 if created else 200
+
+@logo_bp.route('/logos/<asset_id>', methods=['GET'])
+def get_logo(asset_id):
+    """The decoded logo at its original size"""
+    if not valid_asset_id(asset_id) or logo_assets.info(asset_id) is None:
+        return jsonify({
+            'success': False,
+            'error': 'Logo not found'
+        }), 404
+    return serve_logo(logo_assets.original_path(asset_id))
+
+@logo_bp.route('/logos/<asset_id>/info', methods=['GET'])
+def get_logo_info(asset_id):
+    """Size and URL of a stored logo"""
+    info = logo_assets.info(asset_id) if valid_asset_id(asset_id) else None
+    if info is None:
+        return jsonify({
+            'success': False,
+            'error': 'Logo not found'
+        }), 404
+    return jsonify({
+        'success': True,
+        'data': info
+    }), 200
+
+@logo_bp.route('/logos/<asset_id>/<int:width>x<int:height>.png', methods=['GET'])
+def get_logo_variant(asset_id, width, height):
+    """
+    The logo scaled to fit width x height (straight alpha, generated on
+    first request); redirects to the original when no variant can be made,
+    so the immutable variant URL never caches other bytes
+    """
+    if not valid_asset_id(asset_id) or logo_assets.info(asset_id) is None:
+        return jsonify({
+            'success': False,
+            'error': 'Logo not found'
+        }), 404
+    path = logo_assets.variant(asset_id, width, height)
+    if path is None or not os.path.exists(path):
+        return redirect(LOGO_URL_PREFIX + asset_id)
+    return serve_logo(path)
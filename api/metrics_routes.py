@@ -0,0 +1,97 @@
+import time
+from flask import Blueprint, Response
+from database import db
+from utils.metrics import metric_family, parse_progress_value, request_latency
+from utils.stream_registry import registry
+from utils.segment_cache import segment_cache
+
+metrics_bp = Blueprint('metrics', __name__)
+
+def stream_metric_lines() -> list:
+    """Encoder, process and segment metrics of every active stream"""
+    streams = registry.stream_metrics()
+    now = time.time()
+
+    def family(name, kind, help_text, value_fn):
+        samples = [({'stream_id': s['stream_id']}, value_fn(s)) for s in streams]
+        return metric_family(name, kind, help_text, samples)
+
+    def progress(key):
+        return lambda s: parse_progress_value(s['progress'].get(key))
+
+    def resource(key):
+        return lambda s: s['resources'][key] if s['resources'] else None
+
+    lines = metric_family(
+        'rtsp_stream_up', 'gauge', 'Active stream by supervisor state and encode mode',
+        [({'stream_id': s['stream_id'], 'state': s['state'], 'mode': s['mode']}, 1) for s in streams]
+    )
+    lines += family('rtsp_stream_encode_fps', 'gauge', 'Frames encoded per second', progress('fps'))
+    lines += family('rtsp_stream_encode_speed', 'gauge', 'Encoding speed relative to real time', progress('speed'))
+    lines += family('rtsp_stream_bitrate_kbps', 'gauge', 'Output bitrate in kbit/s', progress('bitrate'))
+    lines += family('rtsp_stream_frames_total', 'counter', 'Frames processed by the current ffmpeg process',
+                    progress('frame'))
+    lines += family('rtsp_stream_dropped_frames_total', 'counter', 'Frames dropped by the current ffmpeg process',
+                    progress('drop_frames'))
+    lines += family('rtsp_stream_duplicated_frames_total', 'counter',
+                    'Frames duplicated by the current ffmpeg process', progress('dup_frames'))
+    lines += family('rtsp_stream_cpu_seconds_total', 'counter', 'CPU time of the ffmpeg process',
+                    resource('cpu_seconds'))
+    lines += family('rtsp_stream_resident_memory_bytes', 'gauge', 'Resident memory of the ffmpeg process',
+                    resource('rss_bytes'))
+    lines += family('rtsp_stream_segment_interval_seconds', 'gauge',
+                    'Time between the last two playlist updates', lambda s: s['segment_interval'])
+    lines += family('rtsp_stream_segment_age_seconds', 'gauge', 'Time since the playlist was last updated',
+                    lambda s: now - s['last_segment_at'] if s['last_segment_at'] else None)
+    lines += family('rtsp_stream_restarts_total', 'counter', 'Supervisor restarts of the ffmpeg process',
+                    lambda s: s['restarts'])
+    return lines
+
+def scheduler_metric_lines() -> list:
+    """Admission control budget usage"""
+    status = registry.capacity()
+    return (
+        metric_family('rtsp_scheduler_core_budget', 'gauge', 'Cores available to ffmpeg encoders',
+                      [({}, status['core_budget'])])
+        + metric_family('rtsp_scheduler_cores_reserved', 'gauge', 'Cores reserved by admitted streams',
+                        [({}, status['cores_reserved'])])
+        + metric_family('rtsp_scheduler_queued', 'gauge', 'Stream starts waiting for capacity',
+                        [({}, status['queued'])])
+    )
+
+def pool_metric_lines() -> list:
+    """SQLAlchemy connection pool occupancy (QueuePool and compatible pools)"""
+    pool = db.engine.pool
+    lines = []
+    for name, attr, help_text in (
+        ('rtsp_db_pool_size', 'size', 'Configured connection pool size'),
+        ('rtsp_db_pool_checked_out', 'checkedout', 'Connections currently in use'),
+        ('rtsp_db_pool_checked_in', 'checkedin', 'Idle connections in the pool'),
+        ('rtsp_db_pool_overflow', 'overflow', 'Connections opened beyond the pool size')
+    ):
+        method = getattr(pool, attr, None)
+        if callable(method):
+            lines += metric_family(name, 'gauge', help_text, [({}, method())])
+    return lines
+
+def cache_metric_lines() -> list:
+    """In-memory HLS segment cache usage"""
+    stats = segment_cache.stats()
+    return (
+        metric_family('rtsp_segment_cache_bytes', 'gauge', 'Bytes held by the segment cache', [({}, stats['bytes'])])
+        + metric_family('rtsp_segment_cache_entries', 'gauge', 'Entries in the segment cache',
+                        [({}, stats['entries'])])
+        + metric_family('rtsp_segment_cache_hits_total', 'counter', 'Segment cache hits', [({}, stats['hits'])])
+        + metric_family('rtsp_segment_cache_misses_total', 'counter', 'Segment cache misses',
+                        [({}, stats['misses'])])
+    )
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of stream, process, API and database metrics"""
+    lines = stream_metric_lines() + scheduler_metric_lines() + request_latency.render() + cache_metric_lines()
+    try:
+        lines += pool_metric_lines()
+    except Exception as e:
+        print(f"Error reading connection pool stats: {e}")
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
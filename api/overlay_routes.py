@@ -1,19 +1,80 @@
 from flask import Blueprint, request, jsonify
 from database import db
 from models import Overlay
+from sqlalchemy import delete, update
 from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime
+import re
+from utils.stream_registry import registry
+from utils.list_cache import list_response
+from api.scene_routes import compositor_overlays
+from utils.logo_assets import logo_assets
 
 overlay_bp = Blueprint('overlay', __name__)
 
+# Largest batch accepted by POST /overlays/bulk
+MAX_BULK_OPERATIONS = 1000
+
+# Fields a create or update operation may set
+OVERLAY_FIELDS = ['name', 'type', 'content', 'x_position', 'y_position', 'width', 'height',
+                  'font_size', 'font_color', 'background_color', 'opacity', 'is_active']
+
+def validate_logo_content(content):
+    """Error message unless a logo's content is a stored logo or an http(s) URL, or None"""
+    if not content or logo_assets.asset_id(content) or re.match(r'^https?://[^\s/]+\S*$', content, re.IGNORECASE):
+        return None
+    return 'Logo content must be a stored logo URL (/api/logos/<id>) or an http(s) URL'
+
+def validate_overlay_fields(data, creating):
+    """Error message for invalid overlay fields, or None"""
+    unknown = [field for field in data if field not in OVERLAY_FIELDS]
+    if unknown:
+        return 'Unknown fields: ' + ', '.join(unknown)
+    if creating:
+        for field in ['name', 'type']:
+            if field not in data:
+                return f'Missing required field: {field}'
+    if 'name' in data and (not isinstance(data['name'], str) or not data['name'] or len(data['name']) > 100):
+        return 'Name must be a string of 1 to 100 characters'
+    if 'type' in data and data['type'] not in ['text', 'logo']:
+        return 'Overlay type must be either "text" or "logo"'
+    if data.get('content') is not None and not isinstance(data['content'], str):
+        return 'content must be a string'
+    if data.get('type') == 'logo' and 'content' in data:
+        error = validate_logo_content(data['content'])
+        if error:
+            return error
+    for field in ['font_color', 'background_color']:
+        value = data.get(field)
+        if value is None or (field == 'background_color' and value == 'transparent'):
+            continue
+        if not isinstance(value, str) or not re.match(r'^#[0-9A-Fa-f]{6}$', value):
+            return f'{field} must be a #RRGGBB color'
+    for field in ['x_position', 'y_position', 'width', 'height', 'opacity', 'font_size']:
+        if field in data and (isinstance(data[field], bool) or not isinstance(data[field], (int, float))):
+            return f'{field} must be a number'
+    if data.get('x_position', 0) < 0 or data.get('y_position', 0) < 0:
+        return 'Positions must not be negative'
+    if data.get('width', 1) <= 0 or data.get('height', 1) <= 0 or data.get('font_size', 1) <= 0:
+        return 'width, height and font_size must be positive'
+    if not 0 <= data.get('opacity', 1) <= 1:
+        return 'opacity must be between 0 and 1'
+    if 'is_active' in data and not isinstance(data['is_active'], bool):
+        return 'is_active must be a boolean'
+    return None
+
+def sync_overlays():
+    """Push the committed overlay set to streams that burn overlays in server-side"""
+    registry.update_overlays(compositor_overlays())
+
 @overlay_bp.route('/overlays', methods=['GET'])
 def get_overlays():
-    """Get all overlays"""
+    """
+    Get overlays. Supports fields=, updated_since= (delta with deleted ids),
+    after=/limit= keyset pages, and If-None-Match against the version ETag.
+    """
     try:
-        overlays = Overlay.query.all()
-        return jsonify({
-            'success': True,
-            'data': [overlay.to_dict() for overlay in overlays]
-        }), 200
+        return list_response('overlays', Overlay, Overlay.to_dict, Overlay.__table__.columns.keys())
     except SQLAlchemyError as e:
         return jsonify({
             'success': False,
@@ -63,6 +124,14 @@ def create_overlay():
                 'error': 'Overlay type must be either "text" or "logo"'
             }), 400
         
+        # Logos are only read from the asset store or http(s) URLs
+        error = validate_logo_content(data.get('content')) if data['type'] == 'logo' else None
+        if error:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
+        
         # Create new overlay
         overlay = Overlay(
             name=data['name'],
@@ -81,6 +150,9 @@ def create_overlay():
         
         db.session.add(overlay)
         db.session.commit()
+        registry.record_write('overlays')
+        sync_overlays()
+        registry.publish('overlay.created', overlay.to_dict())
         
         return jsonify({
             'success': True,
@@ -113,6 +185,15 @@ def update_overlay(overlay_id):
         
         data = request.get_json()
         
+        # Logos are only read from the asset store or http(s) URLs
+        if data.get('type', overlay.type) == 'logo':
+            error = validate_logo_content(data.get('content', overlay.content))
+            if error:
+                return jsonify({
+                    'success': False,
+                    'error': error
+                }), 400
+        
         # Update overlay fields
         for field in ['name', 'type', 'content', 'x_position', 'y_position', 
                      'width', 'height', 'font_size', 'font_color', 
@@ -128,6 +209,9 @@ def update_overlay(overlay_id):
             }), 400
         
         db.session.commit()
+        registry.record_write('overlays')
+        sync_overlays()
+        registry.publish('overlay.updated', overlay.to_dict())
         
         return jsonify({
             'success': True,
@@ -160,6 +244,9 @@ def delete_overlay(overlay_id):
         
         db.session.delete(overlay)
         db.session.commit()
+        registry.record_write('overlays', deleted_ids=[overlay_id])
+        sync_overlays()
+        registry.publish('overlay.deleted', {'id': overlay_id})
         
         return jsonify({
             'success': True,
@@ -177,3 +264,113 @@ def delete_overlay(overlay_id):
             'success': False,
             'error': f'Unexpected error: {str(e)}'
         }), 500
+
+@overlay_bp.route('/overlays/bulk', methods=['POST'])
+def bulk_overlays():
+    """
+    Apply a batch of create/update/delete operations in one transaction.
+    Every operation is validated before anything is written; updates and
+    deletes run as batched statements and one overlay.bulk event is sent.
+    """
+    try:
+        data = request.get_json()
+        operations = data.get('operations') if isinstance(data, dict) else None
+        if not isinstance(operations, list) or not operations:
+            return jsonify({
+                'success': False,
+                'error': 'Provide a non-empty operations list'
+            }), 400
+        
+        if len(operations) > MAX_BULK_OPERATIONS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {MAX_BULK_OPERATIONS} operations per batch'
+            }), 400
+        
+        # Validate the whole batch up front
+        errors = []
+        creates, updates, deletes = [], {}, []
+        # Operation index of every id an update or delete targets
+        targets = {}
+        for index, operation in enumerate(operations):
+            op = operation.get('op') if isinstance(operation, dict) else None
+            fields = operation.get('data', {}) if isinstance(operation, dict) else None
+            overlay_id = operation.get('id') if isinstance(operation, dict) else None
+            if op not in ['create', 'update', 'delete']:
+                error = 'op must be one of: create, update, delete'
+            elif op != 'create' and (isinstance(overlay_id, bool) or not isinstance(overlay_id, int)):
+                error = 'id must be an integer'
+            elif op != 'create' and overlay_id in targets:
+                error = f'Overlay {overlay_id} appears more than once'
+            elif op != 'delete' and not isinstance(fields, dict):
+                error = 'data must be an object'
+            else:
+                error = None if op == 'delete' else validate_overlay_fields(fields, op == 'create')
+            if error:
+                errors.append({'index': index, 'error': error})
+            elif op == 'create':
+                creates.append(fields)
+            elif op == 'update':
+                updates[overlay_id] = fields
+                targets[overlay_id] = index
+            else:
+                deletes.append(overlay_id)
+                targets[overlay_id] = index
+        
+        if targets:
+            existing = {row.id: row for row in db.session.query(Overlay.id, Overlay.type, Overlay.content)
+                        .filter(Overlay.id.in_(list(targets)))}
+            errors += [{'index': index, 'error': 'Overlay not found'}
+                       for overlay_id, index in targets.items() if overlay_id not in existing]
+            # An update may turn an overlay into a logo, or change a logo's content
+            for overlay_id, fields in updates.items():
+                row = existing.get(overlay_id)
+                if row and fields.get('type', row.type) == 'logo':
+                    error = validate_logo_content(fields.get('content', row.content))
+                    if error:
+                        errors.append({'index': targets[overlay_id], 'error': error})
+        
+        if errors:
+            return jsonify({
+                'success': False,
+                'error': 'Batch rejected; no operations were applied',
+                'errors': sorted(errors, key=lambda item: item['index'])
+            }), 400
+        
+        # Apply everything in one transaction
+        now = datetime.utcnow()
+        created = [Overlay(**fields) for fields in creates]
+        db.session.add_all(created)
+        rows = [dict(fields, id=overlay_id, updated_at=now) for overlay_id, fields in updates.items()]
+        if rows:
+            db.session.execute(update(Overlay), rows)
+        if deletes:
+            db.session.execute(delete(Overlay).where(Overlay.id.in_(deletes)))
+        db.session.commit()
+        registry.record_write('overlays', deleted_ids=deletes)
+        sync_overlays()
+        
+        result = {
+            'created': [overlay.to_dict() for overlay in created],
+            'updated': [overlay.to_dict() for overlay in Overlay.query.filter(Overlay.id.in_(list(updates)))] if updates else [],
+            'deleted': deletes
+        }
+        registry.publish('overlay.bulk', result)
+        
+        return jsonify({
+            'success': True,
+            'data': result,
+            'message': f'{len(operations)} overlay operations applied'
+        }), 200
+        
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': f'Database error: {str(e)}'
+        }), 500
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Unexpected error: {str(e)}'
+        }), 500
@@ -0,0 +1,172 @@
+import math
+import os
+import time
+from datetime import datetime, timezone
+from flask import Blueprint, Response, request, jsonify, send_from_directory
+from models import StreamSettings
+from sqlalchemy.exc import SQLAlchemyError
+from utils.recorder import init_name, segment_name
+from utils.rtsp_handler import rtsp_handler
+
+recording_bp = Blueprint('recording', __name__)
+
+# Longest window one recording playlist may cover
+MAX_WINDOW_SECONDS = 24 * 3600
+# Window served when no start is given
+DEFAULT_WINDOW_SECONDS = 3600
+# Upper bound on playlist length, well above a full window of segments
+MAX_PLAYLIST_SEGMENTS = 20000
+# A gap longer than this between segments is marked as a discontinuity
+GAP_TOLERANCE_MS = 1000
+
+RECORDING_MIME_TYPES = {
+    '.m4s': 'video/iso.segment',
+    '.mp4': 'video/mp4'
+}
+# Recorded files never change once indexed
+RECORDING_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+def parse_time(name, default):
+    """Epoch seconds or ISO 8601 query parameter as epoch seconds; raises ValueError"""
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f'{name} must be epoch seconds or an ISO 8601 timestamp')
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+def format_time(timestamp_ms):
+    return datetime.fromtimestamp(timestamp_ms / 1000, timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+def find_stream(stream_id):
+    """(stream, error response)"""
+    try:
+        stream = StreamSettings.query.get(stream_id)
+    except SQLAlchemyError as e:
+        return None, (jsonify({
+            'success': False,
+            'error': f'Database error: {str(e)}'
+        }), 500)
+    if not stream:
+        return None, (jsonify({
+            'success': False,
+            'error': 'Stream not found'
+        }), 404)
+    return stream, None
+
+@recording_bp.route('/streams/<int:stream_id>/recording', methods=['GET'])
+def get_recording(stream_id):
+    """Recorded time range, segment count and disk usage of a stream"""
+    stream, error = find_stream(stream_id)
+    if error:
+        return error
+    return jsonify({
+        'success': True,
+        'data': {
+            'record': stream.record,
+            'recorded': rtsp_handler.recorder.summary(str(stream_id)),
+            'playlist_url': f'/api/streams/{stream_id}/recording.m3u8'
+        }
+    }), 200
+
+@recording_bp.route('/streams/<int:stream_id>/recording.m3u8', methods=['GET'])
+def get_recording_playlist(stream_id):
+    """
+    HLS playlist of the recording between start and end (epoch seconds or
+    ISO 8601; default: the last hour). A closed window is VOD; an explicit
+    start open to the live edge is an EVENT playlist that grows as segments
+    are recorded; without start the window slides like a live playlist.
+    Segments are located by binary search in the index, and a segment's
+    position in the index is its media sequence number.
+    """
+    stream, error = find_stream(stream_id)
+    if error:
+        return error
+
+    now = time.time()
+    try:
+        end = parse_time('end', None)
+        start = parse_time('start', (end or now) - DEFAULT_WINDOW_SECONDS)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    closed = end is not None and end <= now
+    if end is not None and end <= start:
+        return jsonify({
+            'success': False,
+            'error': 'end must be after start'
+        }), 400
+    if min(end or now, now) - start > MAX_WINDOW_SECONDS:
+        return jsonify({
+            'success': False,
+            'error': f'At most {MAX_WINDOW_SECONDS // 3600} hours per playlist'
+        }), 400
+
+    index = rtsp_handler.recorder.index(str(stream_id))
+    end_ms = round(end * 1000) if end is not None else round((now + MAX_WINDOW_SECONDS) * 1000)
+    first = index.find(round(start * 1000))
+    segments = list(index.window(round(start * 1000), end_ms, MAX_PLAYLIST_SEGMENTS))
+    if not segments:
+        return jsonify({
+            'success': False,
+            'error': 'Nothing recorded in this window'
+        }), 404
+
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:7',
+        f'#EXT-X-TARGETDURATION:{math.ceil(max(segment[1] for segment in segments) / 1000)}',
+        f'#EXT-X-MEDIA-SEQUENCE:{first}',
+    ]
+    if closed:
+        lines.append('#EXT-X-PLAYLIST-TYPE:VOD')
+    elif 'start' in request.args:
+        # A fixed start only ever appends segments
+        lines.append('#EXT-X-PLAYLIST-TYPE:EVENT')
+    lines.append('#EXT-X-INDEPENDENT-SEGMENTS')
+    previous_init = None
+    previous_end = None
+    for start_ms, duration_ms, init_id, _, _ in segments:
+        discontinuity = previous_end is not None and (init_id != previous_init or
+                                                      start_ms - previous_end > GAP_TOLERANCE_MS)
+        if discontinuity:
+            lines.append('#EXT-X-DISCONTINUITY')
+        if init_id != previous_init:
+            lines.append(f'#EXT-X-MAP:URI="recording/{init_name(init_id)}"')
+        if previous_end is None or discontinuity:
+            lines.append(f'#EXT-X-PROGRAM-DATE-TIME:{format_time(start_ms)}')
+        lines.append(f'#EXTINF:{duration_ms / 1000:.3f},')
+        lines.append(f"recording/{segment_name(start_ms).replace(os.sep, '/')}")
+        previous_init, previous_end = init_id, start_ms + duration_ms
+    if closed:
+        lines.append('#EXT-X-ENDLIST')
+
+    response = Response('\n'.join(lines) + '\n', mimetype='application/vnd.apple.mpegurl')
+    # Retention eventually removes old segments, so even closed windows are cached briefly
+    response.headers['Cache-Control'] = 'public, max-age=60' if closed else 'no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+@recording_bp.route('/streams/<int:stream_id>/recording/<path:filename>', methods=['GET'])
+def get_recording_file(stream_id, filename):
+    """Recorded segment or init segment, with Range support"""
+    mimetype = RECORDING_MIME_TYPES.get(os.path.splitext(filename)[1])
+    if mimetype is None:
+        return jsonify({
+            'success': False,
+            'error': 'File not found'
+        }), 404
+    response = send_from_directory(rtsp_handler.recorder.stream_dir(str(stream_id)), filename,
+                                   mimetype=mimetype, conditional=True, etag=True)
+    response.headers['Cache-Control'] = RECORDING_CACHE_CONTROL
+    return response
@@ -0,0 +1,336 @@
+from flask import Blueprint, request, jsonify
+from database import db
+from models import Overlay, Scene
+from sqlalchemy import update
+from sqlalchemy.exc import SQLAlchemyError
+from utils.list_cache import ListCache, list_response
+from utils.stream_registry import registry
+
+scene_bp = Blueprint('scene', __name__)
+
+# Compiled scene renders, keyed by scene and the overlay/scene write versions
+render_cache = ListCache(max_entries=64)
+
+def compile_scene(scene, overlays_by_id, version):
+    """
+    Render description of a scene: its overlays in stacking order, all
+    visible. Browsers draw it as-is; ids missing since deletion are skipped.
+    """
+    return {
+        'scene_id': scene.id,
+        'name': scene.name,
+        'version': version,
+        'overlays': [dict(overlays_by_id[overlay_id], is_active=True)
+                     for overlay_id in scene.overlay_ids or [] if overlay_id in overlays_by_id]
+    }
+
+def scene_render(scene_id):
+    """Cached render description of a scene, or None if it does not exist"""
+    versions = (registry.collection_version('scenes'), registry.collection_version('overlays'))
+    key = ('render', scene_id) + versions
+    render = render_cache.get(key)
+    if render is None:
+        scene = Scene.query.get(scene_id)
+        if not scene:
+            return None
+        overlays = Overlay.query.filter(Overlay.id.in_(scene.overlay_ids or [])).all() if scene.overlay_ids else []
+        render = compile_scene(scene, {overlay.id: overlay.to_dict() for overlay in overlays}, '%d-%d' % versions)
+        render_cache.put(key, render)
+    return render
+
+def active_render():
+    """Render description of the active scene, or None when no scene is active"""
+    key = ('active', registry.collection_version('scenes'))
+    entry = render_cache.get(key)
+    if entry is None:
+        scene = Scene.query.filter_by(is_active=True).first()
+        entry = {'scene_id': scene.id if scene else None}
+        render_cache.put(key, entry)
+    return scene_render(entry['scene_id']) if entry['scene_id'] is not None else None
+
+def compositor_overlays():
+    """
+    Overlay rows for server-side burn-in. With a scene active, every overlay
+    stays in the filter graph and only its enable flag follows scene
+    membership, so switching scenes is a hot update rather than a restart.
+    """
+    overlays = [overlay.to_dict() for overlay in Overlay.query.all()]
+    render = active_render()
+    if render is None:
+        return overlays
+    visible = {overlay['id'] for overlay in render['overlays']}
+    return [dict(overlay, is_active=overlay['id'] in visible) for overlay in overlays]
+
+def validate_overlay_ids(overlay_ids):
+    """Error message for an invalid overlay id list, or None"""
+    if not isinstance(overlay_ids, list) or any(isinstance(item, bool) or not isinstance(item, int)
+                                               for item in overlay_ids):
+        return 'overlay_ids must be a list of overlay ids'
+    if len(set(overlay_ids)) != len(overlay_ids):
+        return 'overlay_ids must not contain duplicates'
+    if overlay_ids:
+        existing = {row.id for row in db.session.query(Overlay.id).filter(Overlay.id.in_(overlay_ids))}
+        missing = [str(item) for item in overlay_ids if item not in existing]
+        if missing:
+            return 'Unknown overlays: ' + ', '.join(missing)
+    return None
+
+def scene_changed(event_type, data, active_changed, deleted_ids=()):
+    """Record a committed scene write and notify clients and encoders"""
+    registry.record_write('scenes', deleted_ids=list(deleted_ids))
+    if active_changed:
+        registry.update_overlays(compositor_overlays())
+    registry.publish(event_type, data)
+
+@scene_bp.route('/scenes', methods=['GET'])
+def get_scenes():
+    """Get scenes; supports the list parameters and ETags of /overlays"""
+    try:
+        return list_response('scenes', Scene, Scene.to_dict, Scene.__table__.columns.keys())
+    except SQLAlchemyError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Database error: {str(e)}'
+        }), 500
+
+@scene_bp.route('/scenes/active', methods=['GET'])
+def get_active_scene():
+    """Render description of the active scene (data is null when none is active)"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': active_render()
+        }), 200
+    except SQLAlchemyError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Database error: {str(e)}'
+        }), 500
+
+@scene_bp.route('/scenes/<int:scene_id>', methods=['GET'])
+def get_scene(scene_id):
+    """Get a specific scene by ID"""
+    try:
+        scene = Scene.query.get(scene_id)
+        if not scene:
+            return jsonify({
+                'success': False,
+                'error': 'Scene not found'
+            }), 404
+
+        return jsonify({
+            'success': True,
+            'data': scene.to_dict()
+        }), 200
+    except SQLAlchemyError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Database error: {str(e)}'
+        }), 500
+
+@scene_bp.route('/scenes/<int:scene_id>/render', methods=['GET'])
+def get_scene_render(scene_id):
+    """Precompiled render description of a scene, cached until it or its overlays change"""
+    try:
+        render = scene_render(scene_id)
+        if render is None:
+            return jsonify({
+                'success': False,
+                'error': 'Scene not found'
+            }), 404
+
+        return jsonify({
+            'success': True,
+            'data': render
+        }), 200
+    except SQLAlchemyError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Database error: {str(e)}'
+        }), 500
+
+@scene_bp.route('/scenes', methods=['POST'])
+def create_scene():
+    """Create a new scene"""
+    try:
+        data = request.get_json()
+
+        if not data.get('name'):
+            return jsonify({
+                'success': False,
+                'error': 'Missing required field: name'
+            }), 400
+
+        ids_error = validate_overlay_ids(data.get('overlay_ids', []))
+        if ids_error:
+            return jsonify({
+                'success': False,
+                'error': ids_error
+            }), 400
+
+        scene = Scene(name=data['name'], overlay_ids=data.get('overlay_ids', []))
+        db.session.add(scene)
+        db.session.commit()
+        scene_changed('scene.created', scene.to_dict(), active_changed=False)
+
+        return jsonify({
+            'success': True,
+            'data': scene.to_dict(),
+            'message': 'Scene created successfully'
+        }), 201
+
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': f'Database error: {str(e)}'
+        }), 500
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Unexpected error: {str(e)}'
+        }), 500
+
+@scene_bp.route('/scenes/<int:scene_id>', methods=['PUT'])
+def update_scene(scene_id):
+    """Rename a scene or replace its overlays"""
+    try:
+        scene = Scene.query.get(scene_id)
+        if not scene:
+            return jsonify({
+                'success': False,
+                'error': 'Scene not found'
+            }), 404
+
+        data = request.get_json()
+
+        if 'name' in data and not data['name']:
+            return jsonify({
+                'success': False,
+                'error': 'Scene name must not be empty'
+            }), 400
+
+        if 'overlay_ids' in data:
+            ids_error = validate_overlay_ids(data['overlay_ids'])
+            if ids_error:
+                return jsonify({
+                    'success': False,
+                    'error': ids_error
+                }), 400
+
+        for field in ['name', 'overlay_ids']:
+            if field in data:
+                setattr(scene, field, data[field])
+
+        db.session.commit()
+        scene_changed('scene.updated', scene.to_dict(), active_changed=scene.is_active)
+
+        return jsonify({
+            'success': True,
+            'data': scene.to_dict(),
+            'message': 'Scene updated successfully'
+        }), 200
+
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': f'Database error: {str(e)}'
+        }), 500
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Unexpected error: {str(e)}'
+        }), 500
+
+@scene_bp.route('/scenes/<int:scene_id>', methods=['DELETE'])
+def delete_scene(scene_id):
+    """Delete a scene; deleting the active scene returns to per-overlay visibility"""
+    try:
+        scene = Scene.query.get(scene_id)
+        if not scene:
+            return jsonify({
+                'success': False,
+                'error': 'Scene not found'
+            }), 404
+
+        was_active = scene.is_active
+        db.session.delete(scene)
+        db.session.commit()
+        scene_changed('scene.deleted', {'id': scene_id}, active_changed=was_active, deleted_ids=[scene_id])
+
+        return jsonify({
+            'success': True,
+            'message': 'Scene deleted successfully'
+        }), 200
+
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': f'Database error: {str(e)}'
+        }), 500
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Unexpected error: {str(e)}'
+        }), 500
+
+@scene_bp.route('/scenes/<int:scene_id>/activate', methods=['POST'])
+def activate_scene(scene_id):
+    """
+    Make a scene the only active one in a single UPDATE, so no reader ever
+    sees two scenes (or half of one) active. Clients get the whole render
+    in one scene.activated event.
+    """
+    try:
+        if not db.session.query(Scene.id).filter_by(id=scene_id).first():
+            return jsonify({
+                'success': False,
+                'error': 'Scene not found'
+            }), 404
+
+        db.session.execute(update(Scene).values(is_active=(Scene.id == scene_id)))
+        db.session.commit()
+        registry.record_write('scenes')
+        render = scene_render(scene_id)
+        registry.update_overlays(compositor_overlays())
+        registry.publish('scene.activated', render)
+
+        return jsonify({
+            'success': True,
+            'data': render,
+            'message': 'Scene activated'
+        }), 200
+
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': f'Database error: {str(e)}'
+        }), 500
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Unexpected error: {str(e)}'
+        }), 500
+
+@scene_bp.route('/scenes/deactivate', methods=['POST'])
+def deactivate_scenes():
+    """Return to per-overlay is_active visibility"""
+    try:
+        db.session.execute(update(Scene).where(Scene.is_active.is_(True)).values(is_active=False))
+        db.session.commit()
+        scene_changed('scene.deactivated', {}, active_changed=True)
+
+        return jsonify({
+            'success': True,
+            'message': 'Scenes deactivated'
+        }), 200
+
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': f'Database error: {str(e)}'
+        }), 500
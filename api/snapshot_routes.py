@@ -0,0 +1,159 @@
+import re
+from flask import Blueprint, Response, request, jsonify
+from models import StreamSettings
+from sqlalchemy.exc import SQLAlchemyError
+from api.hls_routes import not_started_response
+from utils.snapshots import snapshot_service, SNAPSHOT_FORMATS, MAX_SNAPSHOT_SIZE, MIN_SNAPSHOT_SIZE
+from utils.stream_registry import registry
+
+snapshot_bp = Blueprint('snapshot', __name__)
+
+# Mosaic limits
+MAX_MOSAIC_TILES = 100
+DEFAULT_TILE_WIDTH = 320
+
+# Snapshots change every segment; clients revalidate with the ETag
+SNAPSHOT_CACHE_CONTROL = 'no-cache'
+
+def parse_size(name):
+    """Optional pixel size query parameter; raises ValueError with a client-facing message"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        size = int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
+    if not MIN_SNAPSHOT_SIZE <= size <= MAX_SNAPSHOT_SIZE:
+        raise ValueError(f'{name} must be between {MIN_SNAPSHOT_SIZE} and {MAX_SNAPSHOT_SIZE}')
+    # Chroma subsampling needs even dimensions
+    return size - size % 2
+
+def parse_format():
+    fmt = request.args.get('format', 'jpeg').lower()
+    if fmt == 'jpg':
+        fmt = 'jpeg'
+    if fmt not in SNAPSHOT_FORMATS:
+        raise ValueError('format must be one of: ' + ', '.join(SNAPSHOT_FORMATS))
+    return fmt
+
+def image_response(entry, fmt):
+    response = Response(entry['data'], mimetype=SNAPSHOT_FORMATS[fmt][0])
+    response.headers['Cache-Control'] = SNAPSHOT_CACHE_CONTROL
+    response.set_etag(entry['etag'])
+    return response.make_conditional(request)
+
+def start_stream(stream):
+    """Keep the stream's ingest running (or start it) for its snapshots"""
+    key = str(stream.id)
+    registry.touch(key, request.remote_addr)
+    registry.ensure_started(key, stream.rtsp_url, **stream.pipeline_options())
+    return key
+
+@snapshot_bp.route('/streams/<int:stream_id>/snapshot', methods=['GET'])
+def get_snapshot(stream_id):
+    """
+    Latest keyframe of a stream as JPEG or WebP (format=jpeg|webp), scaled
+    to width and/or height. Decoded from the newest HLS segment of the
+    running ingest; starts the stream on demand like playback does.
+    """
+    try:
+        width, height, fmt = parse_size('width'), parse_size('height'), parse_format()
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    try:
+        stream = StreamSettings.query.get(stream_id)
+    except SQLAlchemyError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Database error: {str(e)}'
+        }), 500
+
+    if not stream or not stream.is_active:
+        return jsonify({
+            'success': False,
+            'error': 'Stream not found'
+        }), 404
+
+    key = start_stream(stream)
+    entry = snapshot_service.snapshot(key, width, height, fmt)
+    if entry is None:
+        return not_started_response(key)
+    return image_response(entry, fmt)
+
+@snapshot_bp.route('/streams/mosaic', methods=['GET'])
+def get_mosaic():
+    """
+    One image with the latest keyframes of many streams in a grid, for wall
+    views: ids=1,2,3 (default: all active streams), columns, tile_width and
+    format. Only running streams are shown; a read-only view never starts
+    one, so streams that are stopped or still starting are drawn black.
+    """
+    try:
+        fmt = parse_format()
+        tile_width = parse_size('tile_width') or DEFAULT_TILE_WIDTH
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    ids = [item.strip() for item in request.args.get('ids', '').split(',') if item.strip()]
+    # ASCII digits only: str.isdigit() and \d also accept other scripts' digits
+    if not all(re.fullmatch(r'[0-9]{1,18}', item) for item in ids):
+        return jsonify({
+            'success': False,
+            'error': 'ids must be a comma-separated list of stream ids'
+        }), 400
+    ids = [int(item) for item in ids]
+    columns = request.args.get('columns', type=int)
+
+    try:
+        query = StreamSettings.query.filter_by(is_active=True)
+        if ids:
+            query = query.filter(StreamSettings.id.in_(ids))
+        streams = {stream.id: stream for stream in query}
+    except SQLAlchemyError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Database error: {str(e)}'
+        }), 500
+
+    ordered = [streams[stream_id] for stream_id in ids if stream_id in streams] if ids else \
+        [streams[stream_id] for stream_id in sorted(streams)]
+    if not ordered:
+        return jsonify({
+            'success': False,
+            'error': 'No active streams to show'
+        }), 404
+
+    if len(ordered) > MAX_MOSAIC_TILES:
+        return jsonify({
+            'success': False,
+            'error': f'At most {MAX_MOSAIC_TILES} streams per mosaic'
+        }), 400
+
+    if not columns or columns < 1:
+        # Near-square grid
+        columns = 1
+        while columns * columns < len(ordered):
+            columns += 1
+    columns = min(columns, len(ordered))
+
+    keys = [str(stream.id) for stream in ordered]
+    state = registry.runtime_state(keys)
+    running = [key if state[key]['runtime'] else None for key in keys]
+    for key in running:
+        if key:
+            registry.touch(key, request.remote_addr)
+    entry = snapshot_service.mosaic(running, columns, tile_width, fmt)
+    if entry is None:
+        return jsonify({
+            'success': False,
+            'error': 'Could not compose the mosaic'
+        }), 500
+    return image_response(entry, fmt)
@@ -2,6 +2,12 @@ from flask import Blueprint, request, jsonify
 from database import db
 from models import StreamSettings
 from sqlalchemy.exc import SQLAlchemyError
+from utils.rtsp_handler import ENCODE_MODES, ABR_RUNGS
+from utils.stream_registry import registry
+from utils.scheduler import PRIORITY_CLASSES
+from utils.stream_jobs import JOB_ACTIONS
+from utils.list_cache import list_response
+from datetime import datetime
 import re
 
 stream_bp = Blueprint('stream', __name__)
@@ -11,21 +17,104 @@ def validate_rtsp_url(url):
     rtsp_pattern = r'^rtsp://[^\s]+$'
     return re.match(rtsp_pattern, url) is not None
 
+# Batch validation limits
+MAX_BATCH_URLS = 1000
+MAX_BATCH_WAIT = 60
+# Streams one lifecycle job may name explicitly
+MAX_JOB_STREAMS = 1000
+
+def validate_abr_ladder(ladder, low_latency):
+    """Error message for an invalid ABR ladder, or None"""
+    if ladder is None:
+        return None
+    if not isinstance(ladder, list) or not ladder or any(rung not in ABR_RUNGS for rung in ladder):
+        return 'ABR ladder must be a non-empty list of: ' + ', '.join(ABR_RUNGS)
+    if low_latency:
+        return 'ABR ladders are not supported for low-latency streams'
+    return None
+
+def runs_continuously(stream):
+    """Active pre-warmed or recorded streams are kept running without viewers"""
+    return bool(stream.is_active and (stream.prewarm or stream.record))
+
+def pipeline_state(stream):
+    """Settings a running pipeline was built from"""
+    return (stream.is_active, stream.prewarm, stream.record, stream.rtsp_url, stream.pipeline_options())
+
+def restart_pipeline(stream):
+    """Stop a stream's pipeline; start it again, pinned, if it runs continuously"""
+    key = str(stream.id)
+    registry.stop_stream(key)
+    if runs_continuously(stream):
+        registry.ensure_started(key, stream.rtsp_url, pinned=True, **stream.pipeline_options())
+    else:
+        registry.release(key)
+
+def persist_probe_results(results):
+    """Store completed probe results on every stream using the probed URLs"""
+    completed = {url: result for url, result in results.items() if result is not None}
+    if not completed:
+        return
+    for stream in StreamSettings.query.filter(StreamSettings.rtsp_url.in_(list(completed))):
+        result = completed[stream.rtsp_url]
+        stream.probe_result = {key: value for key, value in result.items() if key != 'probed_at'}
+        stream.probed_at = datetime.utcfromtimestamp(result['probed_at'])
+    db.session.commit()
+    registry.record_write('streams')
+
+def probe_status(rtsp_url, result):
+    """Per-URL entry of a validation response"""
+    if not validate_rtsp_url(rtsp_url):
+        return {'rtsp_url': rtsp_url, 'status': 'invalid', 'probe': None}
+    if result is None:
+        return {'rtsp_url': rtsp_url, 'status': 'pending', 'probe': None}
+    return {
+        'rtsp_url': rtsp_url,
+        'status': 'reachable' if result['reachable'] else 'unreachable',
+        'probe': result
+    }
+
+# Stream fields read from the encoder owner on every request instead of the database
+LIVE_STREAM_FIELDS = ('runtime', 'activity', 'start_error')
+
+def stored_stream_payload(stream):
+    """Serialize the stored part of a stream setting"""
+    data = stream.to_dict()
+    data['hls_url'] = f'/hls/{stream.id}/{stream.id}.m3u8'
+    return data
+
+def stream_payload(stream):
+    """Serialize a stream setting together with its live runtime state"""
+    data = stored_stream_payload(stream)
+    data['runtime'] = registry.get_stream_summary(str(stream.id))
+    data['activity'] = registry.get_activity(str(stream.id))
+    data['start_error'] = registry.start_error(str(stream.id))
+    return data
+
 @stream_bp.route('/streams', methods=['GET'])
 def get_streams():
-    """Get all stream settings"""
+    """
+    Get stream settings. Supports the same fields=/updated_since=/after=/limit=
+    parameters and ETags as the overlay list; live fields cost one registry call.
+    """
     try:
-        streams = StreamSettings.query.all()
-        return jsonify({
-            'success': True,
-            'data': [stream.to_dict() for stream in streams]
-        }), 200
+        return list_response('streams', StreamSettings, stored_stream_payload,
+                             StreamSettings.__table__.columns.keys() + ['hls_url'],
+                             live_fields=LIVE_STREAM_FIELDS, live_state=registry.runtime_state)
     except SQLAlchemyError as e:
         return jsonify({
             'success': False,
             'error': f'Database error: {str(e)}'
         }), 500
 
+@stream_bp.route('/streams/capacity', methods=['GET'])
+def get_capacity():
+    """Core budget of the transcode scheduler and current reservations"""
+    return jsonify({
+        'success': True,
+        'data': registry.capacity()
+    }), 200
+
 @stream_bp.route('/streams/<int:stream_id>', methods=['GET'])
 def get_stream(stream_id):
     """Get a specific stream by ID"""
@@ -39,7 +128,7 @@ def get_stream(stream_id):
         
         return jsonify({
             'success': True,
-            'data': stream.to_dict()
+            'data': stream_payload(stream)
         }), 200
     except SQLAlchemyError as e:
         return jsonify({
@@ -69,15 +158,49 @@ def create_stream():
                 'error': 'Invalid RTSP URL format. URL must start with rtsp://'
             }), 400
         
+        # Validate encode mode
+        if data.get('encode_mode', 'auto') not in ENCODE_MODES:
+            return jsonify({
+                'success': False,
+                'error': 'Encode mode must be one of: ' + ', '.join(ENCODE_MODES)
+            }), 400
+        
+        # Validate priority class
+        if data.get('priority', 'normal') not in PRIORITY_CLASSES:
+            return jsonify({
+                'success': False,
+                'error': 'Priority must be one of: ' + ', '.join(PRIORITY_CLASSES)
+            }), 400
+        
+        # Validate ABR ladder
+        ladder_error = validate_abr_ladder(data.get('abr_ladder'), data.get('low_latency', False))
+        if ladder_error:
+            return jsonify({
+                'success': False,
+                'error': ladder_error
+            }), 400
+        
         # Create new stream setting
         stream = StreamSettings(
             rtsp_url=data['rtsp_url'],
             stream_name=data['stream_name'],
-            is_active=data.get('is_active', True)
+            is_active=data.get('is_active', True),
+            encode_mode=data.get('encode_mode', 'auto'),
+            prewarm=data.get('prewarm', False),
+            low_latency=data.get('low_latency', False),
+            burn_overlays=data.get('burn_overlays', False),
+            priority=data.get('priority', 'normal'),
+            abr_ladder=data.get('abr_ladder'),
+            record=data.get('record', False),
+            motion_gate=data.get('motion_gate', False)
         )
         
         db.session.add(stream)
         db.session.commit()
+        registry.record_write('streams')
+        registry.publish('stream.created', stream.to_dict())
+        if runs_continuously(stream):
+            registry.ensure_started(str(stream.id), stream.rtsp_url, pinned=True, **stream.pipeline_options())
         
         return jsonify({
             'success': True,
@@ -117,12 +240,43 @@ def update_stream(stream_id):
                 'error': 'Invalid RTSP URL format. URL must start with rtsp://'
             }), 400
         
+        # Validate encode mode if provided
+        if 'encode_mode' in data and data['encode_mode'] not in ENCODE_MODES:
+            return jsonify({
+                'success': False,
+                'error': 'Encode mode must be one of: ' + ', '.join(ENCODE_MODES)
+            }), 400
+        
+        # Validate priority class if provided
+        if 'priority' in data and data['priority'] not in PRIORITY_CLASSES:
+            return jsonify({
+                'success': False,
+                'error': 'Priority must be one of: ' + ', '.join(PRIORITY_CLASSES)
+            }), 400
+        
+        # Validate ABR ladder against the resulting settings
+        ladder_error = validate_abr_ladder(data.get('abr_ladder', stream.abr_ladder),
+                                           data.get('low_latency', stream.low_latency))
+        if ladder_error:
+            return jsonify({
+                'success': False,
+                'error': ladder_error
+            }), 400
+        
         # Update stream fields
-        for field in ['rtsp_url', 'stream_name', 'is_active']:
+        previous_state = pipeline_state(stream)
+        for field in ['rtsp_url', 'stream_name', 'is_active', 'encode_mode', 'prewarm', 'low_latency',
+                      'burn_overlays', 'priority', 'abr_ladder', 'record', 'motion_gate']:
             if field in data:
                 setattr(stream, field, data[field])
         
         db.session.commit()
+        registry.record_write('streams')
+        registry.publish('stream.updated', stream.to_dict())
+        
+        # A running pipeline no longer matches its settings: rebuild or let it go
+        if pipeline_state(stream) != previous_state:
+            restart_pipeline(stream)
         
         return jsonify({
             'success': True,
@@ -155,6 +309,11 @@ def delete_stream(stream_id):
         
         db.session.delete(stream)
         db.session.commit()
+        registry.record_write('streams', deleted_ids=[stream_id])
+        registry.publish('stream.deleted', {'id': stream_id})
+        # Pre-warmed and recorded streams are pinned; nothing else would stop them
+        registry.stop_stream(str(stream_id))
+        registry.release(str(stream_id))
         
         return jsonify({
             'success': True,
@@ -175,7 +334,7 @@ def delete_stream(stream_id):
 
 @stream_bp.route('/streams/validate', methods=['POST'])
 def validate_stream():
-    """Validate an RTSP URL"""
+    """Validate an RTSP URL, optionally probing it with ffprobe"""
     try:
         data = request.get_json()
         
@@ -186,15 +345,212 @@ def validate_stream():
             }), 400
         
         is_valid = validate_rtsp_url(data['rtsp_url'])
-        
-        return jsonify({
+        response = {
             'success': True,
             'is_valid': is_valid,
             'message': 'RTSP URL is valid' if is_valid else 'RTSP URL format is invalid'
+        }
+        
+        if is_valid and data.get('probe'):
+            wait = min(float(data.get('wait', 15)), MAX_BATCH_WAIT)
+            results = registry.probe_many([data['rtsp_url']], timeout=wait,
+                                          force=bool(data.get('force')))
+            persist_probe_results(results)
+            response['probe'] = probe_status(data['rtsp_url'], results[data['rtsp_url']])
+        
+        return jsonify(response), 200
+        
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': f'Database error: {str(e)}'
+        }), 500
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Unexpected error: {str(e)}'
+        }), 500
+
+@stream_bp.route('/streams/validate/batch', methods=['POST'])
+def validate_streams_batch():
+    """
+    Probe many RTSP URLs concurrently. Accepts rtsp_urls and/or stream_ids;
+    waits up to 'wait' seconds and reports unfinished probes as pending, which
+    a repeated call collects from the cache.
+    """
+    try:
+        data = request.get_json()
+        
+        urls = list(data.get('rtsp_urls', []))
+        stream_ids = data.get('stream_ids', [])
+        if stream_ids:
+            streams = StreamSettings.query.filter(StreamSettings.id.in_(stream_ids)).all()
+            urls += [stream.rtsp_url for stream in streams]
+        urls = list(dict.fromkeys(urls))
+        
+        if not urls:
+            return jsonify({
+                'success': False,
+                'error': 'Provide rtsp_urls or stream_ids'
+            }), 400
+        
+        if len(urls) > MAX_BATCH_URLS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {MAX_BATCH_URLS} URLs per batch'
+            }), 400
+        
+        wait = min(float(data.get('wait', 15)), MAX_BATCH_WAIT)
+        valid_urls = [url for url in urls if validate_rtsp_url(url)]
+        results = registry.probe_many(valid_urls, timeout=wait, force=bool(data.get('force')))
+        persist_probe_results(results)
+        
+        entries = [probe_status(url, results.get(url)) for url in urls]
+        summary = {}
+        for entry in entries:
+            summary[entry['status']] = summary.get(entry['status'], 0) + 1
+        
+        return jsonify({
+            'success': True,
+            'data': entries,
+            'summary': summary
         }), 200
         
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': f'Database error: {str(e)}'
+        }), 500
     except Exception as e:
         return jsonify({
             'success': False,
             'error': f'Unexpected error: {str(e)}'
         }), 500
+
+def job_target(stream):
+    """What a lifecycle job needs to start a stream without the database"""
+    return {
+        'stream_id': str(stream.id),
+        'rtsp_url': stream.rtsp_url,
+        'options': stream.pipeline_options()
+    }
+
+def job_response(job):
+    """202 with the queued job; its status is polled at the Location"""
+    response = jsonify({
+        'success': True,
+        'data': job,
+        'message': f"{job['action'].capitalize()} job queued"
+    })
+    response.headers['Location'] = f"/api/streams/jobs/{job['id']}"
+    return response, 202
+
+@stream_bp.route('/streams/<int:stream_id>/<any(start, stop, restart):action>', methods=['POST'])
+def queue_stream_action(stream_id, action):
+    """Queue a start, stop or restart of one stream and return its job at once"""
+    try:
+        stream = StreamSettings.query.get(stream_id)
+        if not stream:
+            return jsonify({
+                'success': False,
+                'error': 'Stream not found'
+            }), 404
+
+        if action != 'stop' and not stream.is_active:
+            return jsonify({
+                'success': False,
+                'error': 'Stream is not active'
+            }), 400
+
+        return job_response(registry.submit_job(action, [job_target(stream)]))
+
+    except SQLAlchemyError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Database error: {str(e)}'
+        }), 500
+
+@stream_bp.route('/streams/jobs', methods=['POST'])
+def queue_streams_job():
+    """
+    Queue one action for many streams, which run concurrently. Without
+    stream_ids, start and restart cover every active stream and stop covers
+    every stream.
+    """
+    try:
+        data = request.get_json() or {}
+
+        action = data.get('action')
+        if action not in JOB_ACTIONS:
+            return jsonify({
+                'success': False,
+                'error': 'Action must be one of: ' + ', '.join(JOB_ACTIONS)
+            }), 400
+
+        stream_ids = data.get('stream_ids')
+        if stream_ids is None:
+            query = StreamSettings.query
+            if action != 'stop':
+                query = query.filter(StreamSettings.is_active.is_(True))
+            streams = query.all()
+        else:
+            if not isinstance(stream_ids, list) or any(isinstance(item, bool) or not isinstance(item, int)
+                                                       for item in stream_ids):
+                return jsonify({
+                    'success': False,
+                    'error': 'stream_ids must be a list of stream ids'
+                }), 400
+            if len(stream_ids) > MAX_JOB_STREAMS:
+                return jsonify({
+                    'success': False,
+                    'error': f'At most {MAX_JOB_STREAMS} streams per job'
+                }), 400
+
+            streams = StreamSettings.query.filter(StreamSettings.id.in_(stream_ids)).all()
+            found = {stream.id for stream in streams}
+            missing = [str(item) for item in dict.fromkeys(stream_ids) if item not in found]
+            if missing:
+                return jsonify({
+                    'success': False,
+                    'error': 'Unknown streams: ' + ', '.join(missing)
+                }), 404
+            inactive = [str(stream.id) for stream in streams if not stream.is_active]
+            if action != 'stop' and inactive:
+                return jsonify({
+                    'success': False,
+                    'error': 'Inactive streams: ' + ', '.join(inactive)
+                }), 400
+
+        return job_response(registry.submit_job(action, [job_target(stream) for stream in streams]))
+
+    except SQLAlchemyError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Database error: {str(e)}'
+        }), 500
+
+@stream_bp.route('/streams/jobs', methods=['GET'])
+def get_stream_jobs():
+    """Most recent lifecycle jobs, newest first, without per-stream results"""
+    limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+    return jsonify({
+        'success': True,
+        'data': registry.recent_jobs(limit)
+    }), 200
+
+@stream_bp.route('/streams/jobs/<job_id>', methods=['GET'])
+def get_stream_job(job_id):
+    """Progress and per-stream results of a lifecycle job"""
+    job = registry.get_job(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'data': job
+    }), 200
@@ -0,0 +1,105 @@
+"""
+Admission control under load.
+
+Publishes --streams synthetic RTSP sources (see synthetic_source.py) and
+starts a transcode of each through RTSPHandler with no admission queueing, so
+starts beyond the core budget are rejected. After a warm-up the ffmpeg
+-progress speed of every admitted stream is sampled; the run fails (exit
+status 1) if any admitted stream drops below real time.
+
+    python benchmarks/admission_load.py --streams 16 --duration 60 [--core-budget 6]
+
+Requires ffmpeg and, unless --rtsp-server is given, mediamtx on PATH. The
+publishers use CPU too; on small hosts point --rtsp-server at another machine.
+Prints a JSON report.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from synthetic_source import SyntheticRTSPSource  # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--streams', type=int, default=16, help='Synthetic streams to start')
+    parser.add_argument('--duration', type=float, default=60.0, help='Seconds to sample after warm-up')
+    parser.add_argument('--warmup', type=float, default=10.0, help='Seconds before sampling starts')
+    parser.add_argument('--core-budget', type=float, default=None, help='Override the scheduler core budget')
+    parser.add_argument('--rtsp-server', default=None, help='Existing RTSP server to publish to')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--min-speed', type=float, default=1.0, help='Real-time threshold')
+    args = parser.parse_args()
+
+    from utils.rtsp_handler import rtsp_handler
+    from utils.scheduler import AdmissionError, PRIORITY_CLASSES
+    if args.core_budget:
+        rtsp_handler.scheduler.configure(core_budget=args.core_budget)
+
+    workdir = tempfile.mkdtemp(prefix='admission-bench-')
+    sources = []
+    admitted, rejected = [], []
+    speeds = {}
+    try:
+        first = SyntheticRTSPSource(args.width, args.height, args.fps, server_url=args.rtsp_server,
+                                    path='synthetic0').start()
+        sources.append(first)
+        for index in range(1, args.streams):
+            sources.append(SyntheticRTSPSource(args.width, args.height, args.fps,
+                                               server_url=first.server_url, path=f'synthetic{index}').start())
+
+        for index, source in enumerate(sources):
+            stream_id = str(index)
+            # Mix priority classes so the per-class budget shares are exercised
+            priority = PRIORITY_CLASSES[index % len(PRIORITY_CLASSES)]
+            try:
+                rtsp_handler.start_hls_conversion(source.url, os.path.join(workdir, stream_id), stream_id,
+                                                  mode='transcode', priority=priority, admission_timeout=0)
+                admitted.append({'stream_id': stream_id, 'priority': priority})
+            except AdmissionError as e:
+                rejected.append({'stream_id': stream_id, 'priority': priority, 'error': str(e)})
+
+        time.sleep(args.warmup)
+        deadline = time.time() + args.duration
+        while time.time() < deadline:
+            for sample in rtsp_handler.stream_metrics():
+                speed = sample['progress'].get('speed', '').rstrip('x')
+                try:
+                    speeds.setdefault(sample['stream_id'], []).append(float(speed))
+                except ValueError:
+                    pass
+            time.sleep(1.0)
+        capacity = rtsp_handler.scheduler.status()
+    finally:
+        rtsp_handler.cleanup_all()
+        for source in sources:
+            source.stop()
+
+    below = {
+        stream_id: min(values) for stream_id, values in speeds.items()
+        if min(values) < args.min_speed
+    }
+    report = {
+        'benchmark': 'admission_load',
+        'resolution': f'{args.width}x{args.height}',
+        'fps': args.fps,
+        'core_budget': capacity['core_budget'],
+        'cores_reserved': capacity['cores_reserved'],
+        'requested': args.streams,
+        'admitted': len(admitted),
+        'rejected': len(rejected),
+        'min_speed': {stream_id: min(values) for stream_id, values in sorted(speeds.items())},
+        'below_real_time': below,
+        'rejections': rejected
+    }
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if below or len(speeds) < len(admitted) else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Glass-to-glass latency of the low-latency HLS mode.
+
+Publishes a synthetic stream (see synthetic_source.py), starts it through the
+app as a low_latency stream and follows the LL-HLS playlist like a player,
+using blocking reloads for the next part. For each part the last decoded
+frame number is mapped back to the time the source produced it.
+
+    python benchmarks/ll_hls_latency.py --duration 30 [--rtsp-server rtsp://host:8554]
+
+Requires ffmpeg and, unless --rtsp-server is given, mediamtx on PATH.
+Prints a JSON report.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from synthetic_source import SyntheticRTSPSource, last_frame_number  # noqa: E402
+
+_PART = re.compile(r'#EXT-X-PART:.*URI="([^"]+)",BYTERANGE="(\d+)@(\d+)"')
+_SEQUENCE = re.compile(r'#EXT-X-MEDIA-SEQUENCE:(\d+)')
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def parse_live_edge(playlist):
+    """(segment uri, msn, part index, end byte) of the newest part"""
+    first = int(_SEQUENCE.search(playlist).group(1))
+    segments = []
+    for line in playlist.splitlines():
+        match = _PART.match(line)
+        if match:
+            uri, length, offset = match.group(1), int(match.group(2)), int(match.group(3))
+            if not segments or segments[-1][0] != uri:
+                segments.append([uri, []])
+            segments[-1][1].append(offset + length)
+    uri, ends = segments[-1]
+    msn = first + sum(1 for line in playlist.splitlines() if line and not line.startswith('#'))
+    return uri, msn, len(ends) - 1, ends[-1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to measure')
+    parser.add_argument('--rtsp-server', default=None, help='Existing RTSP server to publish to')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=int, default=30)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='ll-hls-bench-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{workdir}/bench.db'
+    os.environ['HLS_OUTPUT_DIR'] = os.path.join(workdir, 'hls')
+
+    from main import create_app
+    from utils.rtsp_handler import rtsp_handler
+
+    with SyntheticRTSPSource(args.width, args.height, args.fps, server_url=args.rtsp_server) as source:
+        app = create_app()
+        client = app.test_client()
+        created = client.post('/api/streams', json={
+            'rtsp_url': source.url,
+            'stream_name': 'll-latency-bench',
+            'low_latency': True,
+            'encode_mode': 'transcode'
+        }).get_json()['data']
+        base = f"/hls/{created['id']}"
+        playlist_url = f"{base}/{created['id']}.m3u8"
+
+        requested_at = time.time()
+        first_part_at = None
+        latencies = []
+        next_msn = next_part = None
+        deadline = time.time() + args.duration
+        try:
+            while time.time() < deadline:
+                query = {}
+                if next_msn is not None:
+                    query = {'_HLS_msn': next_msn, '_HLS_part': next_part}
+                response = client.get(playlist_url, query_string=query)
+                observed_at = time.time()
+                if response.status_code != 200:
+                    time.sleep(0.2)
+                    continue
+                playlist = response.get_data(as_text=True)
+                if '#EXT-X-PART:' not in playlist:
+                    time.sleep(0.1)
+                    continue
+                first_part_at = first_part_at or observed_at
+
+                uri, msn, part, end = parse_live_edge(playlist)
+                init = client.get(f'{base}/init.mp4').get_data()
+                media = client.get(f'{base}/{uri}', headers={'Range': f'bytes=0-{end - 1}'}).get_data()
+                frame = last_frame_number(init + media, args.width, args.height)
+                if frame is not None:
+                    latencies.append(observed_at - source.frame_time(frame))
+                next_msn, next_part = msn, part + 1
+        finally:
+            rtsp_handler.cleanup_all()
+
+    report = {
+        'benchmark': 'll_hls_latency',
+        'resolution': f'{args.width}x{args.height}',
+        'fps': args.fps,
+        'parts_measured': len(latencies),
+        'time_to_first_part_s': round(first_part_at - requested_at, 3) if first_part_at else None,
+        'latency_s': {
+            'p50': round(statistics.median(latencies), 3),
+            'p95': round(percentile(latencies, 0.95), 3),
+            'max': round(max(latencies), 3)
+        } if latencies else None
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+"""
+End-to-end load benchmark: streams, HLS viewers and API clients at once.
+
+Publishes --streams synthetic RTSP sources (see synthetic_source.py), creates
+a stream for each through the API and starts it with
+RTSPHandler.start_hls_conversion. --viewers simulated players then follow
+the streams' HLS playlists (round-robin over streams), fetching every new
+segment, while --api-clients threads poll the JSON API. After a warm-up,
+for --duration seconds it samples:
+
+  encode      ffmpeg -progress speed per stream
+  resources   CPU cores (from CPU seconds over the run) and peak RSS per stream
+  segments    latency from the source producing a segment's last frame to a
+              viewer seeing the segment listed (every --latency-every segments)
+  requests    p50/p99 latency and throughput per request kind
+
+    python benchmarks/load_suite.py --streams 4 --viewers 40 --api-clients 8 \\
+        --duration 60 [--output report.json] [--rtsp-server rtsp://host:8554]
+
+Requires ffmpeg and, unless --rtsp-server is given, mediamtx on PATH. The
+publishers use CPU too; on small hosts point --rtsp-server at another machine.
+Prints a JSON report (also written to --output) and exits with status 1 if
+any stream's encoder drops below --min-speed.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from synthetic_source import SyntheticRTSPSource, last_frame_number  # noqa: E402
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def summarize(values):
+    if not values:
+        return None
+    return {
+        'count': len(values),
+        'p50': round(statistics.median(values), 4),
+        'p99': round(percentile(values, 0.99), 4),
+        'max': round(max(values), 4)
+    }
+
+class Samples:
+    """Thread-safe request samples, kept only while measuring"""
+
+    def __init__(self):
+        self.measuring = False
+        self.latencies = {}
+        self.errors = {}
+        self.bytes = 0
+        self.segment_latency = []
+        self._lock = threading.Lock()
+
+    def request(self, kind, elapsed, ok, size=0):
+        if not self.measuring:
+            return
+        with self._lock:
+            if ok:
+                self.latencies.setdefault(kind, []).append(elapsed)
+                self.bytes += size
+            else:
+                self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def segment(self, latency):
+        if self.measuring:
+            with self._lock:
+                self.segment_latency.append(latency)
+
+def timed_get(client, samples, kind, url):
+    started = time.time()
+    response = client.get(url)
+    data = response.get_data()
+    samples.request(kind, time.time() - started, response.status_code == 200, len(data))
+    return response.status_code, data
+
+def viewer(app, samples, stream, source, sample_latency, latency_every, width, height, stop):
+    """Follow a stream's HLS playlist like a player, fetching each new segment once"""
+    client = app.test_client()
+    playlist_url = f"/hls/{stream['id']}/{stream['id']}.m3u8"
+    base = playlist_url.rsplit('/', 1)[0]
+    fetched = set()
+    new_segments = 0
+    while not stop.is_set():
+        status, data = timed_get(client, samples, 'hls_playlist', playlist_url)
+        observed_at = time.time()
+        if status != 200:
+            time.sleep(0.5)
+            continue
+        target_duration = 2.0
+        for line in data.decode('utf-8', 'replace').splitlines():
+            if line.startswith('#EXT-X-TARGETDURATION:'):
+                target_duration = float(line.split(':', 1)[1])
+            elif line and not line.startswith('#') and line not in fetched:
+                status, segment = timed_get(client, samples, 'hls_segment', f'{base}/{line}')
+                fetched.add(line)
+                new_segments += 1
+                if status == 200 and sample_latency and new_segments % latency_every == 0:
+                    frame = last_frame_number(segment, width, height)
+                    if frame is not None:
+                        samples.segment(observed_at - source.frame_time(frame))
+        stop.wait(target_duration / 2)
+
+def api_client(app, samples, stream_ids, stop):
+    """Poll the read side of the JSON API in a fixed rotation"""
+    client = app.test_client()
+    urls = [('api_streams', '/api/streams'), ('api_overlays', '/api/overlays'),
+            ('api_active_scene', '/api/scenes/active')]
+    urls += [('api_stream', f'/api/streams/{stream_id}') for stream_id in stream_ids]
+    index = 0
+    while not stop.is_set():
+        kind, url = urls[index % len(urls)]
+        timed_get(client, samples, kind, url)
+        index += 1
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--streams', type=int, default=4, help='Synthetic streams to start')
+    parser.add_argument('--viewers', type=int, default=20, help='Simulated HLS players')
+    parser.add_argument('--api-clients', type=int, default=4, help='Threads polling the JSON API')
+    parser.add_argument('--duration', type=float, default=60.0, help='Seconds to measure after warm-up')
+    parser.add_argument('--warmup', type=float, default=15.0, help='Seconds before measuring starts')
+    parser.add_argument('--mode', choices=['copy', 'transcode'], default='transcode', help='Encode mode of every stream')
+    parser.add_argument('--latency-every', type=int, default=3, help='Decode every Nth segment for latency')
+    parser.add_argument('--core-budget', type=float, default=None, help='Override the scheduler core budget')
+    parser.add_argument('--rtsp-server', default=None, help='Existing RTSP server to publish to')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--min-speed', type=float, default=1.0, help='Real-time threshold')
+    parser.add_argument('--output', default=None, help='Also write the report to this file')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='load-bench-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{workdir}/bench.db'
+    os.environ['HLS_OUTPUT_DIR'] = os.path.join(workdir, 'hls')
+    os.environ['RECORDING_DIR'] = os.path.join(workdir, 'recordings')
+    # Viewers keep every stream busy, but never let the reaper interfere
+    os.environ['STREAM_IDLE_TIMEOUT'] = str(args.warmup + args.duration + 60)
+    if args.core_budget:
+        os.environ['TRANSCODE_CORE_BUDGET'] = str(args.core_budget)
+
+    from main import create_app
+    from utils.on_demand import on_demand
+    from utils.rtsp_handler import rtsp_handler
+    from utils.scheduler import AdmissionError
+
+    samples = Samples()
+    stop = threading.Event()
+    threads = []
+    sources = []
+    streams = []
+    rejected = []
+    speeds = {}
+    resources = {}
+    try:
+        first = SyntheticRTSPSource(args.width, args.height, args.fps, server_url=args.rtsp_server,
+                                    path='load0').start()
+        sources.append(first)
+        for index in range(1, args.streams):
+            sources.append(SyntheticRTSPSource(args.width, args.height, args.fps,
+                                               server_url=first.server_url, path=f'load{index}').start())
+
+        app = create_app()
+        client = app.test_client()
+        for index, source in enumerate(sources):
+            stream = client.post('/api/streams', json={
+                'rtsp_url': source.url,
+                'stream_name': f'load-bench-{index}',
+                'encode_mode': args.mode
+            }).get_json()['data']
+            stream_id = str(stream['id'])
+            try:
+                rtsp_handler.start_hls_conversion(source.url, on_demand.output_dir(stream_id), stream_id,
+                                                  mode=args.mode, admission_timeout=0)
+                streams.append((stream, source))
+            except AdmissionError as e:
+                rejected.append({'stream_id': stream_id, 'error': str(e)})
+
+        if streams:
+            for index in range(args.viewers):
+                stream, source = streams[index % len(streams)]
+                # The first viewer of each stream also decodes segments for latency
+                threads.append(threading.Thread(
+                    target=viewer, daemon=True,
+                    args=(app, samples, stream, source, index < len(streams), args.latency_every,
+                          args.width, args.height, stop)))
+        stream_ids = [stream['id'] for stream, _ in streams]
+        for _ in range(args.api_clients):
+            threads.append(threading.Thread(target=api_client, args=(app, samples, stream_ids, stop), daemon=True))
+        for thread in threads:
+            thread.start()
+
+        time.sleep(args.warmup)
+        started = {sample['stream_id']: sample['resources'] for sample in rtsp_handler.stream_metrics()}
+        samples.measuring = True
+        measure_started = time.time()
+        deadline = measure_started + args.duration
+        while time.time() < deadline:
+            for sample in rtsp_handler.stream_metrics():
+                speed = sample['progress'].get('speed', '').rstrip('x')
+                try:
+                    speeds.setdefault(sample['stream_id'], []).append(float(speed))
+                except ValueError:
+                    pass
+                if sample['resources']:
+                    resources.setdefault(sample['stream_id'], []).append(sample['resources'])
+            time.sleep(1.0)
+        samples.measuring = False
+        elapsed = time.time() - measure_started
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=10)
+        rtsp_handler.cleanup_all()
+        for source in sources:
+            source.stop()
+
+    per_stream = {}
+    for stream, _ in streams:
+        stream_id = str(stream['id'])
+        usage = resources.get(stream_id, [])
+        baseline = started.get(stream_id)
+        cpu = None
+        if usage and baseline:
+            cpu = round((usage[-1]['cpu_seconds'] - baseline['cpu_seconds']) / elapsed, 3)
+        per_stream[stream_id] = {
+            'speed_min': min(speeds[stream_id]) if stream_id in speeds else None,
+            'speed_mean': round(statistics.mean(speeds[stream_id]), 3) if stream_id in speeds else None,
+            'cpu_cores': cpu,
+            'rss_peak_mb': round(max(sample['rss_bytes'] for sample in usage) / 2 ** 20, 1) if usage else None
+        }
+    below = {stream_id: values['speed_min'] for stream_id, values in per_stream.items()
+             if values['speed_min'] is None or values['speed_min'] < args.min_speed}
+
+    report = {
+        'benchmark': 'load_suite',
+        'config': {
+            'streams': args.streams,
+            'viewers': args.viewers,
+            'api_clients': args.api_clients,
+            'mode': args.mode,
+            'resolution': f'{args.width}x{args.height}',
+            'fps': args.fps,
+            'duration_s': args.duration
+        },
+        'admitted': len(streams),
+        'rejected': rejected,
+        'streams': per_stream,
+        'segment_latency_s': summarize(samples.segment_latency),
+        'requests': {
+            kind: dict(summarize(values), per_second=round(len(values) / elapsed, 1))
+            for kind, values in sorted(samples.latencies.items())
+        },
+        'request_errors': samples.errors,
+        'throughput': {
+            'requests_per_second': round(sum(len(values) for values in samples.latencies.values()) / elapsed, 1),
+            'megabits_per_second': round(samples.bytes * 8 / elapsed / 1e6, 2)
+        },
+        'below_real_time': below
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    sys.exit(1 if below else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""
+Startup time and API throughput with embedded SQLite versus PostgreSQL.
+
+For each backend the app is started --starts times as a real HTTP server
+(a separate process, like a restart on an edge box) and timed from process
+spawn until GET /api/streams answers. The first start runs on an empty
+database and creates the schema (cold); later starts find it current (warm).
+The last server is then seeded with --rows overlays and streams, and
+--clients threads run a read-mostly API mix against it for --duration
+seconds (--write-ratio of requests update an overlay).
+
+Backends:
+  sqlite          sqlite:/// file in WAL mode with tuned pragmas
+  sqlite-untuned  the same file database with SQLite defaults (SQLITE_TUNING=0)
+  postgres        --postgres-url, or a throwaway local cluster when initdb and
+                  pg_ctl are on PATH; skipped otherwise
+
+    python benchmarks/startup.py --starts 5 --clients 8 --duration 20 \\
+        [--postgres-url postgresql://user@host/db] [--output report.json]
+
+The load generator shares the host with the server. PostgreSQL runs need
+psycopg2. Prints a JSON report (also written to --output).
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def summarize(values):
+    if not values:
+        return None
+    return {
+        'count': len(values),
+        'p50': round(statistics.median(values), 4),
+        'p99': round(percentile(values, 0.99), 4),
+        'max': round(max(values), 4)
+    }
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def serve(port):
+    """Child process: the app as a threaded HTTP server"""
+    sys.path.insert(0, ROOT)
+    from werkzeug.serving import make_server
+    from main import create_app
+    make_server('127.0.0.1', port, create_app(), threaded=True).serve_forever()
+
+def request(method, url, body=None, timeout=10):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+def start_server(env, timeout=30):
+    """(process, base URL, seconds from spawn until the API answers)"""
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(port)], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{port}'
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if request('GET', base + '/api/streams', timeout=1)[0] == 200:
+                return process, base, time.perf_counter() - started
+        except OSError:
+            pass
+        if process.poll() is not None:
+            break
+        time.sleep(0.005)
+    process.kill()
+    raise RuntimeError(f'Server did not come up within {timeout} s')
+
+def seed(base, rows):
+    """rows overlays (through bulk batches) and rows streams; returns their ids"""
+    overlay_ids = []
+    for offset in range(0, rows, 1000):
+        operations = [{'op': 'create', 'data': {'name': f'bench-{index}', 'type': 'text', 'content': 'LIVE',
+                                                'x_position': index % 1000, 'y_position': 20}}
+                      for index in range(offset, min(rows, offset + 1000))]
+        _, body = request('POST', base + '/api/overlays/bulk', {'operations': operations}, timeout=60)
+        overlay_ids += [overlay['id'] for overlay in json.loads(body)['data']['created']]
+    stream_ids = []
+    for index in range(rows):
+        _, body = request('POST', base + '/api/streams', {'rtsp_url': f'rtsp://camera-{index}.invalid/stream',
+                                                          'stream_name': f'bench-{index}'})
+        stream_ids.append(json.loads(body)['data']['id'])
+    return overlay_ids, stream_ids
+
+def client(base, overlay_ids, stream_ids, write_ratio, latencies, errors, lock, stop):
+    rng = random.Random()
+    while not stop.is_set():
+        if rng.random() < write_ratio:
+            kind, method = 'update_overlay', 'PUT'
+            url = f'{base}/api/overlays/{rng.choice(overlay_ids)}'
+            body = {'x_position': rng.randint(0, 1000)}
+        else:
+            method, body = 'GET', None
+            kind, url = rng.choice([
+                ('list_streams', f'{base}/api/streams?limit=50'),
+                ('list_overlays', f'{base}/api/overlays?limit=50'),
+                ('get_stream', f'{base}/api/streams/{rng.choice(stream_ids)}'),
+                ('get_overlay', f'{base}/api/overlays/{rng.choice(overlay_ids)}')
+            ])
+        started = time.perf_counter()
+        try:
+            status = request(method, url, body)[0]
+        except OSError:
+            status = None
+        elapsed = time.perf_counter() - started
+        with lock:
+            if status == 200:
+                latencies.setdefault(kind, []).append(elapsed)
+            else:
+                errors[kind] = errors.get(kind, 0) + 1
+
+def start_postgres(workdir):
+    """(stop function, URL) of a throwaway local cluster, or None without initdb/pg_ctl"""
+    if not (shutil.which('initdb') and shutil.which('pg_ctl')):
+        return None
+    data_dir = os.path.join(workdir, 'pgdata')
+    port = free_port()
+    subprocess.run(['initdb', '-D', data_dir, '-A', 'trust', '-U', 'postgres'], check=True,
+                   capture_output=True)
+    subprocess.run(['pg_ctl', '-D', data_dir, '-w', '-l', os.path.join(workdir, 'postgres.log'),
+                    '-o', f"-p {port} -k {workdir} -c listen_addresses=''", 'start'], check=True,
+                   capture_output=True)
+    subprocess.run(['createdb', '-h', workdir, '-p', str(port), '-U', 'postgres', 'bench'], check=True,
+                   capture_output=True)
+
+    def stop():
+        subprocess.run(['pg_ctl', '-D', data_dir, '-m', 'fast', 'stop'], capture_output=True)
+    return stop, f'postgresql://postgres@/bench?host={workdir}&port={port}'
+
+def run_backend(name, database_url, extra_env, args, workdir):
+    env = dict(os.environ, DATABASE_URL=database_url, HLS_OUTPUT_DIR=os.path.join(workdir, 'hls'),
+               RECORDING_DIR=os.path.join(workdir, 'recordings'), **extra_env)
+    env.pop('STREAM_SUPERVISOR_SOCKET', None)
+    starts = []
+    process = None
+    try:
+        for _ in range(args.starts):
+            if process:
+                process.terminate()
+                process.wait()
+            process, base, elapsed = start_server(env)
+            starts.append(elapsed)
+
+        overlay_ids, stream_ids = seed(base, args.rows)
+        latencies, errors = {}, {}
+        lock = threading.Lock()
+        stop = threading.Event()
+        threads = [threading.Thread(target=client, daemon=True,
+                                    args=(base, overlay_ids, stream_ids, args.write_ratio,
+                                          latencies, errors, lock, stop))
+                   for _ in range(args.clients)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=15)
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    total = sum(len(values) for values in latencies.values())
+    return {
+        'startup_s': {
+            'cold': round(starts[0], 4),
+            'warm': summarize(starts[1:])
+        },
+        'requests_per_second': round(total / args.duration, 1),
+        'requests': {kind: summarize(values) for kind, values in sorted(latencies.items())},
+        'errors': errors
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--starts', type=int, default=5, help='Server starts per backend; the first is cold')
+    parser.add_argument('--rows', type=int, default=500, help='Overlays and streams to seed')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent API client threads')
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds of API load per backend')
+    parser.add_argument('--write-ratio', type=float, default=0.1, help='Fraction of requests that update an overlay')
+    parser.add_argument('--backends', default='sqlite,sqlite-untuned,postgres', help='Comma-separated backends to run')
+    parser.add_argument('--postgres-url', default=None, help='Existing, empty PostgreSQL database to use')
+    parser.add_argument('--output', default=None, help='Also write the report to this file')
+    parser.add_argument('--serve', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve)
+        return
+    args.starts = max(2, args.starts)
+
+    workdir = tempfile.mkdtemp(prefix='startup-bench-')
+    results = {}
+    stop_postgres = None
+    try:
+        for name in args.backends.split(','):
+            if name in ('sqlite', 'sqlite-untuned'):
+                url = f"sqlite:///{os.path.join(workdir, name + '.db')}"
+                extra = {'SQLITE_TUNING': '0' if name == 'sqlite-untuned' else '1'}
+            elif name == 'postgres':
+                url = args.postgres_url
+                if url is None:
+                    cluster = start_postgres(workdir)
+                    if cluster is None:
+                        results[name] = {'skipped': 'no --postgres-url and no initdb/pg_ctl on PATH'}
+                        continue
+                    stop_postgres, url = cluster
+                extra = {}
+            else:
+                parser.error(f'Unknown backend: {name}')
+            results[name] = run_backend(name, url, extra, args, os.path.join(workdir, name))
+    finally:
+        if stop_postgres:
+            stop_postgres()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'benchmark': 'startup',
+        'config': {
+            'starts': args.starts,
+            'rows': args.rows,
+            'clients': args.clients,
+            'duration_s': args.duration,
+            'write_ratio': args.write_ratio
+        },
+        'backends': results
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+if __name__ == '__main__':
+    main()
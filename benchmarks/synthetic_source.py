@@ -0,0 +1,130 @@
+"""
+Local synthetic RTSP source for benchmarks.
+
+An ffmpeg testsrc2 pattern is published in real time to a local RTSP server
+(mediamtx, started here unless an existing server URL is given). The frame
+number is burned into the top-left corner as 32 black/white 16x16 blocks so
+a decoded frame can be mapped back to the wall-clock time it was produced.
+"""
+import shutil
+import socket
+import subprocess
+import time
+from typing import Optional
+
+CODE_BITS = 32
+CODE_BLOCK = 16
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _wait_for_port(port: int, timeout: float = 10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'RTSP server did not open port {port}')
+
+class SyntheticRTSPSource:
+    """
+    Context manager publishing a synthetic stream at self.url.
+    frame_time(n) gives the wall-clock time frame n was produced.
+    """
+
+    def __init__(self, width: int = 1280, height: int = 720, fps: int = 30, gop: Optional[int] = None,
+                 codec: str = 'libx264', server_url: Optional[str] = None, path: str = 'synthetic'):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.gop = gop or fps
+        self.codec = codec
+        self.server_url = server_url
+        self.path = path
+        self.url = None
+        self.started_at = None
+        self._server = None
+        self._publisher = None
+
+    def start(self):
+        if self.server_url is None:
+            server = shutil.which('mediamtx')
+            if not server:
+                raise RuntimeError('mediamtx not found on PATH; pass server_url of an RTSP server')
+            port = _free_port()
+            config = f'rtspAddress: :{port}\nrtmp: no\nhls: no\nwebrtc: no\nsrt: no\npaths:\n  all_others:\n'
+            config_path = f'/tmp/mediamtx-{port}.yml'
+            with open(config_path, 'w') as f:
+                f.write(config)
+            self._server = subprocess.Popen([server, config_path],
+                                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            _wait_for_port(port)
+            self.server_url = f'rtsp://127.0.0.1:{port}'
+        self.url = f'{self.server_url.rstrip("/")}/{self.path}'
+
+        code = (f"color=black:s={CODE_BITS * CODE_BLOCK}x{CODE_BLOCK}:r={self.fps},"
+                f"geq=lum='255*mod(floor(N/pow(2,floor(X/{CODE_BLOCK}))),2)':cb=128:cr=128[code];"
+                f"testsrc2=s={self.width}x{self.height}:r={self.fps}[bg];"
+                f"[bg][code]overlay=0:0")
+        cmd = [
+            'ffmpeg', '-nostdin', '-loglevel', 'error',
+            '-re', '-f', 'lavfi', '-i', code,
+            '-c:v', self.codec,
+        ]
+        if self.codec == 'libx264':
+            cmd += ['-preset', 'ultrafast', '-tune', 'zerolatency', '-pix_fmt', 'yuv420p']
+        cmd += ['-g', str(self.gop), '-f', 'rtsp', '-rtsp_transport', 'tcp', self.url]
+        self.started_at = time.time()
+        self._publisher = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        # Give the server a moment to register the publisher
+        time.sleep(1.0)
+        if self._publisher.poll() is not None:
+            raise RuntimeError(f'Synthetic publisher exited: {self._publisher.stderr.read().decode()}')
+        return self
+
+    def frame_time(self, frame_number: int) -> float:
+        """Wall-clock time the given frame was produced (-re paces frames)"""
+        return self.started_at + frame_number / self.fps
+
+    def stop(self):
+        for process in (self._publisher, self._server):
+            if process and process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def decode_frame_number(gray_frame: bytes, width: int) -> int:
+    """Read the burned-in frame number from a decoded 8-bit gray frame"""
+    row = CODE_BLOCK // 2
+    value = 0
+    for bit in range(CODE_BITS):
+        x = bit * CODE_BLOCK + CODE_BLOCK // 2
+        if gray_frame[row * width + x] > 128:
+            value |= 1 << bit
+    return value
+
+def last_frame_number(media: bytes, width: int, height: int) -> Optional[int]:
+    """Decode fMP4/TS bytes with ffmpeg and return the frame number of the last frame"""
+    result = subprocess.run(
+        ['ffmpeg', '-nostdin', '-loglevel', 'error', '-i', 'pipe:0',
+         '-f', 'rawvideo', '-pix_fmt', 'gray', 'pipe:1'],
+        input=media, capture_output=True, timeout=30
+    )
+    frame_size = width * height
+    if result.returncode != 0 or len(result.stdout) < frame_size:
+        return None
+    frames = len(result.stdout) // frame_size
+    last = result.stdout[(frames - 1) * frame_size:frames * frame_size]
+    return decode_frame_number(last, width)
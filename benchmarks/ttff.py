@@ -0,0 +1,148 @@
+"""
+Time to first frame for new viewers, with and without the fast-start GOP.
+
+Publishes a synthetic stream (see synthetic_source.py) and starts it through
+the app. Each trial joins as a new viewer three ways and times the request
+until the first video frame is decoded:
+
+  rtsp        a direct RTSP session, which waits for the source's next keyframe
+  hls         playlist, then the segment a player starts from (three from the end)
+  fast_start  the in-memory newest GOP from /hls/<id>/fast_start.mp4
+
+and, once per run, the very first fast-start request, made while the stream
+is not running yet (cold start). Trials are spread over the GOP so keyframe
+cadence shows up in the rtsp numbers.
+
+    python benchmarks/ttff.py --trials 20 --gop-seconds 4 [--rtsp-server rtsp://host:8554]
+
+Requires ffmpeg and, unless --rtsp-server is given, mediamtx on PATH.
+Prints a JSON report.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from synthetic_source import SyntheticRTSPSource  # noqa: E402
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def summarize(values):
+    if not values:
+        return None
+    return {
+        'p50': round(statistics.median(values), 3),
+        'p95': round(percentile(values, 0.95), 3),
+        'max': round(max(values), 3)
+    }
+
+def first_frame(source, data=None, timeout=30):
+    """Decode one video frame from a URL or from bytes; True on success"""
+    cmd = ['ffmpeg', '-nostdin', '-v', 'error']
+    if source.lower().startswith('rtsp://'):
+        cmd += ['-rtsp_transport', 'tcp']
+    cmd += ['-i', source, '-map', '0:v:0', '-frames:v', '1', '-f', 'null', '-']
+    try:
+        result = subprocess.run(cmd, input=data, capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return False
+    return result.returncode == 0
+
+def hls_first_frame(client, playlist_url):
+    """Join like a player: playlist, then the third segment from the live edge"""
+    response = client.get(playlist_url)
+    if response.status_code != 200:
+        return False
+    media = [line for line in response.get_data(as_text=True).splitlines() if line and not line.startswith('#')]
+    if not media:
+        return False
+    base = playlist_url.rsplit('/', 1)[0]
+    segment = client.get(f'{base}/{media[max(0, len(media) - 3)]}').get_data()
+    return first_frame('pipe:0', segment)
+
+def fast_start_first_frame(client, url):
+    response = client.get(url)
+    if response.status_code != 200:
+        return False
+    return first_frame('pipe:0', response.get_data())
+
+def timed(join):
+    started = time.time()
+    return time.time() - started if join() else None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--trials', type=int, default=20, help='New viewers per method')
+    parser.add_argument('--gop-seconds', type=float, default=4.0, help='Keyframe interval of the source')
+    parser.add_argument('--rtsp-server', default=None, help='Existing RTSP server to publish to')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=int, default=30)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='ttff-bench-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{workdir}/bench.db'
+    os.environ['HLS_OUTPUT_DIR'] = os.path.join(workdir, 'hls')
+
+    from main import create_app
+    from utils.rtsp_handler import rtsp_handler
+
+    gop = max(1, round(args.gop_seconds * args.fps))
+    results = {'rtsp': [], 'hls': [], 'fast_start': []}
+    failures = {name: 0 for name in results}
+    with SyntheticRTSPSource(args.width, args.height, args.fps, gop=gop, server_url=args.rtsp_server) as source:
+        app = create_app()
+        client = app.test_client()
+        created = client.post('/api/streams', json={
+            'rtsp_url': source.url,
+            'stream_name': 'ttff-bench',
+            'encode_mode': 'copy'
+        }).get_json()['data']
+        fast_start_url = f"/hls/{created['id']}/fast_start.mp4"
+        try:
+            # Cold start: the stream's ingest is not running when the first viewer arrives
+            cold_start = timed(lambda: fast_start_first_frame(client, fast_start_url))
+            deadline = time.time() + 30
+            while client.get(fast_start_url).status_code != 200 and time.time() < deadline:
+                time.sleep(0.5)
+
+            joins = {
+                'rtsp': lambda: first_frame(source.url),
+                'hls': lambda: hls_first_frame(client, f"/hls/{created['id']}/{created['id']}.m3u8"),
+                'fast_start': lambda: fast_start_first_frame(client, fast_start_url),
+            }
+            for _ in range(args.trials):
+                # Land anywhere in the GOP
+                time.sleep(random.uniform(0, args.gop_seconds))
+                for name, join in joins.items():
+                    elapsed = timed(join)
+                    if elapsed is None:
+                        failures[name] += 1
+                    else:
+                        results[name].append(elapsed)
+        finally:
+            rtsp_handler.cleanup_all()
+
+    report = {
+        'benchmark': 'ttff',
+        'resolution': f'{args.width}x{args.height}',
+        'fps': args.fps,
+        'gop_seconds': round(gop / args.fps, 3),
+        'trials': args.trials,
+        'cold_start_fast_start_s': round(cold_start, 3) if cold_start is not None else None,
+        'time_to_first_frame_s': {name: summarize(values) for name, values in results.items()},
+        'failures': failures
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,99 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Column, Integer, MetaData, Table, delete, event, inspect, insert, literal, select
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import DeclarativeBase
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
\ No newline at end of file
+db = SQLAlchemy(model_class=Base)
+
+# Embedded SQLite: WAL lets API reads run while a write commits, NORMAL sync is
+# durable across application crashes in WAL mode, and the rest keeps hot
+# pages and temporary tables in memory
+SQLITE_PRAGMAS = [
+    'journal_mode=WAL',
+    'synchronous=NORMAL',
+    'busy_timeout=5000',
+    'foreign_keys=ON',
+    'temp_store=MEMORY',
+    'cache_size=-16384',
+    'mmap_size=134217728'
+]
+
+# Schema version the tables were last created or upgraded for
+schema_meta = MetaData()
+schema_version = Table('schema_version', schema_meta, Column('version', Integer, nullable=False))
+
+def engine_options(url: str) -> dict:
+    """SQLAlchemy engine options for a database URL"""
+    if url.startswith('sqlite'):
+        # A local file never drops connections: no ping per checkout, no recycling
+        return {'connect_args': {'timeout': 5, 'check_same_thread': False}}
+    return {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+
+def tune_sqlite(engine):
+    """Apply SQLITE_PRAGMAS to every new connection of an SQLite engine"""
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(f'PRAGMA {pragma}')
+        cursor.close()
+
+def _add_missing(engine):
+    """Add columns and indexes that models gained since their tables were created"""
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f'ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column.type.compile(engine.dialect)}'
+            # Existing rows take the model default; without one the column stays nullable
+            if column.default is not None and column.default.is_scalar:
+                value = literal(column.default.arg, column.type).compile(
+                    dialect=engine.dialect, compile_kwargs={'literal_binds': True})
+                ddl += f' DEFAULT {value}'
+                if not column.nullable:
+                    ddl += ' NOT NULL'
+            try:
+                with engine.begin() as conn:
+                    conn.exec_driver_sql(ddl)
+            except SQLAlchemyError as e:
+                print(f"Error adding column {table.name}.{column.name}: {e}")
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+def ensure_schema(version: int) -> bool:
+    """
+    Create or upgrade the tables unless the database is already at version.
+    A current schema costs one query, so restarts skip the per-table checks
+    of create_all. Returns True if the schema was created or upgraded.
+    """
+    engine = db.engine
+    try:
+        with engine.connect() as conn:
+            current = conn.execute(select(schema_version.c.version)).scalar()
+    except SQLAlchemyError:
+        current = None  # No version table yet
+    if current == version:
+        return False
+
+    # Databases from before versioning have tables but no version
+    unversioned = current is None and bool(inspect(engine).get_table_names())
+    db.create_all()
+    _add_missing(engine)
+    with engine.begin() as conn:
+        schema_meta.create_all(conn)
+        conn.execute(delete(schema_version))
+        conn.execute(insert(schema_version).values(version=version))
+    if unversioned:
+        print(f"Database schema upgraded from an unversioned schema to version {version}")
+    else:
+        print(f"Database schema {'initialized' if current is None else f'upgraded from version {current}'} at version {version}")
+    return True
@@ -1,26 +1,65 @@
 import os
-from flask import Flask, render_template, send_from_directory
+from flask import Flask, render_template
 from flask_cors import CORS
-from database import db
+from database import db, engine_options, ensure_schema, tune_sqlite
 
-def create_app():
-    """Application factory pattern"""
-    app = Flask(__name__)
+def create_app(supervisor=False):
+    """
+    Application factory pattern. supervisor=True builds the app for the
+    stream supervisor process (python -m utils.stream_registry).
+    """
+    # Static files are served by serve_static below, from the asset build when present
+    app = Flask(__name__, static_folder=None, template_folder='template')
     CORS(app)
 
     # Setup a secret key, required by sessions
     app.secret_key = os.environ.get("FLASK_SECRET_KEY", "rtsp-livestream-secret-key")
 
-    # Configure the database
+    # Configure the database; sqlite:///path runs embedded, in WAL mode unless SQLITE_TUNING=0
     app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "postgresql://localhost/rtsp_app")
-    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-        "pool_recycle": 300,
-        "pool_pre_ping": True,
-    }
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
+    app.config["SQLITE_TUNING"] = os.environ.get("SQLITE_TUNING", "1") != "0"
+
+    # HLS output and on-demand streaming
+    app.config["HLS_OUTPUT_DIR"] = os.environ.get("HLS_OUTPUT_DIR", os.path.join(app.root_path, "hls_output"))
+    app.config["STREAM_IDLE_TIMEOUT"] = float(os.environ.get("STREAM_IDLE_TIMEOUT", "60"))
+    app.config["SEGMENT_CACHE_BYTES"] = int(os.environ.get("SEGMENT_CACHE_BYTES", str(256 * 1024 * 1024)))
+
+    # Recordings: time-indexed fMP4 segments kept by age and per-stream quota (0 = no quota)
+    app.config["RECORDING_DIR"] = os.environ.get("RECORDING_DIR", os.path.join(app.root_path, "recordings"))
+    app.config["RECORDING_RETENTION_HOURS"] = float(os.environ.get("RECORDING_RETENTION_HOURS", "168"))
+    app.config["RECORDING_QUOTA_MB"] = int(os.environ.get("RECORDING_QUOTA_MB", "0"))
+
+    # Server-side overlay burn-in; positions are pixels on a canvas of this width
+    app.config["OVERLAY_CACHE_DIR"] = os.environ.get("OVERLAY_CACHE_DIR", os.path.join(app.root_path, "overlay_cache"))
+    app.config["OVERLAY_CANVAS_WIDTH"] = float(os.environ.get("OVERLAY_CANVAS_WIDTH", "1280"))
+    app.config["OVERLAY_FONT_FILE"] = os.environ.get("OVERLAY_FONT_FILE")
+    # Uploaded logos and their pre-scaled variants, stored by content hash
+    app.config["LOGO_ASSET_DIR"] = os.environ.get("LOGO_ASSET_DIR", os.path.join(app.root_path, "logo_assets"))
+
+    # Concurrent ffprobe pool and result cache
+    app.config["PROBE_WORKERS"] = int(os.environ.get("PROBE_WORKERS", "16"))
+    app.config["PROBE_CACHE_TTL"] = float(os.environ.get("PROBE_CACHE_TTL", "300"))
+    # Threads running background start/stop/restart jobs
+    app.config["STREAM_JOB_WORKERS"] = int(os.environ.get("STREAM_JOB_WORKERS", "32"))
+
+    # Admission control: cores ffmpeg may use (default 85% of the host) and queue wait
+    app.config["TRANSCODE_CORE_BUDGET"] = float(os.environ.get("TRANSCODE_CORE_BUDGET", "0"))
+    app.config["ADMISSION_QUEUE_TIMEOUT"] = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "10"))
+
+    # Scaled-out deployments: one supervisor process owns every encoder and
+    # web workers reach it on this Unix socket. Unset runs encoders in-process.
+    app.config["STREAM_SUPERVISOR_SOCKET"] = os.environ.get("STREAM_SUPERVISOR_SOCKET")
+    app.config["STREAM_SUPERVISOR_AUTHKEY"] = os.environ.get("STREAM_SUPERVISOR_AUTHKEY", app.secret_key).encode()
 
     # Initialize the app with the extension
     db.init_app(app)
 
+    # Dashboard assets: fingerprinted and precompressed by python -m utils.static_assets
+    from utils.static_assets import static_assets
+    static_assets.configure(os.path.join(app.root_path, 'static'))
+    app.jinja_env.globals['asset_url'] = static_assets.url
+
     @app.route('/')
     def index():
         """Serve the main landing page"""
@@ -29,20 +68,73 @@ def create_app():
     @app.route('/static/<path:filename>')
     def serve_static(filename):
         """Serve static files"""
-        return send_from_directory('static', filename)
+        return static_assets.serve(filename)
 
     with app.app_context():
-        # Import models to ensure tables are created
-        from models import Overlay, StreamSettings
-        db.create_all()
+        # Create or upgrade tables only when the schema version changed
+        from models import StreamSettings, SCHEMA_VERSION
+        if app.config["SQLITE_TUNING"] and db.engine.dialect.name == 'sqlite':
+            tune_sqlite(db.engine)
+        ensure_schema(SCHEMA_VERSION)
 
         # Import and register blueprints after app context is created
         from api.overlay_routes import overlay_bp
         from api.stream_routes import stream_bp
+        from api.hls_routes import hls_bp
+        from api.metrics_routes import metrics_bp
+        from api.event_routes import event_bp
+        from api.scene_routes import scene_bp, compositor_overlays
+        from api.snapshot_routes import snapshot_bp
+        from api.recording_routes import recording_bp
+        from api.logo_routes import logo_bp
+        from utils.metrics import instrument_blueprint
+
+        # Per-route latency histograms, exposed at /metrics
+        instrument_blueprint(overlay_bp)
+        instrument_blueprint(stream_bp)
+        instrument_blueprint(scene_bp)
         
         # Register blueprints
         app.register_blueprint(overlay_bp, url_prefix='/api')
         app.register_blueprint(stream_bp, url_prefix='/api')
+        app.register_blueprint(scene_bp, url_prefix='/api')
+        app.register_blueprint(snapshot_bp, url_prefix='/api')
+        app.register_blueprint(recording_bp, url_prefix='/api')
+        app.register_blueprint(logo_bp, url_prefix='/api')
+        app.register_blueprint(hls_bp, url_prefix='/hls')
+        app.register_blueprint(event_bp, url_prefix='/api')
+        app.register_blueprint(metrics_bp)
+
+        # HLS files, recordings and logos are served by every web process from shared directories
+        from utils.logo_assets import logo_assets
+        from utils.on_demand import on_demand
+        from utils.rtsp_handler import rtsp_handler
+        from utils.segment_cache import segment_cache
+        from utils.stream_jobs import stream_jobs
+        from utils.stream_registry import registry
+        on_demand.configure(app.config["HLS_OUTPUT_DIR"], app.config["STREAM_IDLE_TIMEOUT"])
+        segment_cache.configure(app.config["SEGMENT_CACHE_BYTES"])
+        logo_assets.configure(app.config["LOGO_ASSET_DIR"])
+        rtsp_handler.recorder.configure(app.config["RECORDING_DIR"], app.config["RECORDING_RETENTION_HOURS"],
+                                        app.config["RECORDING_QUOTA_MB"] * 1024 * 1024)
+
+        if app.config["STREAM_SUPERVISOR_SOCKET"] and not supervisor:
+            # Web worker: the supervisor owns encoders, overlays and pre-warming
+            registry.connect(app.config["STREAM_SUPERVISOR_SOCKET"], app.config["STREAM_SUPERVISOR_AUTHKEY"])
+            return app
+
+        # Load overlays for server-side compositing and configure probing
+        rtsp_handler.compositor.configure(app.config["OVERLAY_CACHE_DIR"], app.config["OVERLAY_CANVAS_WIDTH"],
+                                          app.config["OVERLAY_FONT_FILE"])
+        rtsp_handler.update_overlays(compositor_overlays())
+        rtsp_handler.probes.configure(app.config["PROBE_WORKERS"], app.config["PROBE_CACHE_TTL"])
+        stream_jobs.configure(app.config["STREAM_JOB_WORKERS"])
+        rtsp_handler.scheduler.configure(app.config["TRANSCODE_CORE_BUDGET"], app.config["ADMISSION_QUEUE_TIMEOUT"])
+
+        # Pre-warm critical streams; recorded streams run continuously too
+        for stream in StreamSettings.query.filter(StreamSettings.is_active.is_(True),
+                                                  StreamSettings.prewarm.is_(True) | StreamSettings.record.is_(True)):
+            registry.ensure_started(str(stream.id), stream.rtsp_url, pinned=True, **stream.pipeline_options())
 
     return app
 
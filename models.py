@@ -1,8 +1,22 @@
 from database import db
 from datetime import datetime
-from sqlalchemy import Integer, String, Float, Text, DateTime, Boolean
+from sqlalchemy import Integer, String, Float, Text, DateTime, Boolean, JSON
 from sqlalchemy.orm import Mapped, mapped_column
 
+# Bump when a table, column or index changes; the next start upgrades the
+# database (new tables, columns and indexes) and records the version.
+#
+# Schema history:
+#   unversioned  No schema_version table. The baseline overlays and
+#                stream_settings tables, plus whichever of these the creating
+#                release already had: stream_settings.encode_mode, prewarm,
+#                low_latency, burn_overlays, probe_result, probed_at, priority,
+#                abr_ladder, record and motion_gate; updated_at indexes; the
+#                scenes table. ensure_schema brings any of them to the current
+#                version in place, adding missing columns with their defaults.
+#   1            Everything above, plus indexes on the is_active columns.
+SCHEMA_VERSION = 1
+
 class Overlay(db.Model):
     """Model for storing overlay configurations"""
     __tablename__ = 'overlays'
@@ -19,9 +33,9 @@ class Overlay(db.Model):
     font_color: Mapped[str] = mapped_column(String(7), default='#FFFFFF', nullable=True)
     background_color: Mapped[str] = mapped_column(String(7), default='transparent', nullable=True)
     opacity: Mapped[float] = mapped_column(Float, default=1.0)
-    is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    is_active: Mapped[bool] = mapped_column(Boolean, default=True, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     def to_dict(self):
         """Convert overlay to dictionary for JSON serialization"""
@@ -50,9 +64,19 @@ class StreamSettings(db.Model):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     rtsp_url: Mapped[str] = mapped_column(String(500), nullable=False)
     stream_name: Mapped[str] = mapped_column(String(100), nullable=False)
-    is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    is_active: Mapped[bool] = mapped_column(Boolean, default=True, index=True)
+    encode_mode: Mapped[str] = mapped_column(String(20), default='auto')  # 'auto', 'copy' or 'transcode'
+    prewarm: Mapped[bool] = mapped_column(Boolean, default=False)  # Keep running without viewers
+    low_latency: Mapped[bool] = mapped_column(Boolean, default=False)  # LL-HLS with CMAF parts
+    burn_overlays: Mapped[bool] = mapped_column(Boolean, default=False)  # Composite overlays server-side
+    priority: Mapped[str] = mapped_column(String(20), default='normal')  # 'critical', 'high', 'normal' or 'low'
+    abr_ladder: Mapped[list] = mapped_column(JSON, nullable=True)  # ABR rung names, e.g. ['1080p', '720p', '360p']
+    record: Mapped[bool] = mapped_column(Boolean, default=False)  # Keep running and retain segments for DVR
+    motion_gate: Mapped[bool] = mapped_column(Boolean, default=False)  # Drop to a low frame rate while the scene is static
+    probe_result: Mapped[dict] = mapped_column(JSON, nullable=True)  # Last ffprobe summary
+    probed_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     def to_dict(self):
         """Convert stream settings to dictionary for JSON serialization"""
@@ -61,6 +85,50 @@ class StreamSettings(db.Model):
             'rtsp_url': self.rtsp_url,
             'stream_name': self.stream_name,
             'is_active': self.is_active,
+            'encode_mode': self.encode_mode,
+            'prewarm': self.prewarm,
+            'low_latency': self.low_latency,
+            'burn_overlays': self.burn_overlays,
+            'priority': self.priority,
+            'abr_ladder': self.abr_ladder,
+            'record': self.record,
+            'motion_gate': self.motion_gate,
+            'probe_result': self.probe_result,
+            'probed_at': self.probed_at.isoformat() if self.probed_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+    
+    def pipeline_options(self):
+        """Keyword arguments for RTSPHandler.start_hls_conversion"""
+        return {
+            'mode': self.encode_mode,
+            'low_latency': self.low_latency,
+            'burn_overlays': self.burn_overlays,
+            'priority': self.priority or 'normal',
+            'abr_ladder': self.abr_ladder or None,
+            'record': bool(self.record),
+            'motion_gate': bool(self.motion_gate)
+        }
+
+class Scene(db.Model):
+    """Model for a named group of overlays shown together"""
+    __tablename__ = 'scenes'
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(100), nullable=False)
+    overlay_ids: Mapped[list] = mapped_column(JSON, default=list)  # Overlay ids in stacking order
+    is_active: Mapped[bool] = mapped_column(Boolean, default=False, index=True)  # At most one scene is active
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    
+    def to_dict(self):
+        """Convert scene to dictionary for JSON serialization"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'overlay_ids': self.overlay_ids or [],
+            'is_active': self.is_active,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -9,6 +9,31 @@ const overlayAPI = {
     delete: (id) => axios.delete(`/api/overlays/${id}`)
 };
 
+// API service for stored logos
+const logoAPI = {
+    upload: (file) => {
+        const form = new FormData();
+        form.append('file', file);
+        return axios.post('/api/logos', form);
+    }
+};
+
+// Stored logos are fetched pre-scaled to the displayed size (rounded up to
+// 16px buckets so resizing reuses variants); other URLs as they are
+const logoSrc = (overlay) => {
+    if (!/^\/api\/logos\/[0-9a-f]{64}$/.test(overlay.content || '')) {
+        return overlay.content;
+    }
+    const ratio = window.devicePixelRatio || 1;
+    const bucket = (size) => Math.ceil(size * ratio / 16) * 16;
+    return `${overlay.content}/${bucket(overlay.width)}x${bucket(overlay.height)}.png`;
+};
+
+// API service for scenes
+const sceneAPI = {
+    getActive: () => axios.get('/api/scenes/active')
+};
+
 // API service for streams
 const streamAPI = {
     getAll: () => axios.get('/api/streams'),
@@ -204,7 +229,7 @@ const OverlayElement = ({ overlay, onUpdate }) => {
                 <span>{overlay.content || 'Text Overlay'}</span>
             ) : (
                 <img 
-                    src={overlay.content || 'https://via.placeholder.com/100x50/333/fff?text=Logo'} 
+                    src={logoSrc(overlay) || 'https://via.placeholder.com/100x50/333/fff?text=Logo'} 
                     alt="Logo"
                     style={{ width: '100%', height: '100%', objectFit: 'contain' }}
                     onError={(e) => {
@@ -386,6 +411,23 @@ const OverlayPanel = ({ overlays, onOverlayCreate, onOverlayUpdate, onOverlayDel
                                     onChange={(e) => setFormData({ ...formData, content: e.target.value })}
                                     placeholder={formData.type === 'text' ? 'Enter text...' : 'Enter image URL...'}
                                 />
+                                {formData.type === 'logo' && (
+                                    <input
+                                        type="file"
+                                        className="form-control mt-2"
+                                        accept="image/*"
+                                        onChange={async (e) => {
+                                            if (!e.target.files.length) return;
+                                            try {
+                                                const response = await logoAPI.upload(e.target.files[0]);
+                                                setFormData({ ...formData, content: response.data.data.url });
+                                            } catch (error) {
+                                                console.error('Error uploading logo:', error);
+                                                alert('Error uploading logo. Please try again.');
+                                            }
+                                        }}
+                                    />
+                                )}
                             </div>
                             
                             {formData.type === 'text' && (
@@ -448,6 +490,8 @@ const OverlayPanel = ({ overlays, onOverlayCreate, onOverlayUpdate, onOverlayDel
 const App = () => {
     const [rtspUrl, setRtspUrl] = useState('');
     const [overlays, setOverlays] = useState([]);
+    // Render description of the active scene; null shows overlays by is_active
+    const [activeScene, setActiveScene] = useState(null);
     const [currentStreamName, setCurrentStreamName] = useState('');
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState('');
@@ -455,9 +499,53 @@ const App = () => {
     // Load initial data
     useEffect(() => {
         loadOverlays();
+        loadActiveScene();
         loadStreams();
     }, []);
 
+    // Apply overlay changes made by other operators as they happen
+    useEffect(() => {
+        if (typeof EventSource === 'undefined') {
+            return;
+        }
+        const feed = new EventSource('/api/events?types=overlay,scene');
+        const upsert = (e) => {
+            const overlay = JSON.parse(e.data);
+            setOverlays(current => current.some(o => o.id === overlay.id)
+                ? current.map(o => o.id === overlay.id ? overlay : o)
+                : [...current, overlay]);
+        };
+        feed.addEventListener('overlay.created', upsert);
+        feed.addEventListener('overlay.updated', upsert);
+        feed.addEventListener('overlay.deleted', (e) => {
+            const { id } = JSON.parse(e.data);
+            setOverlays(current => current.filter(o => o.id !== id));
+        });
+        feed.addEventListener('overlay.bulk', (e) => {
+            const { created, updated, deleted } = JSON.parse(e.data);
+            const changed = new Map([...created, ...updated].map(o => [o.id, o]));
+            setOverlays(current => [
+                ...current.filter(o => !deleted.includes(o.id)).map(o => changed.get(o.id) || o),
+                ...created.filter(o => !current.some(c => c.id === o.id))
+            ]);
+        });
+        // A scene switch arrives whole, so it is applied in one state update
+        feed.addEventListener('scene.activated', (e) => setActiveScene(JSON.parse(e.data)));
+        feed.addEventListener('scene.deactivated', () => setActiveScene(null));
+        feed.addEventListener('scene.updated', (e) => {
+            const scene = JSON.parse(e.data);
+            if (scene.is_active) {
+                loadActiveScene();
+            }
+        });
+        // Events were missed while disconnected
+        feed.addEventListener('resync', () => {
+            loadOverlays();
+            loadActiveScene();
+        });
+        return () => feed.close();
+    }, []);
+
     // Update Feather icons when component updates
     useEffect(() => {
         if (typeof feather !== 'undefined') {
@@ -475,6 +563,21 @@ const App = () => {
         }
     };
 
+    const loadActiveScene = async () => {
+        try {
+            const response = await sceneAPI.getActive();
+            setActiveScene(response.data.data);
+        } catch (error) {
+            console.error('Error loading active scene:', error);
+        }
+    };
+
+    // Scene membership overrides per-overlay visibility; rows stay live for editing
+    const sceneIds = activeScene ? new Set(activeScene.overlays.map(o => o.id)) : null;
+    const visibleOverlays = sceneIds
+        ? overlays.map(o => ({ ...o, is_active: sceneIds.has(o.id) }))
+        : overlays;
+
     const loadStreams = async () => {
         try {
             const response = await streamAPI.getAll();
@@ -532,7 +635,9 @@ const App = () => {
     const handleOverlayCreate = async (overlayData) => {
         try {
             const response = await overlayAPI.create(overlayData);
-            setOverlays([...overlays, response.data.data]);
+            const created = response.data.data;
+            // The change feed may have delivered it already
+            setOverlays(current => current.some(o => o.id === created.id) ? current : [...current, created]);
         } catch (error) {
             console.error('Error creating overlay:', error);
             throw error;
@@ -651,7 +756,7 @@ const App = () => {
                         <div className="card-body p-0">
                             <VideoPlayer
                                 rtspUrl={rtspUrl}
-                                overlays={overlays}
+                                overlays={visibleOverlays}
                                 onOverlayUpdate={handleOverlayUpdate}
                             />
                         </div>
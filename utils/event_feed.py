@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+class EventFeed:
+    """
+    Bounded in-memory change feed.
+    Events get increasing integer ids, seeded from the clock at startup so
+    ids keep increasing across restarts. A reader resumes from the last id
+    it saw; if that id has already been evicted (or predates a restart) the
+    reader is told to resync, i.e. re-fetch full state.
+    """
+
+    def __init__(self, max_events: int = 1000):
+        self.events = deque(maxlen=max_events)
+        self.last_id = time.time_ns() // 1000
+        self.first_id = self.last_id + 1
+        self._condition = threading.Condition()
+
+    def publish(self, event_type: str, data: dict) -> int:
+        """Append an event and wake waiting readers"""
+        with self._condition:
+            self.last_id += 1
+            self.events.append({
+                'id': self.last_id,
+                'type': event_type,
+                'data': data,
+                'at': time.time()
+            })
+            self._condition.notify_all()
+            return self.last_id
+
+    def since(self, last_id: Optional[int], timeout: float = 15.0) -> Tuple[list, bool, int]:
+        """
+        Events after last_id, waiting up to timeout seconds for one to arrive.
+        Returns (events, resync, cursor); cursor is the id to resume from.
+        last_id None starts at the current head without replaying history.
+        """
+        with self._condition:
+            if last_id is None:
+                return [], False, self.last_id
+            oldest = self.events[0]['id'] if self.events else self.first_id
+            if last_id > self.last_id or last_id < oldest - 1:
+                # From a previous run, or events were evicted: start over from the head
+                return [], True, self.last_id
+            if last_id == self.last_id:
+                self._condition.wait(timeout)
+            events = [event for event in self.events if event['id'] > last_id]
+            return events, False, events[-1]['id'] if events else last_id
+
+class CollectionVersions:
+    """
+    Write versions of the overlay and stream collections.
+    Every committed write bumps its collection's version, so list responses
+    can be cached and validated by version alone. Versions are seeded from
+    the clock at startup so they never repeat across restarts. Deleted ids
+    are kept (bounded) for delta sync, which has no row left to report them.
+    """
+
+    def __init__(self, max_tombstones: int = 10000):
+        self.seed = time.time_ns() // 1000
+        self.versions = {}
+        self.tombstones = {}
+        self.max_tombstones = max_tombstones
+        # Deletions before this time (UTC) may be missing from the tombstones
+        self.tracked_since = {}
+        self.started_at = datetime.utcnow()
+        self._lock = threading.Lock()
+
+    def version(self, collection: str) -> int:
+        with self._lock:
+            return self.versions.get(collection, self.seed)
+
+    def record_write(self, collection: str, deleted_ids: Iterable[int] = ()) -> int:
+        """Bump a collection's version after a commit"""
+        with self._lock:
+            version = self.versions.get(collection, self.seed) + 1
+            self.versions[collection] = version
+            now = datetime.utcnow()
+            for deleted_id in deleted_ids:
+                tombstones = self.tombstones.setdefault(collection, deque())
+                if len(tombstones) >= self.max_tombstones:
+                    self.tracked_since[collection] = tombstones.popleft()[1]
+                tombstones.append((deleted_id, now))
+            return version
+
+    def deleted_since(self, collection: str, since: datetime) -> Tuple[List[int], bool]:
+        """Ids deleted after since (naive UTC), and whether that list is complete"""
+        with self._lock:
+            tracked_since = self.tracked_since.get(collection, self.started_at)
+            deleted = [item_id for item_id, at in self.tombstones.get(collection, ()) if at > since]
+            return deleted, since >= tracked_since
+
+# Global change feed of overlay and stream events
+event_feed = EventFeed()
+# Global write versions of the overlay and stream collections
+collection_versions = CollectionVersions()
@@ -0,0 +1,290 @@
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+# Worker states reported through RTSPHandler.get_stream_info
+STATE_STARTING = 'starting'
+STATE_RUNNING = 'running'
+STATE_STALLED = 'stalled'
+STATE_BACKOFF = 'backoff'
+STATE_STOPPED = 'stopped'
+
+
+class FFmpegWorker:
+    """
+    Supervised FFmpeg process.
+
+    Both output pipes are drained on background threads into a bounded ring
+    buffer so ffmpeg can never block on a full pipe. The supervisor calls
+    check() periodically to notice exits and stalls (no playlist update within
+    stall_factor x hls_time) and to restart the process with exponential backoff.
+    """
+
+    def __init__(self, name: str, build_cmd: Callable[[], List[str]], watch_path: str,
+                 hls_time: float = 2.0, stall_factor: float = 5.0, startup_grace: float = 20.0,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0, stable_after: float = 60.0,
+                 log_lines: int = 200, on_line: Optional[Callable[[str, str], None]] = None,
+                 on_state: Optional[Callable[[str, Optional[str]], None]] = None):
+        self.name = name
+        self.build_cmd = build_cmd
+        self.watch_path = watch_path
+        self.hls_time = hls_time
+        self.stall_factor = stall_factor
+        self.startup_grace = startup_grace
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.on_line = on_line
+        # Called with (state, restart reason) for every transition made by check()
+        self.on_state = on_state
+        self._transitions = []
+
+        self.process: Optional[subprocess.Popen] = None
+        self.log = deque(maxlen=log_lines)
+        self._log_lock = threading.Lock()
+        self.state = STATE_STOPPED
+        # Set by stop(); a stopped worker never runs again
+        self.stopped = False
+        self.started_at: Optional[float] = None
+        self.restarts = 0
+        self.consecutive_failures = 0
+        self.last_exit_code: Optional[int] = None
+        self.last_restart_reason: Optional[str] = None
+        self.next_start_at: Optional[float] = None
+        # Latest -progress block (fps, speed, bitrate, ...) and segment cadence
+        self.progress = {}
+        self._progress_block = {}
+        self.last_output_seen: Optional[float] = None
+        self.segment_interval: Optional[float] = None
+        # Scheduling applied to every spawned process (see utils.scheduler)
+        self.niceness = 0
+        self.cpu_affinity: Optional[List[int]] = None
+        self._lock = threading.RLock()
+
+    def start(self):
+        """Spawn ffmpeg and attach pipe readers"""
+        with self._lock:
+            cmd = self.build_cmd()
+            self.process = subprocess.Popen(
+                cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+                errors='replace'
+            )
+            self._set_state(STATE_STARTING)
+            self.started_at = time.time()
+            self.next_start_at = None
+            self.progress = {}
+            self._progress_block = {}
+            self._apply_scheduling()
+            for source, pipe in (('stdout', self.process.stdout), ('stderr', self.process.stderr)):
+                reader = threading.Thread(
+                    target=self._drain,
+                    args=(source, pipe),
+                    name=f'ffmpeg-{self.name}-{source}',
+                    daemon=True
+                )
+                reader.start()
+
+    def _apply_scheduling(self):
+        """Lower the process priority and pin it to its assigned cores"""
+        pid = self.process.pid
+        try:
+            if self.niceness:
+                os.setpriority(os.PRIO_PROCESS, pid, self.niceness)
+            if self.cpu_affinity and hasattr(os, 'sched_setaffinity'):
+                os.sched_setaffinity(pid, self.cpu_affinity)
+        except OSError as e:
+            print(f"Error applying scheduling to ffmpeg {self.name}: {e}")
+
+    def _drain(self, source: str, pipe):
+        """Read a pipe until EOF, keeping only the most recent lines"""
+        try:
+            for line in iter(pipe.readline, ''):
+                line = line.rstrip()
+                if not line:
+                    continue
+                if source == 'stdout' and self._parse_progress(line):
+                    continue
+                self._append_log(line)
+                if self.on_line:
+                    try:
+                        self.on_line(source, line)
+                    except Exception as e:
+                        print(f"Error handling ffmpeg output for {self.name}: {e}")
+        except (ValueError, OSError):
+            # Pipe closed underneath us while the process was being killed
+            pass
+        finally:
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+    def _parse_progress(self, line: str) -> bool:
+        """Collect key=value lines written by -progress; a block ends with 'progress='"""
+        key, sep, value = line.partition('=')
+        if not sep or ' ' in key:
+            return False
+        self._progress_block[key] = value.strip()
+        if key == 'progress':
+            block, self._progress_block = self._progress_block, {}
+            block['updated_at'] = time.time()
+            self.progress = block
+        return True
+
+    def _append_log(self, line: str):
+        with self._log_lock:
+            self.log.append(line)
+
+    def log_tail(self, count: int = 20) -> List[str]:
+        """Most recent output lines, oldest first"""
+        with self._log_lock:
+            return list(self.log)[-count:]
+
+    def last_output_at(self) -> Optional[float]:
+        """Modification time of the watched output (the HLS playlist)"""
+        try:
+            return os.path.getmtime(self.watch_path)
+        except OSError:
+            return None
+
+    def check(self, now: Optional[float] = None):
+        """Advance the state machine: restart dead or stalled processes"""
+        self._check(now or time.time())
+        with self._lock:
+            transitions, self._transitions = self._transitions, []
+        if not self.on_state:
+            return
+        # Reported outside the lock; callbacks may take their own locks
+        for state, reason in transitions:
+            try:
+                self.on_state(state, reason)
+            except Exception as e:
+                print(f"Error reporting ffmpeg state for {self.name}: {e}")
+
+    def _set_state(self, state: str, reason: Optional[str] = None):
+        if state != self.state:
+            self._transitions.append((state, reason))
+        self.state = state
+
+    def _check(self, now: float):
+        with self._lock:
+            if self.state == STATE_STOPPED:
+                return
+
+            if self.state == STATE_BACKOFF:
+                if now >= self.next_start_at:
+                    try:
+                        self.start()
+                    except Exception as e:
+                        self._schedule_restart(now, f'spawn failed: {e}')
+                return
+
+            exit_code = self.process.poll()
+            if exit_code is not None:
+                self.last_exit_code = exit_code
+                self._schedule_restart(now, f'exited with code {exit_code}')
+                return
+
+            last_output = self.last_output_at()
+            fresh_since = max(last_output or 0, self.started_at)
+            limit = self.stall_factor * self.hls_time
+            if last_output is None or last_output < self.started_at:
+                limit = max(limit, self.startup_grace)
+
+            if now - fresh_since > limit:
+                reason = f'no new segment for {now - fresh_since:.1f}s'
+                self._set_state(STATE_STALLED, reason)
+                self._kill()
+                self._schedule_restart(now, reason)
+                return
+
+            if last_output and last_output != self.last_output_seen:
+                if self.last_output_seen and last_output > self.last_output_seen:
+                    self.segment_interval = last_output - self.last_output_seen
+                self.last_output_seen = last_output
+
+            if last_output and last_output >= self.started_at:
+                self._set_state(STATE_RUNNING)
+                if now - self.started_at >= self.stable_after:
+                    self.consecutive_failures = 0
+
+    def _schedule_restart(self, now: float, reason: str):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** self.consecutive_failures))
+        self.consecutive_failures += 1
+        self.restarts += 1
+        self.last_restart_reason = reason
+        self._append_log(f'[supervisor] {reason}; restarting in {delay:.1f}s')
+        self._set_state(STATE_BACKOFF, reason)
+        self.next_start_at = now + delay
+
+    def _kill(self, timeout: float = 5):
+        process = self.process
+        if process is None or process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    def stop(self, timeout: float = 5):
+        """Stop the process for good; the supervisor will not restart it"""
+        with self._lock:
+            self.stopped = True
+            self.state = STATE_STOPPED
+            self._kill(timeout)
+
+    def restart(self, timeout: float = 5):
+        """
+        Respawn immediately with a freshly built command (not counted as a
+        failure). No-op once stopped, so a restart racing a stop cannot leave
+        an unsupervised process behind.
+        """
+        with self._lock:
+            if self.stopped:
+                return
+            self._kill(timeout)
+            self.start()
+
+    def resource_usage(self) -> Optional[dict]:
+        """CPU seconds and resident memory of the process, from /proc (Linux)"""
+        process = self.process
+        if process is None or process.poll() is not None:
+            return None
+        try:
+            with open(f'/proc/{process.pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            with open(f'/proc/{process.pid}/statm') as f:
+                resident_pages = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            return None
+        ticks = os.sysconf('SC_CLK_TCK')
+        return {
+            # utime and stime are fields 14 and 15 of /proc/<pid>/stat
+            'cpu_seconds': (int(fields[11]) + int(fields[12])) / ticks,
+            'rss_bytes': resident_pages * os.sysconf('SC_PAGE_SIZE')
+        }
+
+    def status(self, tail: int = 20) -> dict:
+        """Snapshot of the worker for API responses"""
+        process = self.process
+        return {
+            'state': self.state,
+            'pid': process.pid if process and process.poll() is None else None,
+            'restarts': self.restarts,
+            'last_exit_code': self.last_exit_code,
+            'last_restart_reason': self.last_restart_reason,
+            'last_segment_at': self.last_output_at(),
+            'next_restart_at': self.next_start_at,
+            'segment_interval': self.segment_interval,
+            'progress': dict(self.progress),
+            'log_tail': self.log_tail(tail)
+        }
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import subprocess
+import threading
+from typing import Optional, Tuple
+from utils.ll_hls import LL_INIT_NAME, LLPlaylistBuilder, scan_fragments
+from utils.on_demand import on_demand
+from utils.segment_cache import segment_cache
+
+# Fragmented MP4 that browsers play progressively from the first byte
+FAST_START_MOVFLAGS = 'frag_keyframe+empty_moov+default_base_moof'
+
+def latest_gop(stream_id: str) -> Optional[Tuple[str, Optional[str], Optional[bytes], str]]:
+    """
+    (segment name, path, data, container) of the newest GOP a stream's
+    ingest has written. Every segment starts with a keyframe, so this is the
+    newest complete MPEG-TS segment, or for low-latency streams the init
+    segment plus the complete fragments of the newest CMAF segment. data is
+    set instead of path when the bytes are already in memory. None if no
+    segment exists yet.
+    """
+    directory = on_demand.output_dir(stream_id)
+
+    segments = LLPlaylistBuilder(directory).segments()
+    if segments:
+        for _, name in reversed(segments[-2:]):
+            fragments, _ = scan_fragments(os.path.join(directory, name))
+            if not fragments:
+                continue
+            end = fragments[-1][0] + fragments[-1][1]
+            try:
+                with open(os.path.join(directory, LL_INIT_NAME), 'rb') as f:
+                    init = f.read()
+                with open(os.path.join(directory, name), 'rb') as f:
+                    return name, None, init + f.read(end), 'mp4'
+            except OSError:
+                return None
+        return None
+
+    playlist = segment_cache.get_playlist(on_demand.playlist_path(stream_id))
+    if playlist is None:
+        return None
+    variants = [uri for uri in playlist['uris'] if uri.split('?', 1)[0].endswith('.m3u8')]
+    if variants:
+        # ABR master playlist: the first variant is the highest rung
+        playlist = segment_cache.get_playlist(os.path.join(directory, variants[0].split('?', 1)[0]))
+        if playlist is None:
+            return None
+    media = [uri.split('?', 1)[0] for uri in playlist['uris'] if uri.split('?', 1)[0].endswith('.ts')]
+    if not media:
+        return None
+    path = os.path.normpath(os.path.join(directory, media[-1]))
+    if os.path.dirname(path) != os.path.normpath(directory):
+        return None
+    cached = segment_cache.load_segment(path)
+    return media[-1], None if cached else path, cached['data'] if cached else None, 'ts'
+
+class GopCache:
+    """
+    The newest GOP of each running stream as a self-contained fragmented MP4,
+    held in memory for fast-start playback.
+
+    A player joining an HLS stream renders nothing until it has a playlist
+    and a whole segment, and a stream started cold first has to wait for
+    the encoder's next keyframe. The fast-start clip begins with the newest
+    keyframe already on disk, so a new viewer's first frame costs one
+    download. MPEG-TS segments are remuxed (stream copy, no decode) once per
+    segment however many viewers join; CMAF GOPs are served as written.
+    """
+
+    def __init__(self, remux_timeout: float = 10.0):
+        self.remux_timeout = remux_timeout
+        self.entries = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def _remux(self, path: Optional[str], data: Optional[bytes]) -> Optional[bytes]:
+        """MPEG-TS segment as fragmented MP4"""
+        cmd = ['ffmpeg', '-nostdin', '-v', 'error', '-i', path or 'pipe:0',
+               '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy',
+               '-f', 'mp4', '-movflags', FAST_START_MOVFLAGS, 'pipe:1']
+        try:
+            result = subprocess.run(cmd, input=data, capture_output=True, timeout=self.remux_timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"Error remuxing fast-start GOP: {e}")
+            return None
+        if result.returncode != 0 or not result.stdout:
+            print(f"Error remuxing fast-start GOP: {result.stderr.decode('utf-8', 'replace').strip()}")
+            return None
+        return result.stdout
+
+    def fast_start(self, stream_id: str) -> Optional[dict]:
+        """
+        Entry (data, etag, segment) for the newest GOP of a stream, or None
+        if the stream has not written a segment yet
+        """
+        source = latest_gop(stream_id)
+        if source is None:
+            # Stopped or not started yet: nothing to keep
+            with self._lock:
+                self.entries.pop(stream_id, None)
+            return None
+        name, path, data, container = source
+        # A CMAF GOP grows fragment by fragment under the same name
+        signature = (name, len(data)) if container == 'mp4' else name
+
+        with self._lock:
+            entry = self.entries.get(stream_id)
+            if entry is not None and entry['signature'] == signature:
+                return entry
+            key_lock = self._key_locks.setdefault(stream_id, threading.Lock())
+
+        # Viewers joining together wait for one remux
+        with key_lock:
+            with self._lock:
+                entry = self.entries.get(stream_id)
+                if entry is not None and entry['signature'] == signature:
+                    return entry
+            clip = data if container == 'mp4' else self._remux(path, data)
+            if clip is None:
+                return None
+            entry = {
+                'signature': signature,
+                'segment': name,
+                'data': clip,
+                'etag': hashlib.sha1(clip).hexdigest()
+            }
+            with self._lock:
+                self.entries[stream_id] = entry
+            return entry
+
+# Global GOP cache instance
+gop_cache = GopCache()
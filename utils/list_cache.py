@@ -0,0 +1,157 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from flask import Response, request, jsonify
+from utils.stream_registry import registry
+
+# Upper bound for ?limit= on list endpoints
+MAX_PAGE_SIZE = 1000
+
+class ListCache:
+    """
+    Small LRU of list payloads keyed by (collection, version, query). A write
+    bumps the collection version, so stale entries are simply never hit again.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+list_cache = ListCache()
+
+def parse_updated_since(value: str) -> datetime:
+    """ISO 8601 timestamp as naive UTC, the form updated_at is stored in"""
+    since = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+def parse_list_query(allowed_fields) -> dict:
+    """
+    Validate fields/updated_since/after/limit query parameters.
+    Raises ValueError with a client-facing message.
+    """
+    query = {'fields': None, 'updated_since': None, 'after': None, 'limit': None}
+    if request.args.get('fields'):
+        fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in allowed_fields]
+        if unknown:
+            raise ValueError('Unknown fields: ' + ', '.join(unknown))
+        # id is the pagination key and always included
+        query['fields'] = tuple(dict.fromkeys(['id'] + fields))
+    if request.args.get('updated_since'):
+        try:
+            query['updated_since'] = parse_updated_since(request.args['updated_since'])
+        except ValueError:
+            raise ValueError('updated_since must be an ISO 8601 timestamp')
+    for name in ('after', 'limit'):
+        if request.args.get(name):
+            try:
+                query[name] = int(request.args[name])
+            except ValueError:
+                raise ValueError(f'{name} must be an integer')
+    if query['limit'] is not None and not 1 <= query['limit'] <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    return query
+
+def _load_page(collection: str, model, serialize: Callable, query: dict, db_fields) -> dict:
+    """Run the keyset query and build the payload for one version"""
+    statement = model.query
+    if query['updated_since'] is not None:
+        statement = statement.filter(model.updated_at > query['updated_since'])
+    if query['after'] is not None:
+        statement = statement.filter(model.id > query['after'])
+    statement = statement.order_by(model.id)
+    if query['limit'] is not None:
+        statement = statement.limit(query['limit'])
+    rows = statement.all()
+
+    data = []
+    for row in rows:
+        item = serialize(row)
+        if query['fields']:
+            item = {field: item[field] for field in query['fields'] if field in db_fields}
+        data.append(item)
+    payload = {
+        'success': True,
+        'data': data,
+        'next_after': rows[-1].id if query['limit'] is not None and len(rows) == query['limit'] else None
+    }
+    if query['updated_since'] is not None:
+        deleted, complete = registry.deleted_since(collection, query['updated_since'])
+        payload['deleted'] = deleted
+        # Deletions older than the server's tombstones are unknown: refetch everything
+        payload['resync'] = not complete
+    return payload
+
+def list_response(collection: str, model, serialize: Callable, db_fields,
+                  live_fields=(), live_state: Optional[Callable] = None):
+    """
+    Versioned, cached list response with strong ETags.
+
+    The serialized rows are cached per collection version and query, so
+    repeated polls between writes cost no database round trip; a matching
+    If-None-Match is answered with 304. live_fields (not stored in the
+    database) are merged per request from live_state(ids) when selected.
+    """
+    try:
+        query = parse_list_query(set(db_fields) | set(live_fields))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    version = registry.collection_version(collection)
+    query_key = tuple(sorted((name, str(value)) for name, value in query.items()))
+    live = [field for field in live_fields if query['fields'] is None or field in query['fields']]
+
+    key = (collection, version, query_key)
+    entry = list_cache.get(key)
+    if entry is None:
+        payload = _load_page(collection, model, serialize, query, db_fields)
+        payload['version'] = version
+        body = json.dumps(payload).encode()
+        entry = {
+            'payload': payload,
+            'body': body,
+            'etag': f"{collection}-{version}-{hashlib.sha1(repr(query_key).encode()).hexdigest()[:12]}"
+        }
+        list_cache.put(key, entry)
+
+    if live and live_state:
+        # Live fields change without writes; the ETag follows the body
+        payload = dict(entry['payload'])
+        state = live_state([str(item['id']) for item in payload['data']])
+        payload['data'] = [
+            dict(item, **{field: state[str(item['id'])][field] for field in live})
+            for item in payload['data']
+        ]
+        body = json.dumps(payload).encode()
+        etag = hashlib.sha1(body).hexdigest()
+    else:
+        body, etag = entry['body'], entry['etag']
+
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
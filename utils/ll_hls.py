@@ -0,0 +1,309 @@
+import math
+import os
+import re
+import struct
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Names used by the low-latency (CMAF) output of RTSPHandler
+LL_INIT_NAME = 'init.mp4'
+LL_SEGMENT_PATTERN = 'seg-$Number%05d$.m4s'
+_SEGMENT_NAME = re.compile(r'^seg-(\d+)\.m4s$')
+
+def scan_fragments(path: str) -> Tuple[List[Tuple[int, int]], int]:
+    """
+    Find complete CMAF fragments (moof + mdat) in a possibly still growing
+    fMP4 segment. Returns a list of (offset, length) byte ranges and the offset
+    where the next fragment starts. The first fragment also covers any boxes
+    before it (styp), so the ranges tile the file from byte 0.
+    """
+    fragments = []
+    start = 0
+    offset = 0
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            while offset + 8 <= size:
+                f.seek(offset)
+                box_size, box_type = struct.unpack('>I4s', f.read(8))
+                if box_size == 1:
+                    if offset + 16 > size:
+                        break
+                    box_size = struct.unpack('>Q', f.read(8))[0]
+                elif box_size == 0:
+                    # Box extends to EOF: still being written
+                    break
+                if box_size < 8 or offset + box_size > size:
+                    break
+                offset += box_size
+                if box_type == b'mdat':
+                    fragments.append((start, offset - start))
+                    start = offset
+    except OSError:
+        pass
+    return fragments, start
+
+def _boxes(data: bytes, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[bytes, int, int]]:
+    """(type, payload offset, end offset) of the ISO BMFF boxes in data[start:end]"""
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        box_size, box_type = struct.unpack_from('>I4s', data, offset)
+        header = 8
+        if box_size == 1:
+            if offset + 16 > end:
+                return
+            box_size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header = 16
+        elif box_size == 0:
+            box_size = end - offset
+        if box_size < header or offset + box_size > end:
+            return
+        yield box_type, offset + header, offset + box_size
+        offset += box_size
+
+def _child(data: bytes, path: List[bytes], start: int = 0, end: Optional[int] = None) -> Optional[Tuple[int, int]]:
+    """(payload offset, end offset) of the first box along path, or None"""
+    for box_type, payload, box_end in _boxes(data, start, end):
+        if box_type == path[0]:
+            return (payload, box_end) if len(path) == 1 else _child(data, path[1:], payload, box_end)
+    return None
+
+def read_track(init_path: str) -> Optional[Tuple[int, int, int]]:
+    """
+    (track id, timescale, default sample duration) of the video track in a
+    CMAF init segment, or None if it cannot be read
+    """
+    try:
+        with open(init_path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    moov = _child(data, [b'moov'])
+    if moov is None:
+        return None
+    tracks = []
+    for box_type, payload, box_end in _boxes(data, *moov):
+        if box_type != b'trak':
+            continue
+        tkhd = _child(data, [b'tkhd'], payload, box_end)
+        mdhd = _child(data, [b'mdia', b'mdhd'], payload, box_end)
+        hdlr = _child(data, [b'mdia', b'hdlr'], payload, box_end)
+        if tkhd is None or mdhd is None:
+            continue
+        # Version 1 boxes use 64-bit creation and modification times
+        track_id = struct.unpack_from('>I', data, tkhd[0] + (20 if data[tkhd[0]] == 1 else 12))[0]
+        timescale = struct.unpack_from('>I', data, mdhd[0] + (20 if data[mdhd[0]] == 1 else 12))[0]
+        handler = data[hdlr[0] + 8:hdlr[0] + 12] if hdlr else b''
+        tracks.append((handler != b'vide', track_id, timescale))
+    if not tracks:
+        return None
+    _, track_id, timescale = min(tracks)
+    default_duration = 0
+    mvex = _child(data, [b'mvex'], *moov)
+    for box_type, payload, _ in _boxes(data, *mvex) if mvex else ():
+        if box_type == b'trex' and struct.unpack_from('>I', data, payload + 4)[0] == track_id:
+            default_duration = struct.unpack_from('>I', data, payload + 12)[0]
+    return (track_id, timescale, default_duration) if timescale else None
+
+def _moof_duration(data: bytes, track: Tuple[int, int, int]) -> Optional[int]:
+    """Total sample duration (in timescale units) of the track's runs in a moof payload"""
+    track_id, _, default_duration = track
+    for box_type, payload, box_end in _boxes(data):
+        if box_type != b'traf':
+            continue
+        tfhd = _child(data, [b'tfhd'], payload, box_end)
+        if tfhd is None or struct.unpack_from('>I', data, tfhd[0] + 4)[0] != track_id:
+            continue
+        flags = struct.unpack_from('>I', data, tfhd[0])[0] & 0xFFFFFF
+        sample_duration = default_duration
+        if flags & 0x08:
+            # Skip base-data-offset and sample-description-index when present
+            field = tfhd[0] + 8 + (8 if flags & 0x01 else 0) + (4 if flags & 0x02 else 0)
+            sample_duration = struct.unpack_from('>I', data, field)[0]
+        total = 0
+        for run_type, run, _ in _boxes(data, payload, box_end):
+            if run_type != b'trun':
+                continue
+            run_flags = struct.unpack_from('>I', data, run)[0] & 0xFFFFFF
+            count = struct.unpack_from('>I', data, run + 4)[0]
+            field = run + 8 + (4 if run_flags & 0x01 else 0) + (4 if run_flags & 0x04 else 0)
+            if not run_flags & 0x100:
+                total += count * sample_duration
+                continue
+            stride = 4 * bin(run_flags & 0xF00).count('1')
+            for index in range(count):
+                total += struct.unpack_from('>I', data, field + index * stride)[0]
+        return total
+    return None
+
+# Durations of complete segments, which never change: (path, size) -> durations
+_duration_cache: Dict[Tuple[str, int], List[Optional[float]]] = {}
+_duration_cache_lock = threading.Lock()
+_DURATION_CACHE_SIZE = 256
+
+def fragment_durations(path: str, fragments: List[Tuple[int, int]],
+                       track: Tuple[int, int, int]) -> List[Optional[float]]:
+    """Seconds of media in each fragment of a segment (None where unreadable)"""
+    key = (path, sum(length for _, length in fragments))
+    with _duration_cache_lock:
+        cached = _duration_cache.get(key)
+    if cached is not None:
+        return cached
+    durations = []
+    try:
+        with open(path, 'rb') as f:
+            for offset, length in fragments:
+                f.seek(offset)
+                # Only the boxes ahead of mdat are needed
+                data = f.read(min(length, 65536))
+                moof = _child(data, [b'moof'])
+                duration = _moof_duration(data[moof[0]:moof[1]], track) if moof else None
+                durations.append(duration / track[1] if duration is not None else None)
+    except (OSError, struct.error):
+        durations += [None] * (len(fragments) - len(durations))
+    with _duration_cache_lock:
+        if len(_duration_cache) >= _DURATION_CACHE_SIZE:
+            _duration_cache.clear()
+        _duration_cache[key] = durations
+    return durations
+
+class LLPlaylistBuilder:
+    """
+    Generates an LL-HLS media playlist for a directory of CMAF segments written
+    by ffmpeg's dash muxer in streaming mode. Complete fragments of recent
+    segments are advertised as EXT-X-PART byte ranges of the segment file, and
+    the next fragment as an EXT-X-PRELOAD-HINT. Segment and part durations
+    are read from the fragments' sample tables, since copied video is cut at
+    the camera's keyframes rather than at the configured durations; those
+    are only the fallback for fragments that cannot be read.
+    """
+
+    def __init__(self, directory: str, segment_duration: float = 1.0,
+                 part_duration: float = 0.333, parts_segments: int = 3):
+        self.directory = directory
+        self.segment_duration = segment_duration
+        self.part_duration = part_duration
+        self.parts_segments = parts_segments
+
+    def segments(self) -> List[Tuple[int, str]]:
+        """(number, filename) of segments on disk, oldest first"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        found = []
+        for name in names:
+            match = _SEGMENT_NAME.match(name)
+            if match:
+                found.append((int(match.group(1)), name))
+        return sorted(found)
+
+    def live_edge(self, segments=None) -> Optional[Tuple[int, int]]:
+        """(msn, part index) of the newest complete part, or None"""
+        segments = self.segments() if segments is None else segments
+        if not segments:
+            return None
+        number, name = segments[-1]
+        fragments, _ = scan_fragments(os.path.join(self.directory, name))
+        if fragments:
+            return number, len(fragments) - 1
+        if len(segments) > 1:
+            previous_number, previous_name = segments[-2]
+            previous, _ = scan_fragments(os.path.join(self.directory, previous_name))
+            return previous_number, max(len(previous) - 1, 0)
+        return None
+
+    def has_part(self, msn: int, part: Optional[int]) -> bool:
+        """Whether the playlist already contains segment msn (or part of it)"""
+        segments = self.segments()
+        if not segments:
+            return False
+        in_progress = segments[-1][0]
+        if msn < in_progress:
+            return True
+        if msn > in_progress:
+            return False
+        if part is None:
+            return False
+        fragments, _ = scan_fragments(os.path.join(self.directory, segments[-1][1]))
+        return part < len(fragments)
+
+    def wait_for_part(self, msn: int, part: Optional[int], timeout: float) -> bool:
+        """Blocking playlist reload: wait until msn/part is available"""
+        deadline = time.time() + timeout
+        while not self.has_part(msn, part):
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def build(self) -> Optional[str]:
+        """Render the LL-HLS media playlist, or None before the first segment"""
+        segments = self.segments()
+        if not segments or not os.path.exists(os.path.join(self.directory, LL_INIT_NAME)):
+            return None
+
+        track = read_track(os.path.join(self.directory, LL_INIT_NAME))
+        scanned = []
+        for number, name in segments:
+            path = os.path.join(self.directory, name)
+            fragments, next_offset = scan_fragments(path)
+            durations = fragment_durations(path, fragments, track) if track else [None] * len(fragments)
+            parts = [(offset, length, self.part_duration if duration is None else duration)
+                     for (offset, length), duration in zip(fragments, durations)]
+            scanned.append((number, name, parts, next_offset))
+
+        complete, (_, current_name, current_parts, next_offset) = scanned[:-1], scanned[-1]
+        extinf = {number: sum(part[2] for part in parts) if parts else self.segment_duration
+                  for number, _, parts, _ in complete}
+        # Keyframe-cut segments and parts may run longer than configured
+        target = max([self.segment_duration] + list(extinf.values()))
+        part_target = max([self.part_duration] + [part[2] for _, _, parts, _ in scanned for part in parts])
+
+        lines = [
+            '#EXTM3U',
+            '#EXT-X-VERSION:9',
+            f'#EXT-X-TARGETDURATION:{math.ceil(round(target, 3))}',
+            f'#EXT-X-PART-INF:PART-TARGET={part_target:.3f}',
+            f'#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES,PART-HOLD-BACK={3 * part_target:.3f}',
+            f'#EXT-X-MEDIA-SEQUENCE:{segments[0][0]}',
+            '#EXT-X-INDEPENDENT-SEGMENTS',
+            f'#EXT-X-MAP:URI="{LL_INIT_NAME}"'
+        ]
+
+        with_parts = {number for number, _, _, _ in complete[-self.parts_segments:]}
+        for number, name, parts, _ in complete:
+            if number in with_parts:
+                lines.extend(self._part_lines(name, parts))
+            lines.append(f'#EXTINF:{extinf[number]:.3f},')
+            lines.append(name)
+
+        lines.extend(self._part_lines(current_name, current_parts))
+        lines.append(f'#EXT-X-PRELOAD-HINT:TYPE=PART,URI="{current_name}",BYTERANGE-START={next_offset}')
+        return '\n'.join(lines) + '\n'
+
+    def _part_lines(self, name: str, parts: List[Tuple[int, int, float]]) -> List[str]:
+        lines = []
+        for index, (offset, length, duration) in enumerate(parts):
+            independent = ',INDEPENDENT=YES' if index == 0 else ''
+            lines.append(f'#EXT-X-PART:DURATION={duration:.3f},URI="{name}",'
+                         f'BYTERANGE="{length}@{offset}"{independent}')
+        return lines
+
+def wait_for_fragment(path: str, start: int, timeout: float) -> Optional[Tuple[int, int]]:
+    """
+    Wait until the fragment containing byte offset start is complete, so a
+    preload-hint request can be answered with whole fragments. Returns its
+    (offset, length), or None on timeout.
+    """
+    deadline = time.time() + timeout
+    while True:
+        fragments, _ = scan_fragments(path)
+        for offset, length in fragments:
+            if offset + length > start:
+                return offset, length
+        if time.time() >= deadline:
+            return None
+        time.sleep(0.02)
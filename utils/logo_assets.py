@@ -0,0 +1,215 @@
+import hashlib
+import http.client
+import ipaddress
+import os
+import re
+import struct
+import subprocess
+import urllib.request
+import uuid
+from typing import Optional, Tuple
+
+# Overlay content referencing a stored logo: /api/logos/<sha256>
+LOGO_URL_PREFIX = '/api/logos/'
+LOGO_URL_PATTERN = re.compile(r'^/api/logos/([0-9a-f]{64})(?:[/?#].*)?$')
+# Largest logo accepted for upload or ingest
+MAX_LOGO_BYTES = 10 * 1024 * 1024
+# Largest variant edge, and variants kept per logo before redirecting to the original
+MAX_VARIANT_SIZE = 4096
+MAX_VARIANTS = 64
+
+def png_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """(width, height) from a PNG's IHDR chunk"""
+    if len(data) < 24 or data[:8] != b'\x89PNG\r\n\x1a\n' or data[12:16] != b'IHDR':
+        return None
+    return struct.unpack('>II', data[16:24])
+
+def check_public_address(address: str):
+    """Raise ValueError unless address is a globally routable IP"""
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    if not ip.is_global:
+        raise ValueError(f'Refusing to fetch from non-public address {ip}')
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    # Checked on the connected socket, so DNS answers cannot change in between
+    def connect(self):
+        super().connect()
+        check_public_address(self.sock.getpeername()[0])
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def connect(self):
+        super().connect()
+        check_public_address(self.sock.getpeername()[0])
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+class _PublicRedirectHandler(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if not newurl.lower().startswith(('http://', 'https://')):
+            raise ValueError('Refusing to follow a redirect to a non-http(s) URL')
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+# Fetches go straight to public hosts (no proxies), redirects included
+_public_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}), _PublicRedirectHandler,
+                                             _PublicHTTPHandler, _PublicHTTPSHandler)
+
+class LogoAssetStore:
+    """
+    Logo images stored locally under the SHA-256 of their bytes.
+
+    A logo is decoded once on ingest into an RGBA PNG (original.png) and
+    every size it is shown at becomes a variant generated on first use:
+    straight-alpha PNGs for browsers, and premultiplied PNGs with the
+    overlay's opacity applied for ffmpeg's overlay filter. Scaling runs in
+    premultiplied space so transparent edges do not darken. Content never
+    changes under a hash, so overlays sharing an image share its files and
+    every file can be cached as immutable.
+    """
+
+    def __init__(self, directory: str = 'logo_assets', fetch_timeout: float = 15.0):
+        self.directory = directory
+        self.fetch_timeout = fetch_timeout
+
+    def configure(self, directory: str):
+        """Apply application configuration"""
+        self.directory = directory
+
+    @staticmethod
+    def asset_id(content: Optional[str]) -> Optional[str]:
+        """Hash of the stored logo an overlay's content refers to, or None"""
+        match = LOGO_URL_PATTERN.match(content or '')
+        return match.group(1) if match else None
+
+    def original_path(self, asset_id: str) -> str:
+        return os.path.join(self.directory, asset_id, 'original.png')
+
+    def _fit(self, info: Optional[dict], width: float, height: float) -> Tuple[int, int]:
+        """Variant box: never upscaled past the original or MAX_VARIANT_SIZE"""
+        return (max(1, min(round(width), MAX_VARIANT_SIZE, (info and info['width']) or MAX_VARIANT_SIZE)),
+                max(1, min(round(height), MAX_VARIANT_SIZE, (info and info['height']) or MAX_VARIANT_SIZE)))
+
+    def _variant_name(self, width: int, height: int, opacity: Optional[float]) -> str:
+        return f'{width}x{height}.png' if opacity is None else f'{width}x{height}-pm{opacity:.3f}.png'
+
+    def variant_path(self, asset_id: str, width: float, height: float,
+                     opacity: Optional[float] = None) -> str:
+        """Path of the variant fitting width x height; opacity set means the compositing variant"""
+        width, height = self._fit(self.info(asset_id), width, height)
+        return os.path.join(self.directory, asset_id, self._variant_name(width, height, opacity))
+
+    def info(self, asset_id: str) -> Optional[dict]:
+        """Size and URL of a stored logo, or None if unknown"""
+        path = self.original_path(asset_id)
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(24)
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        width, height = png_size(header) or (None, None)
+        return {
+            'id': asset_id,
+            'url': LOGO_URL_PREFIX + asset_id,
+            'width': width,
+            'height': height,
+            'bytes': size
+        }
+
+    def fetch(self, url: str) -> bytes:
+        """
+        Download a logo from a public http(s) host (at most MAX_LOGO_BYTES + 1
+        bytes); raises ValueError, also for private and loopback addresses
+        """
+        if not url.lower().startswith(('http://', 'https://')):
+            raise ValueError('url must be an http(s) URL')
+        try:
+            with _public_opener.open(url, timeout=self.fetch_timeout) as response:
+                data = response.read(MAX_LOGO_BYTES + 1)
+        except (OSError, ValueError) as e:
+            raise ValueError(f'Could not fetch logo: {e}')
+        return data
+
+    def _run(self, cmd: list, data: Optional[bytes] = None) -> Optional[bytes]:
+        try:
+            result = subprocess.run(cmd, input=data, capture_output=True, timeout=15)
+        except (subprocess.TimeoutExpired, FileNotFoundError) as e:
+            print(f"Error processing logo: {e}")
+            return None
+        if result.returncode != 0:
+            print(f"Error processing logo: {result.stderr.decode(errors='replace').strip()}")
+            return None
+        return result.stdout
+
+    def _write(self, path: str, data: bytes):
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def ingest(self, data: bytes) -> Tuple[dict, bool]:
+        """
+        Store a logo's bytes, decoding them once. Returns (info, created);
+        raises ValueError for oversized or undecodable images.
+        """
+        if not data:
+            raise ValueError('Logo is empty')
+        if len(data) > MAX_LOGO_BYTES:
+            raise ValueError(f'Logo is larger than {MAX_LOGO_BYTES // (1024 * 1024)} MB')
+        asset_id = hashlib.sha256(data).hexdigest()
+        existing = self.info(asset_id)
+        if existing:
+            return existing, False
+
+        png = self._run(['ffmpeg', '-nostdin', '-loglevel', 'error', '-protocol_whitelist', 'pipe', '-i', 'pipe:0',
+                         '-frames:v', '1', '-vf', 'format=rgba',
+                         '-f', 'image2pipe', '-c:v', 'png', 'pipe:1'], data)
+        if not png or not png_size(png):
+            raise ValueError('Logo is not a decodable image')
+        os.makedirs(os.path.join(self.directory, asset_id), exist_ok=True)
+        self._write(self.original_path(asset_id), png)
+        return self.info(asset_id), True
+
+    def variant(self, asset_id: str, width: float, height: float,
+                opacity: Optional[float] = None) -> Optional[str]:
+        """
+        Path of a logo scaled to fit width x height, generated on first use.
+        opacity set gives the premultiplied variant with that opacity applied,
+        for compositing. None if the logo is unknown, cannot be scaled or
+        already has MAX_VARIANTS variants.
+        """
+        info = self.info(asset_id)
+        if info is None:
+            return None
+        width, height = self._fit(info, width, height)
+        path = os.path.join(self.directory, asset_id, self._variant_name(width, height, opacity))
+        if os.path.exists(path):
+            return path
+        if len(os.listdir(os.path.dirname(path))) > MAX_VARIANTS:
+            return None
+
+        filters = ['format=gbrap', 'premultiply=inplace=1',
+                   f'scale={width}:{height}:force_original_aspect_ratio=decrease:flags=area']
+        if opacity is None:
+            filters.append('unpremultiply=inplace=1')
+        elif opacity < 1:
+            filters.append(f'colorchannelmixer=rr={opacity}:gg={opacity}:bb={opacity}:aa={opacity}')
+        filters.append('format=rgba')
+        png = self._run(['ffmpeg', '-nostdin', '-loglevel', 'error', '-protocol_whitelist', 'file,pipe',
+                         '-i', self.original_path(asset_id),
+                         '-vf', ','.join(filters), '-frames:v', '1',
+                         '-f', 'image2pipe', '-c:v', 'png', 'pipe:1'])
+        if not png:
+            return None
+        self._write(path, png)
+        return path
+
+# Global logo asset store instance
+logo_assets = LogoAssetStore()
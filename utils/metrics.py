@@ -0,0 +1,113 @@
+import bisect
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flask import g, request
+
+# Request latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names: Iterable[str], values: Iterable) -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def metric_family(name: str, kind: str, help_text: str,
+                  samples: Iterable[Tuple[dict, Optional[float]]]) -> List[str]:
+    """
+    Text exposition lines for one gauge or counter family; samples are
+    (labels, value) pairs and samples without a value are skipped
+    """
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+    for labels, value in samples:
+        if value is None:
+            continue
+        lines.append(f'{name}{_labels(labels.keys(), labels.values())} {_number(value)}')
+    return lines
+
+class Histogram:
+    """
+    Thread-safe cumulative histogram rendered in the Prometheus text format
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[tuple, dict] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: tuple, value: float):
+        with self._lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+                self.series[label_values] = series
+            series['counts'][bisect.bisect_left(self.buckets, value)] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = {key: (list(s['counts']), s['sum'], s['count']) for key, s in self.series.items()}
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for label_values, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _labels(self.label_names + ('le',), label_values + (_number(bound),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _labels(self.label_names, label_values)
+            lines.append(f'{self.name}_sum{labels} {_number(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+request_latency = Histogram(
+    'rtsp_api_request_duration_seconds',
+    'API request latency by route',
+    ('endpoint', 'method', 'status')
+)
+
+def instrument_blueprint(blueprint):
+    """Record the latency of every request handled by a blueprint"""
+    if getattr(blueprint, '_latency_instrumented', False):
+        # Blueprints are module globals; create_app may run more than once
+        return
+    blueprint._latency_instrumented = True
+
+    @blueprint.before_request
+    def _start_timer():
+        g.request_started_at = time.perf_counter()
+
+    @blueprint.after_request
+    def _observe_latency(response):
+        started_at = g.pop('request_started_at', None)
+        if started_at is not None:
+            request_latency.observe(
+                (request.endpoint or 'unknown', request.method, str(response.status_code)),
+                time.perf_counter() - started_at
+            )
+        return response
+
+def parse_progress_value(value: Optional[str]) -> Optional[float]:
+    """Number from an ffmpeg -progress value ('29.97', '1.01x', '2400.3kbits/s'); None for N/A"""
+    if not value:
+        return None
+    for suffix in ('kbits/s', 'x'):
+        if value.endswith(suffix):
+            value = value[:-len(suffix)]
+            break
+    try:
+        return float(value)
+    except ValueError:
+        return None
@@ -0,0 +1,170 @@
+import importlib.util
+import socket
+import threading
+import time
+from typing import Dict, Optional
+from utils.overlay_compositor import free_port, send_commands, zmq, zmq_filter
+
+# Motion gating needs NumPy. It is the slowest import of the app, so it is
+# only imported once a gated stream delivers frames
+HAVE_NUMPY = importlib.util.find_spec('numpy') is not None
+
+# Analysis stream the ingest sends over local UDP: tiny gray frames
+ANALYSIS_WIDTH = 64
+ANALYSIS_HEIGHT = 36
+ANALYSIS_FPS = 4
+# Luma change (0-255) below which a pixel counts as sensor noise
+PIXEL_DELTA = 12
+# Encoded frame rate of idle streams
+IDLE_FPS = 1
+
+class MotionGate:
+    """
+    Activity-driven frame rate for transcoded streams of mostly static scenes.
+
+    The ingest decodes each gated stream once more into a 64x36 gray stream
+    at 4 fps and sends it over local UDP. Every frame's activity score is
+    the fraction of pixels whose luma changed by more than PIXEL_DELTA,
+    computed with NumPy over every frame received at once. Above threshold
+    the stream is active and encodes every frame. After idle_after seconds
+    below it, a framestep filter in front of the encoder is enabled over
+    zmq and only IDLE_FPS frames per second reach x264. Its CRF rate
+    control then spends almost nothing on an unchanged scene. Motion turns
+    full rate back on within one analysis frame. The encoder never
+    restarts, so playback has no discontinuity.
+    """
+
+    def __init__(self, threshold: float = 0.01, idle_after: float = 10.0):
+        self.threshold = threshold
+        self.idle_after = idle_after
+        self.streams: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        """Gating needs NumPy for scoring and pyzmq to switch running encoders"""
+        return HAVE_NUMPY and zmq is not None
+
+    def register(self, stream_id: str, source_fps: Optional[float]):
+        """Open the analysis socket of a stream and start scoring what arrives"""
+        with self._lock:
+            if stream_id in self.streams:
+                return
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(('127.0.0.1', 0))
+            sock.settimeout(1.0)
+            self.streams[stream_id] = {
+                'socket': sock,
+                'port': sock.getsockname()[1],
+                'zmq_port': free_port(),
+                'step': max(1, round((source_fps or 25) / IDLE_FPS)),
+                'full_fps': source_fps,
+                'state': 'active',
+                'score': None,
+                'score_avg': None,
+                'last_motion_at': time.time(),
+                'switches': 0,
+                'frames': 0
+            }
+        threading.Thread(target=self._read_loop, args=(stream_id, sock),
+                         name=f'motion-{stream_id}', daemon=True).start()
+
+    def forget(self, stream_id: str):
+        """Stop scoring a stopped stream"""
+        with self._lock:
+            entry = self.streams.pop(stream_id, None)
+        if entry:
+            entry['socket'].close()
+
+    def filter_chain(self, stream_id: str) -> Optional[str]:
+        """Filters gating the encoder's input, in the stream's current state"""
+        with self._lock:
+            entry = self.streams.get(stream_id)
+            if entry is None:
+                return None
+            enable = 1 if entry['state'] == 'idle' else 0
+            return f"{zmq_filter(entry['zmq_port'])},framestep@motion=step={entry['step']}:enable={enable}"
+
+    def analysis_output(self, stream_id: str) -> dict:
+        """Output spec sending a stream's analysis frames to its socket"""
+        with self._lock:
+            port = self.streams[stream_id]['port']
+        return {
+            'maps': ['0:v:0'],
+            'codec_args': [
+                '-vf', f'fps={ANALYSIS_FPS},scale={ANALYSIS_WIDTH}:{ANALYSIS_HEIGHT},format=gray',
+                '-c:v', 'rawvideo'
+            ],
+            'format': 'rawvideo',
+            'options': [],
+            'path': f'udp://127.0.0.1:{port}?pkt_size={ANALYSIS_WIDTH * ANALYSIS_HEIGHT}'
+        }
+
+    def _read_loop(self, stream_id: str, sock: socket.socket):
+        import numpy as np
+        frame_size = ANALYSIS_WIDTH * ANALYSIS_HEIGHT
+        pending = b''
+        previous = None
+        while True:
+            try:
+                pending += sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                return  # Closed by forget()
+            count = len(pending) // frame_size
+            if not count:
+                continue
+            frames = np.frombuffer(pending[:count * frame_size], dtype=np.uint8).reshape(count, frame_size)
+            pending = pending[count * frame_size:]
+            if previous is not None:
+                stack = np.vstack([previous[np.newaxis], frames]).astype(np.int16)
+                scores = (np.abs(np.diff(stack, axis=0)) > PIXEL_DELTA).mean(axis=1)
+                self.score(stream_id, scores)
+            previous = frames[-1]
+
+    def score(self, stream_id: str, scores, now: Optional[float] = None):
+        """Apply the activity scores of consecutive frames, switching profile when due"""
+        now = now or time.time()
+        with self._lock:
+            entry = self.streams.get(stream_id)
+            if entry is None:
+                return
+            entry['frames'] += len(scores)
+            entry['score'] = round(float(scores[-1]), 4)
+            average = entry['score_avg'] if entry['score_avg'] is not None else float(scores[0])
+            for value in scores:
+                average = 0.9 * average + 0.1 * float(value)
+            entry['score_avg'] = round(average, 4)
+            if float(max(scores)) >= self.threshold:
+                entry['last_motion_at'] = now
+            target = 'idle' if now - entry['last_motion_at'] >= self.idle_after else 'active'
+            if target == entry['state']:
+                return
+            port = entry['zmq_port']
+
+        # The state only changes once the encoder took the command; otherwise
+        # the next batch retries
+        if send_commands(port, [f"framestep@motion enable {1 if target == 'idle' else 0}"]):
+            with self._lock:
+                entry = self.streams.get(stream_id)
+                if entry is not None and entry['state'] != target:
+                    entry['state'] = target
+                    entry['switches'] += 1
+
+    def status(self, stream_id: str) -> Optional[dict]:
+        """Activity of a gated stream for API payloads"""
+        with self._lock:
+            entry = self.streams.get(stream_id)
+            if entry is None:
+                return None
+            return {
+                'state': entry['state'],
+                'score': entry['score'],
+                'score_avg': entry['score_avg'],
+                'threshold': self.threshold,
+                'encoded_fps': IDLE_FPS if entry['state'] == 'idle' else entry['full_fps'],
+                'last_motion_at': entry['last_motion_at'],
+                'switches': entry['switches'],
+                'frames_analyzed': entry['frames']
+            }
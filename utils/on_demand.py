@@ -0,0 +1,219 @@
+import os
+import threading
+import time
+from typing import Optional
+from utils.rtsp_handler import rtsp_handler
+from utils.scheduler import AdmissionError
+from utils.segment_cache import segment_cache
+
+class OnDemandManager:
+    """
+    Viewer-driven stream activation.
+    Streams are started by the first playlist request and stopped once no
+    playlist or segment has been fetched for idle_timeout seconds. Pre-warmed
+    streams are kept running regardless of viewers.
+    """
+
+    def __init__(self, handler, idle_timeout: float = 60.0, reap_interval: float = 5.0,
+                 viewer_window: float = 30.0):
+        self.handler = handler
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self.viewer_window = viewer_window
+        self.output_root = 'hls_output'
+        self.activity = {}
+        self.pinned = set()
+        # Starts rejected by admission control, kept until their retry time
+        self.rejected = {}
+        self._starting = set()
+        self._lock = threading.Lock()
+        self._reaper_thread = None
+
+    def configure(self, output_root: str, idle_timeout: Optional[float] = None):
+        """Apply application configuration"""
+        self.output_root = output_root
+        if idle_timeout is not None:
+            self.idle_timeout = idle_timeout
+
+    def output_dir(self, stream_id: str) -> str:
+        """Directory the HLS files of a stream are written to"""
+        return os.path.join(self.output_root, stream_id)
+
+    def playlist_path(self, stream_id: str) -> str:
+        """Path of a stream's HLS playlist"""
+        return os.path.join(self.output_dir(stream_id), f"{stream_id}.m3u8")
+
+    def touch(self, stream_id: str, viewer: Optional[str] = None):
+        """Record a playlist or segment fetch"""
+        now = time.time()
+        with self._lock:
+            entry = self.activity.setdefault(stream_id, {
+                'last_request_at': now,
+                'requests': 0,
+                'viewers': {}
+            })
+            entry['last_request_at'] = now
+            entry['requests'] += 1
+            if viewer:
+                entry['viewers'][viewer] = now
+
+    def _claim(self, stream_id: str, pinned: bool) -> Optional[bool]:
+        """
+        Reserve the start of a stream. Returns None if the caller should
+        start it, otherwise whether it is already running or starting.
+        """
+        with self._lock:
+            if pinned:
+                self.pinned.add(stream_id)
+            if stream_id in self._starting:
+                return True
+            if self.handler.get_stream_summary(stream_id) is not None:
+                return True
+            rejection = self.rejected.get(stream_id)
+            if rejection and time.time() < rejection['retry_at']:
+                return False
+            self.rejected.pop(stream_id, None)
+            self._starting.add(stream_id)
+            return None
+
+    def ensure_started(self, stream_id: str, rtsp_url: str, pinned: bool = False, **options) -> bool:
+        """
+        Start a stream in the background unless it is already running.
+        options are passed to RTSPHandler.start_hls_conversion.
+        Returns True if the stream is running or starting.
+        """
+        claimed = self._claim(stream_id, pinned)
+        if claimed is not None:
+            return claimed
+
+        # Probing the source can take seconds; never block the request thread on it
+        starter = threading.Thread(
+            target=self._start,
+            args=(stream_id, rtsp_url, options),
+            name=f'on-demand-start-{stream_id}',
+            daemon=True
+        )
+        starter.start()
+        self._ensure_reaper()
+        return True
+
+    def start(self, stream_id: str, rtsp_url: str, pinned: bool = False, **options) -> Optional[str]:
+        """
+        Start a stream on the calling thread (for background jobs). Returns
+        None once it is running or starting, otherwise why it is not.
+        """
+        claimed = self._claim(stream_id, pinned)
+        if claimed is None:
+            started = self._start(stream_id, rtsp_url, options)
+            self._ensure_reaper()
+            if started:
+                return None
+        elif claimed:
+            return None
+        rejection = self.start_error(stream_id)
+        return rejection['error'] if rejection else 'Failed to start stream'
+
+    def _start(self, stream_id: str, rtsp_url: str, options: dict) -> bool:
+        try:
+            # The idle clock starts when the stream is requested, not when ffmpeg is up
+            self.touch(stream_id)
+            return self.handler.start_hls_conversion(rtsp_url, self.output_dir(stream_id), stream_id, **options)
+        except AdmissionError as e:
+            print(f"Stream {stream_id} not admitted: {e}")
+            with self._lock:
+                self.rejected[stream_id] = {
+                    'error': str(e),
+                    'retry_after': e.retry_after,
+                    'retry_at': time.time() + e.retry_after
+                }
+            return False
+        finally:
+            with self._lock:
+                self._starting.discard(stream_id)
+
+    def start_error(self, stream_id: str) -> Optional[dict]:
+        """Admission rejection of the last start attempt, if still in effect"""
+        with self._lock:
+            rejection = self.rejected.get(stream_id)
+            if rejection is None or time.time() >= rejection['retry_at']:
+                return None
+            return {
+                'error': rejection['error'],
+                'retry_after': max(1, round(rejection['retry_at'] - time.time()))
+            }
+
+    def wait_for_playlist(self, stream_id: str, timeout: float = 5.0, filename: Optional[str] = None) -> bool:
+        """
+        Wait briefly for a freshly started stream to write its first playlist
+        (or another named output file)
+        """
+        path = os.path.join(self.output_dir(stream_id), filename) if filename else self.playlist_path(stream_id)
+        deadline = time.time() + timeout
+        while not os.path.exists(path):
+            if time.time() >= deadline or self.start_error(stream_id):
+                return False
+            time.sleep(0.2)
+        return True
+
+    def release(self, stream_id: str):
+        """Stop keeping a stream warm; it becomes subject to idle shutdown"""
+        with self._lock:
+            self.pinned.discard(stream_id)
+
+    def _ensure_reaper(self):
+        with self._lock:
+            if self._reaper_thread and self._reaper_thread.is_alive():
+                return
+            self._reaper_thread = threading.Thread(
+                target=self._reap_loop,
+                name='on-demand-reaper',
+                daemon=True
+            )
+            self._reaper_thread.start()
+
+    def _reap_loop(self):
+        """Stop streams nobody has watched for idle_timeout seconds"""
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                self.reap_idle()
+            except Exception as e:
+                print(f"Error stopping idle streams: {e}")
+
+    def reap_idle(self, now: Optional[float] = None):
+        """Stop every idle, unpinned stream"""
+        now = now or time.time()
+        with self._lock:
+            idle = [
+                stream_id for stream_id, entry in self.activity.items()
+                if stream_id not in self.pinned
+                and stream_id not in self._starting
+                and now - entry['last_request_at'] > self.idle_timeout
+            ]
+            for stream_id in idle:
+                del self.activity[stream_id]
+            for entry in self.activity.values():
+                entry['viewers'] = {
+                    viewer: seen for viewer, seen in entry['viewers'].items()
+                    if now - seen <= self.viewer_window
+                }
+        for stream_id in idle:
+            self.handler.stop_stream(stream_id)
+            segment_cache.forget(self.output_dir(stream_id))
+
+    def get_activity(self, stream_id: str) -> Optional[dict]:
+        """Viewer activity of a stream for API payloads"""
+        now = time.time()
+        with self._lock:
+            entry = self.activity.get(stream_id)
+            if entry is None:
+                return None
+            return {
+                'last_request_at': entry['last_request_at'],
+                'requests': entry['requests'],
+                'viewers': sum(1 for seen in entry['viewers'].values() if now - seen <= self.viewer_window),
+                'pinned': stream_id in self.pinned
+            }
+
+# Global on-demand manager instance
+on_demand = OnDemandManager(rtsp_handler)
@@ -0,0 +1,280 @@
+import hashlib
+import os
+import socket
+import subprocess
+import threading
+from typing import Dict, List, Optional
+from utils.logo_assets import logo_assets
+
+try:
+    import zmq
+except ImportError:  # Hot updates need pyzmq and an ffmpeg built with libzmq
+    zmq = None
+
+def _escape_option(value: str) -> str:
+    """Escape a value for ffmpeg's filter option parser"""
+    return ''.join('\\' + c if c in "\\':" else c for c in str(value))
+
+def _escape_graph(value: str) -> str:
+    """Escape filter arguments for ffmpeg's filtergraph parser"""
+    return ''.join('\\' + c if c in "\\'[],;" else c for c in value)
+
+def _color(value: Optional[str], opacity: float) -> Optional[str]:
+    """'#RRGGBB' to ffmpeg's 0xRRGGBB@alpha, None for transparent/invalid"""
+    if not value or not value.startswith('#') or len(value) != 7:
+        return None
+    return f'0x{value[1:]}@{opacity:.3f}'
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def zmq_filter(port: int) -> str:
+    """zmq filter receiving commands for a running graph on a local port"""
+    return f'zmq={_escape_graph("bind_address=" + _escape_option(f"tcp://127.0.0.1:{port}"))}'
+
+def send_commands(port: int, commands: List[str]) -> bool:
+    """Deliver filter commands to the zmq filter of a running graph"""
+    context = zmq.Context.instance()
+    sock = context.socket(zmq.REQ)
+    sock.setsockopt(zmq.LINGER, 0)
+    sock.setsockopt(zmq.RCVTIMEO, 1000)
+    sock.setsockopt(zmq.SNDTIMEO, 1000)
+    try:
+        sock.connect(f'tcp://127.0.0.1:{port}')
+        for command in commands:
+            sock.send_string(command)
+            reply = sock.recv_string()
+            if not reply.startswith('0 '):
+                print(f"Filter command rejected ({command}): {reply}")
+                return False
+        return True
+    except zmq.ZMQError as e:
+        print(f"Error sending filter commands: {e}")
+        return False
+    finally:
+        sock.close()
+
+class OverlayCompositor:
+    """
+    Server-side overlay burn-in.
+    Compiles overlays (Overlay.to_dict() rows) into one ffmpeg video filter
+    graph per stream: a drawtext filter per text overlay and an overlay filter
+    fed by a pre-rasterized PNG per logo (for stored logos, the asset
+    store's premultiplied variant). Every filter instance is named after
+    its overlay, so position, text, color and visibility edits are sent to the
+    running encoder over the zmq filter instead of restarting it. Only changes
+    to the set of overlays or to a logo's image/size/opacity need a restart.
+    """
+
+    def __init__(self, cache_dir: str = 'overlay_cache', canvas_width: float = 1280.0,
+                 font_file: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self.canvas_width = canvas_width
+        self.font_file = font_file
+        self.hot_updates = zmq is not None
+        self.overlays: Dict[int, dict] = {}
+        self.streams: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, cache_dir: str, canvas_width: Optional[float] = None,
+                  font_file: Optional[str] = None, hot_updates: Optional[bool] = None):
+        """Apply application configuration"""
+        self.cache_dir = cache_dir
+        if canvas_width:
+            self.canvas_width = canvas_width
+        self.font_file = font_file
+        if hot_updates is not None:
+            self.hot_updates = hot_updates and zmq is not None
+
+    def logo_path(self, overlay: dict, scale: float = 1.0) -> str:
+        """Cache path of a logo rasterized at its on-screen size and opacity"""
+        asset_id = logo_assets.asset_id(overlay['content'])
+        if asset_id:
+            return logo_assets.variant_path(asset_id, overlay['width'] * scale, overlay['height'] * scale,
+                                            overlay['opacity'])
+        key = f"{overlay['content']}|{round(overlay['width'] * scale)}|{round(overlay['height'] * scale)}|{overlay['opacity']}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest() + '.png')
+
+    def rasterize_logo(self, overlay: dict, scale: float = 1.0) -> Optional[str]:
+        """
+        Decode, scale and apply opacity to a logo once; later graphs reuse the PNG.
+        Stored logos use the asset store's premultiplied variant; anything else
+        must be an http(s) URL, downloaded from a public host by the asset
+        store and only then handed to ffmpeg, which never opens the content
+        itself.
+        """
+        asset_id = logo_assets.asset_id(overlay['content'])
+        if asset_id:
+            return logo_assets.variant(asset_id, overlay['width'] * scale, overlay['height'] * scale,
+                                       overlay['opacity'])
+        path = self.logo_path(overlay, scale)
+        if os.path.exists(path):
+            return path
+        try:
+            data = logo_assets.fetch(overlay['content'] or '')
+        except ValueError as e:
+            print(f"Error rasterizing logo {overlay['content']}: {e}")
+            return None
+        os.makedirs(self.cache_dir, exist_ok=True)
+        width = max(1, round(overlay['width'] * scale))
+        height = max(1, round(overlay['height'] * scale))
+        cmd = [
+            'ffmpeg', '-nostdin', '-loglevel', 'error',
+            '-protocol_whitelist', 'pipe',
+            '-i', 'pipe:0',
+            '-vf', f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                   f"format=rgba,colorchannelmixer=aa={overlay['opacity']}",
+            '-frames:v', '1',
+            '-y', path + '.tmp.png'
+        ]
+        try:
+            result = subprocess.run(cmd, input=data, capture_output=True, timeout=15)
+            if result.returncode != 0:
+                print(f"Error rasterizing logo {overlay['content']}: {result.stderr.decode(errors='replace')}")
+                return None
+            os.replace(path + '.tmp.png', path)
+            return path
+        except (subprocess.TimeoutExpired, FileNotFoundError) as e:
+            print(f"Error rasterizing logo {overlay['content']}: {e}")
+            return None
+
+    def _drawtext_args(self, overlay: dict, scale: float) -> str:
+        opacity = overlay['opacity']
+        args = [
+            'expansion=none',
+            f"text={_escape_option(overlay['content'] or '')}",
+            f"x={round(overlay['x_position'] * scale)}",
+            f"y={round(overlay['y_position'] * scale)}",
+            f"fontsize={max(1, round((overlay['font_size'] or 16) * scale))}",
+            f"fontcolor={_color(overlay['font_color'], opacity) or f'0xFFFFFF@{opacity:.3f}'}",
+            'box=1',
+            f'boxborderw={max(1, round(4 * scale))}',
+            # Mirrors the dashboard, which draws a translucent box for 'transparent'
+            f"boxcolor={_color(overlay['background_color'], opacity) or f'0x000000@{0.3 * opacity:.3f}'}"
+        ]
+        if self.font_file:
+            args.append(f'fontfile={_escape_option(self.font_file)}')
+        return ':'.join(args)
+
+    def _compiled(self, overlays: List[dict], scale: float) -> List[dict]:
+        """Overlays that go into a graph: all text, logos once rasterized"""
+        return [
+            overlay for overlay in sorted(overlays, key=lambda o: o['id'])
+            if overlay['type'] != 'logo' or os.path.exists(self.logo_path(overlay, scale))
+        ]
+
+    def _signature(self, overlays: List[dict], scale: float) -> list:
+        """What cannot be changed on a running graph"""
+        return [
+            (overlay['id'], self.logo_path(overlay, scale) if overlay['type'] == 'logo' else None)
+            for overlay in self._compiled(overlays, scale)
+        ]
+
+    def prepare(self, width: Optional[int]):
+        """Rasterize every logo for a stream of the given width ahead of graph building"""
+        scale = (width or self.canvas_width) / self.canvas_width
+        with self._lock:
+            overlays = list(self.overlays.values())
+        for overlay in overlays:
+            if overlay['type'] == 'logo':
+                self.rasterize_logo(overlay, scale)
+
+    def filter_graph(self, stream_id: str, width: Optional[int]) -> Optional[str]:
+        """
+        Video filter graph (for -vf) burning all overlays into a stream of the
+        given width, or None if there are no overlays. Inactive overlays are
+        compiled in disabled so they can be re-enabled without a restart.
+        """
+        scale = (width or self.canvas_width) / self.canvas_width
+        with self._lock:
+            overlays = self._compiled(self.overlays.values(), scale)
+        if not overlays:
+            # Remember the stream so adding overlays later restarts it with a graph
+            with self._lock:
+                self.streams[stream_id] = {'port': None, 'scale': scale, 'signature': []}
+            return None
+
+        sources = []
+        chain = []
+        label = 'in'
+        port = free_port() if self.hot_updates else None
+        if port:
+            chain.append(f'[in]{zmq_filter(port)}[z]')
+            label = 'z'
+
+        for index, overlay in enumerate(overlays):
+            name = f"ov{overlay['id']}"
+            enable = f":enable={1 if overlay['is_active'] else 0}"
+            next_label = f'v{index}'
+            if overlay['type'] == 'logo':
+                path = self.logo_path(overlay, scale)
+                sources.append(f"movie={_escape_graph(_escape_option(path))},format=rgba[{name}]")
+                args = f"x={round(overlay['x_position'] * scale)}:y={round(overlay['y_position'] * scale)}{enable}"
+                if logo_assets.asset_id(overlay['content']):
+                    args += ':alpha=premultiplied'
+                chain.append(f'[{label}][{name}]overlay@{name}={_escape_graph(args)}[{next_label}]')
+            else:
+                args = self._drawtext_args(overlay, scale) + enable
+                chain.append(f'[{label}]drawtext@{name}={_escape_graph(args)}[{next_label}]')
+            label = next_label
+
+        # Rename the last output pad to the graph output
+        chain[-1] = chain[-1][:chain[-1].rindex('[')] + '[out]'
+        with self._lock:
+            self.streams[stream_id] = {
+                'port': port,
+                'scale': scale,
+                'signature': self._signature(overlays, scale)
+            }
+        return ';'.join(sources + chain)
+
+    def _hot_commands(self, old: dict, new: dict, scale: float) -> List[str]:
+        """zmq commands turning overlay old into new on a running graph"""
+        name = f"ov{new['id']}"
+        commands = []
+        if new['type'] == 'logo':
+            target = f'overlay@{name}'
+            if (old['x_position'], old['y_position']) != (new['x_position'], new['y_position']):
+                commands.append(f"{target} x {round(new['x_position'] * scale)}")
+                commands.append(f"{target} y {round(new['y_position'] * scale)}")
+        else:
+            target = f'drawtext@{name}'
+            if self._drawtext_args(old, scale) != self._drawtext_args(new, scale):
+                commands.append(f'{target} reinit {self._drawtext_args(new, scale)}')
+        if old['is_active'] != new['is_active']:
+            commands.append(f"{target} enable {1 if new['is_active'] else 0}")
+        return commands
+
+    def set_overlays(self, overlays: List[dict]) -> List[str]:
+        """
+        Replace the overlay set. Changes are pushed to running graphs where
+        possible; returns the stream ids whose encoders must be restarted.
+        """
+        new = {overlay['id']: overlay for overlay in overlays}
+        with self._lock:
+            old = self.overlays
+            self.overlays = new
+            streams = dict(self.streams)
+
+        restart = []
+        for stream_id, graph in streams.items():
+            scale = graph['scale']
+            for overlay in new.values():
+                if overlay['type'] == 'logo':
+                    self.rasterize_logo(overlay, scale)
+            if self._signature(new.values(), scale) != graph['signature']:
+                restart.append(stream_id)
+                continue
+            commands = []
+            for overlay in self._compiled(new.values(), scale):
+                commands += self._hot_commands(old[overlay['id']], overlay, scale)
+            if commands and not (graph['port'] and send_commands(graph['port'], commands)):
+                restart.append(stream_id)
+        return restart
+
+    def forget(self, stream_id: str):
+        """Drop graph state for a stopped stream"""
+        with self._lock:
+            self.streams.pop(stream_id, None)
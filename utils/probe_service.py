@@ -0,0 +1,95 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Optional
+
+class ProbeService:
+    """
+    Concurrent, cached RTSP source probing.
+    ffprobe runs on a bounded thread pool; results (reachability, codecs,
+    resolution, fps) are cached per normalized URL for ttl seconds, failures for
+    negative_ttl seconds. Concurrent requests for the same URL share one probe.
+    """
+
+    def __init__(self, probe_fn: Callable[[str], Optional[dict]], key_fn: Callable[[str], str] = str,
+                 max_workers: int = 16, ttl: float = 300.0, negative_ttl: float = 30.0):
+        self.probe_fn = probe_fn
+        self.key_fn = key_fn
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.cache: Dict[str, dict] = {}
+        self.pending: Dict[str, Future] = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def configure(self, max_workers: Optional[int] = None, ttl: Optional[float] = None):
+        """Apply application configuration (pool size applies before first use)"""
+        with self._lock:
+            if max_workers and self._executor is None:
+                self.max_workers = max_workers
+            if ttl is not None:
+                self.ttl = ttl
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ffprobe')
+        return self._executor
+
+    def get_cached(self, rtsp_url: str) -> Optional[dict]:
+        """Fresh cached result for a URL, or None"""
+        key = self.key_fn(rtsp_url)
+        with self._lock:
+            return self._fresh(key)
+
+    def _fresh(self, key: str) -> Optional[dict]:
+        result = self.cache.get(key)
+        if result is None:
+            return None
+        ttl = self.ttl if result['reachable'] else self.negative_ttl
+        if time.time() - result['probed_at'] > ttl:
+            del self.cache[key]
+            return None
+        return result
+
+    def submit(self, rtsp_url: str, force: bool = False) -> Future:
+        """Probe a URL in the background; cached and in-flight probes are reused"""
+        key = self.key_fn(rtsp_url)
+        with self._lock:
+            result = None if force else self._fresh(key)
+            if result is not None:
+                future = Future()
+                future.set_result(result)
+                return future
+            future = self.pending.get(key)
+            if future is None:
+                future = self._pool().submit(self._run, key, rtsp_url)
+                self.pending[key] = future
+            return future
+
+    def _run(self, key: str, rtsp_url: str) -> dict:
+        try:
+            probe = self.probe_fn(rtsp_url)
+        except Exception as e:
+            print(f"Error probing {rtsp_url}: {e}")
+            probe = None
+        result = dict(probe or {})
+        result['reachable'] = probe is not None
+        result['probed_at'] = time.time()
+        with self._lock:
+            self.cache[key] = result
+            self.pending.pop(key, None)
+        return result
+
+    def probe(self, rtsp_url: str, timeout: Optional[float] = None, force: bool = False) -> dict:
+        """Probe a URL and wait for the result"""
+        return self.submit(rtsp_url, force=force).result(timeout)
+
+    def probe_many(self, rtsp_urls: Iterable[str], timeout: float, force: bool = False) -> Dict[str, Optional[dict]]:
+        """
+        Probe many URLs concurrently, waiting at most timeout seconds overall.
+        URLs still being probed map to None; ask again later to collect them.
+        """
+        futures = {url: self.submit(url, force=force) for url in dict.fromkeys(rtsp_urls)}
+        wait(futures.values(), timeout=timeout)
+        return {url: future.result() if future.done() else None for url, future in futures.items()}
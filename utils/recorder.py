@@ -0,0 +1,367 @@
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+# Seconds per recorded fMP4 segment
+RECORD_SEGMENT_DURATION = 6
+# Name of the playlist ffmpeg writes into a stream's spool directory
+SPOOL_PLAYLIST = 'record.m3u8'
+
+# Header: magic, format version, head (first live record) and base (records
+# dropped by compactions, which precede the first record in the file).
+# Version 1 files have no base field and were never compacted.
+_HEADER = struct.Struct('>4sIQQ')
+_HEADER_V1 = struct.Struct('>4sIQ')
+_RECORD = struct.Struct('>qIIIQ')
+_MAGIC = b'RIDX'
+_VERSION = 2
+
+class RecordingIndex:
+    """
+    Append-only index of one stream's recorded segments.
+
+    Fixed-size records (start ms, duration ms, init id, size, running byte
+    total) are stored in start-time order, so the segment covering any
+    timestamp is found with a binary search over file offsets: O(log n)
+    reads, however many weeks are recorded. Retention drops records from
+    the head by advancing a header field; the file is compacted once most
+    of it is dead. Record positions count every segment ever indexed, so
+    they never change, compaction included, and serve as HLS media
+    sequence numbers.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _open(self, mode: str = 'rb'):
+        return open(self.path, mode)
+
+    def _layout(self, f) -> Optional[Tuple[int, int, int, int]]:
+        """(header size, base, head, count) of an open index, or None if it is not one"""
+        data = f.read(_HEADER.size)
+        if len(data) < _HEADER_V1.size:
+            return None
+        magic, version, head = _HEADER_V1.unpack(data[:_HEADER_V1.size])
+        if magic != _MAGIC:
+            return None
+        if version == 1:
+            header_size, base = _HEADER_V1.size, 0
+        elif len(data) == _HEADER.size:
+            header_size, base = _HEADER.size, _HEADER.unpack(data)[3]
+        else:
+            return None
+        size = os.fstat(f.fileno()).st_size
+        # A record being appended concurrently is not counted until complete
+        return header_size, base, head, base + (size - header_size) // _RECORD.size
+
+    def bounds(self) -> Tuple[int, int]:
+        """(head, count): live records are head <= i < count"""
+        try:
+            with self._open() as f:
+                layout = self._layout(f)
+        except OSError:
+            return 0, 0
+        return layout[2:] if layout else (0, 0)
+
+    def _read(self, f, layout: tuple, index: int) -> tuple:
+        header_size, base = layout[:2]
+        f.seek(header_size + (index - base) * _RECORD.size)
+        return _RECORD.unpack(f.read(_RECORD.size))
+
+    def record(self, index: int) -> tuple:
+        with self._open() as f:
+            return self._read(f, self._layout(f), index)
+
+    def append(self, start_ms: int, duration_ms: int, init_id: int, size: int):
+        """Add the newest segment"""
+        if not os.path.exists(self.path):
+            with self._open('wb') as f:
+                f.write(_HEADER.pack(_MAGIC, _VERSION, 0, 0))
+        head, count = self.bounds()
+        total = self.record(count - 1)[4] if count > head else 0
+        with self._open('ab') as f:
+            f.write(_RECORD.pack(start_ms, duration_ms, init_id, size, total + size))
+
+    def usage(self) -> int:
+        """Bytes of the live segments, from the running totals in O(1)"""
+        head, count = self.bounds()
+        if count <= head:
+            return 0
+        first = self.record(head)
+        return self.record(count - 1)[4] - first[4] + first[3]
+
+    def find(self, timestamp_ms: int) -> int:
+        """Index of the first live segment ending after timestamp_ms (count if none)"""
+        try:
+            with self._open() as f:
+                layout = self._layout(f)
+                if layout is None:
+                    return 0
+                low, high = layout[2:]
+                while low < high:
+                    middle = (low + high) // 2
+                    start_ms, duration_ms = self._read(f, layout, middle)[:2]
+                    if start_ms + duration_ms <= timestamp_ms:
+                        low = middle + 1
+                    else:
+                        high = middle
+        except OSError:
+            return 0
+        return low
+
+    def window(self, start_ms: int, end_ms: int, limit: int) -> Iterator[tuple]:
+        """Segments overlapping [start_ms, end_ms), oldest first, at most limit"""
+        first = self.find(start_ms)
+        try:
+            with self._open() as f:
+                layout = self._layout(f)
+                if layout is None:
+                    return
+                # Compacted meanwhile: resume at the new head
+                first = max(first, layout[2])
+                for index in range(first, min(layout[3], first + limit)):
+                    record = self._read(f, layout, index)
+                    if record[0] >= end_ms:
+                        return
+                    yield record
+        except OSError:
+            return
+
+    def drop_head(self, head: int):
+        """Forget records before head, compacting when most of the file is dead"""
+        with self._open() as f:
+            header_size, base, _, count = self._layout(f)
+        if (head - base) * 2 > count - base and head - base > 1024:
+            temporary = self.path + '.tmp'
+            with self._open() as source, open(temporary, 'wb') as target:
+                target.write(_HEADER.pack(_MAGIC, _VERSION, head, head))
+                source.seek(header_size + (head - base) * _RECORD.size)
+                target.write(source.read((count - head) * _RECORD.size))
+            os.replace(temporary, self.path)
+        else:
+            with self._open('r+b') as f:
+                if header_size == _HEADER_V1.size:
+                    f.write(_HEADER_V1.pack(_MAGIC, 1, head))
+                else:
+                    f.write(_HEADER.pack(_MAGIC, _VERSION, head, base))
+
+def segment_name(start_ms: int) -> str:
+    """Path of a recorded segment relative to the stream's recording directory"""
+    return os.path.join(datetime.utcfromtimestamp(start_ms / 1000).strftime('%Y%m%d'), f'{start_ms}.m4s')
+
+def init_name(init_id: int) -> str:
+    return f'init-{init_id}.mp4'
+
+def parse_spool_playlist(data: str) -> List[dict]:
+    """Segments of ffmpeg's recording playlist: uri, init uri, start ms and duration ms"""
+    segments = []
+    init = None
+    start_ms = None
+    duration_ms = None
+    for raw in data.splitlines():
+        line = raw.strip()
+        if line.startswith('#EXT-X-MAP:'):
+            init = line.split('URI="', 1)[1].split('"', 1)[0] if 'URI="' in line else None
+        elif line.startswith('#EXT-X-PROGRAM-DATE-TIME:'):
+            value = line.split(':', 1)[1].replace('Z', '+00:00')
+            if len(value) > 5 and value[-5] in '+-' and value[-3] != ':':
+                # ffmpeg writes offsets as +0000
+                value = value[:-2] + ':' + value[-2:]
+            start_ms = round(datetime.fromisoformat(value).timestamp() * 1000)
+        elif line.startswith('#EXTINF:'):
+            duration_ms = round(float(line.split(':', 1)[1].split(',', 1)[0]) * 1000)
+        elif line and not line.startswith('#'):
+            if start_ms is not None and duration_ms is not None:
+                segments.append({'uri': line, 'init': init, 'start_ms': start_ms, 'duration_ms': duration_ms})
+                start_ms += duration_ms
+            duration_ms = None
+    return segments
+
+class Recorder:
+    """
+    Moves segments written by the recording output of an ingest from the
+    stream's spool directory into the time-indexed store, and enforces
+    retention by age and per-stream disk quota. Runs in the process that
+    owns the encoders; any web process can serve recordings from disk.
+    """
+
+    def __init__(self, root: str = 'recordings', retention_hours: float = 168.0,
+                 quota_bytes: int = 0, interval: float = 2.0):
+        self.root = root
+        self.retention_hours = retention_hours
+        self.quota_bytes = quota_bytes
+        self.interval = interval
+        self.streams = set()
+        self._lock = threading.Lock()
+        # Collection and retention of a stream must not interleave
+        self._collect_lock = threading.Lock()
+        self._thread = None
+
+    def configure(self, root: str, retention_hours: Optional[float] = None, quota_bytes: Optional[int] = None):
+        """Apply application configuration"""
+        self.root = root
+        if retention_hours is not None:
+            self.retention_hours = retention_hours
+        if quota_bytes is not None:
+            self.quota_bytes = quota_bytes
+
+    def stream_dir(self, stream_id: str) -> str:
+        return os.path.join(self.root, stream_id)
+
+    def spool_dir(self, stream_id: str) -> str:
+        return os.path.join(self.stream_dir(stream_id), 'spool')
+
+    def index(self, stream_id: str) -> RecordingIndex:
+        return RecordingIndex(os.path.join(self.stream_dir(stream_id), 'index.bin'))
+
+    def output_options(self, stream_id: str) -> Tuple[list, str]:
+        """hls muxer options and playlist path for a stream's recording output"""
+        spool = self.spool_dir(stream_id)
+        os.makedirs(spool, exist_ok=True)
+        # A new init segment per ffmpeg run; segments reference theirs by id
+        init_id = int(time.time())
+        return [
+            ('hls_time', str(RECORD_SEGMENT_DURATION)),
+            ('hls_list_size', '10'),
+            ('hls_segment_type', 'fmp4'),
+            ('hls_fmp4_init_filename', init_name(init_id)),
+            ('hls_segment_filename', os.path.join(spool, f'{init_id}-%d.m4s')),
+            ('hls_flags', 'program_date_time+independent_segments'),
+        ], os.path.join(spool, SPOOL_PLAYLIST)
+
+    def track(self, stream_id: str):
+        """Start collecting a stream's recorded segments"""
+        with self._lock:
+            self.streams.add(stream_id)
+        self._ensure_collector()
+
+    def untrack(self, stream_id: str):
+        """Stop collecting, after taking in what was already written"""
+        self.collect(stream_id)
+        with self._lock:
+            self.streams.discard(stream_id)
+
+    def _ensure_collector(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._collect_loop, name='recorder', daemon=True)
+            self._thread.start()
+
+    def _collect_loop(self):
+        while True:
+            with self._lock:
+                streams = list(self.streams)
+            for stream_id in streams:
+                try:
+                    self.collect(stream_id)
+                    self.enforce_retention(stream_id)
+                except Exception as e:
+                    print(f"Error collecting recording of stream {stream_id}: {e}")
+            time.sleep(self.interval)
+
+    def collect(self, stream_id: str) -> int:
+        """Index every completed segment still in the spool. Returns how many were added."""
+        with self._collect_lock:
+            return self._collect(stream_id)
+
+    def _collect(self, stream_id: str) -> int:
+        spool = self.spool_dir(stream_id)
+        directory = self.stream_dir(stream_id)
+        try:
+            with open(os.path.join(spool, SPOOL_PLAYLIST)) as f:
+                segments = parse_spool_playlist(f.read())
+        except OSError:
+            return 0
+
+        index = self.index(stream_id)
+        head, count = index.bounds()
+        last_end = 0
+        if count > head:
+            start_ms, duration_ms = index.record(count - 1)[:2]
+            last_end = start_ms + duration_ms
+        added = 0
+        for segment in segments:
+            source = os.path.join(spool, segment['uri'])
+            # Listed segments are complete; already collected ones were moved away
+            if not os.path.exists(source) or not segment['init']:
+                continue
+            init_id = int(segment['init'].split('-', 1)[1].split('.', 1)[0])
+            init_source = os.path.join(spool, segment['init'])
+            if os.path.exists(init_source):
+                os.replace(init_source, os.path.join(directory, init_name(init_id)))
+            # Keep the index ordered even if the clock stepped backwards
+            start_ms = max(segment['start_ms'], last_end)
+            target = os.path.join(directory, segment_name(start_ms))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            size = os.path.getsize(source)
+            os.replace(source, target)
+            index.append(start_ms, segment['duration_ms'], init_id, size)
+            last_end = start_ms + segment['duration_ms']
+            added += 1
+        return added
+
+    def enforce_retention(self, stream_id: str, now: Optional[float] = None) -> int:
+        """Delete the oldest segments beyond the age limit or quota. Returns how many."""
+        with self._collect_lock:
+            return self._enforce_retention(stream_id, now)
+
+    def _enforce_retention(self, stream_id: str, now: Optional[float]) -> int:
+        index = self.index(stream_id)
+        head, count = index.bounds()
+        if count <= head:
+            return 0
+        cutoff_ms = ((now or time.time()) - self.retention_hours * 3600) * 1000
+        usage = index.usage()
+        directory = self.stream_dir(stream_id)
+        new_head = head
+        freed = 0
+        while new_head < count - 1:
+            start_ms, duration_ms, _, size, _ = index.record(new_head)
+            over_quota = self.quota_bytes and usage - freed > self.quota_bytes
+            if start_ms + duration_ms >= cutoff_ms and not over_quota:
+                break
+            try:
+                os.remove(os.path.join(directory, segment_name(start_ms)))
+            except OSError:
+                pass
+            freed += size
+            new_head += 1
+        if new_head == head:
+            return 0
+        index.drop_head(new_head)
+        self._remove_unused_inits(stream_id, index)
+        return new_head - head
+
+    def _remove_unused_inits(self, stream_id: str, index: RecordingIndex):
+        """Delete init segments older than the oldest retained segment's"""
+        head, count = index.bounds()
+        if count <= head:
+            return
+        oldest_init = index.record(head)[2]
+        directory = self.stream_dir(stream_id)
+        for name in os.listdir(directory):
+            if name.startswith('init-') and name.endswith('.mp4'):
+                try:
+                    if int(name[5:-4]) < oldest_init:
+                        os.remove(os.path.join(directory, name))
+                except (ValueError, OSError):
+                    pass
+
+    def summary(self, stream_id: str) -> Optional[dict]:
+        """First and last recorded time, segment count and bytes; None if nothing is recorded"""
+        index = self.index(stream_id)
+        head, count = index.bounds()
+        if count <= head:
+            return None
+        first = index.record(head)
+        last = index.record(count - 1)
+        return {
+            'start': first[0] / 1000,
+            'end': (last[0] + last[1]) / 1000,
+            'segments': count - head,
+            'bytes': index.usage()
+        }
@@ -1,8 +1,44 @@
+import json
 import subprocess
 import threading
 import time
 import os
 from typing import Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from utils.event_feed import event_feed
+from utils.ffmpeg_supervisor import FFmpegWorker
+from utils.ll_hls import LL_INIT_NAME, LL_SEGMENT_PATTERN
+from utils.motion_gate import MotionGate
+from utils.overlay_compositor import OverlayCompositor
+from utils.probe_service import ProbeService
+from utils.recorder import Recorder
+from utils.scheduler import AdmissionError, AdmissionScheduler
+
+# Codecs that can be remuxed into MPEG-TS HLS segments without re-encoding
+HLS_COPY_VIDEO_CODECS = {'h264'}
+HLS_COPY_AUDIO_CODECS = {'aac', 'mp3'}
+# Codecs recordings keep as-is; fMP4 segments also carry HEVC
+RECORD_COPY_VIDEO_CODECS = {'h264', 'hevc'}
+
+# Encoding modes: 'auto' probes the source and picks 'copy' when possible
+ENCODE_MODES = ('auto', 'copy', 'transcode')
+
+# Consecutive failures in auto-selected copy mode before falling back to transcoding
+COPY_FALLBACK_AFTER = 3
+
+# Adaptive bitrate rungs selectable per stream: output height and video bitrate
+ABR_RUNGS = {
+    '1080p': {'height': 1080, 'video_bitrate': 5000},
+    '720p': {'height': 720, 'video_bitrate': 2800},
+    '480p': {'height': 480, 'video_bitrate': 1400},
+    '360p': {'height': 360, 'video_bitrate': 800},
+    '240p': {'height': 240, 'video_bitrate': 400},
+}
+ABR_AUDIO_BITRATE = '128k'
+
+# Low-latency output: 1 s CMAF segments made of ~1/3 s fragments (LL-HLS parts)
+LL_SEGMENT_DURATION = 1.0
+LL_PART_DURATION = 0.333
 
 class RTSPHandler:
     """
@@ -11,13 +47,29 @@ class RTSPHandler:
     more robust streaming solutions like Wowza, Node Media Server, or GStreamer
     """
     
-    def __init__(self):
+    def __init__(self, monitor_interval: float = 1.0):
         self.active_streams = {}
+        # Shared RTSP ingests keyed by normalized URL, and their supervised workers
+        self.ingests = {}
         self.ffmpeg_processes = {}
+        # Server-side overlay burn-in for streams started with burn_overlays
+        self.compositor = OverlayCompositor()
+        # Cached, concurrent ffprobe results keyed by normalized URL
+        self.probes = ProbeService(self.probe_rtsp_url, key_fn=normalize_rtsp_url)
+        # Core budget, admission queue and encoder placement
+        self.scheduler = AdmissionScheduler()
+        # Time-indexed fMP4 recordings of streams started with record
+        self.recorder = Recorder()
+        # Activity scoring and idle frame rate for motion-gated streams
+        self.motion = MotionGate()
+        self.monitor_interval = monitor_interval
+        self._lock = threading.RLock()
+        self._monitor_thread = None
     
-    def validate_rtsp_url(self, rtsp_url: str) -> bool:
+    def probe_rtsp_url(self, rtsp_url: str) -> Optional[dict]:
         """
-        Validate if RTSP URL is accessible
+        Probe an RTSP source with ffprobe and summarize its first audio/video tracks.
+        Returns None if the stream is not accessible.
         """
         try:
             # Use ffprobe to check if stream is accessible
@@ -31,70 +83,568 @@ class RTSPHandler:
             ]
             
             result = subprocess.run(cmd, capture_output=True, timeout=15)
-            return result.returncode == 0
-        except (subprocess.TimeoutExpired, FileNotFoundError):
-            return False
+            if result.returncode != 0:
+                return None
+            streams = json.loads(result.stdout or b'{}').get('streams', [])
+        except (subprocess.TimeoutExpired, FileNotFoundError, ValueError):
+            return None
+        
+        video = next((s for s in streams if s.get('codec_type') == 'video'), {})
+        audio = next((s for s in streams if s.get('codec_type') == 'audio'), {})
+        return {
+            'video_codec': video.get('codec_name'),
+            'audio_codec': audio.get('codec_name'),
+            'width': video.get('width'),
+            'height': video.get('height'),
+            'fps': _parse_frame_rate(video.get('avg_frame_rate') or video.get('r_frame_rate'))
+        }
     
-    def start_hls_conversion(self, rtsp_url: str, output_dir: str, stream_id: str) -> bool:
+    def validate_rtsp_url(self, rtsp_url: str) -> bool:
         """
-        Convert RTSP stream to HLS for web playback
+        Validate if RTSP URL is accessible
+        """
+        return self.probe_rtsp_url(rtsp_url) is not None
+    
+    def choose_encode_mode(self, probe: Optional[dict]) -> str:
+        """
+        Pick 'copy' when the source video can be remuxed into HLS as-is
+        """
+        if probe and probe.get('video_codec') in HLS_COPY_VIDEO_CODECS:
+            return 'copy'
+        return 'transcode'
+    
+    def _codec_args(self, stream: dict) -> list:
+        """FFmpeg codec arguments for the stream's current mode"""
+        if stream['mode'] != 'copy':
+            # A keyframe at every segment boundary: x264's default GOP of 250
+            # frames would stretch segments, and a new viewer's wait, to ~10 s
+            # veryfast, like the ABR and LL-HLS encoders, is what admission budgets for
+            return ['-c:v', 'libx264', '-preset', 'veryfast',
+                    '-force_key_frames', f"expr:gte(t,n_forced*{stream['hls_time']})",
+                    '-c:a', 'aac']
+        
+        args = ['-c:v', 'copy']
+        audio_codec = (stream.get('probe') or {}).get('audio_codec')
+        if audio_codec is None or audio_codec in HLS_COPY_AUDIO_CODECS:
+            args += ['-c:a', 'copy']
+        else:
+            # Cameras often send G.711; transcoding audio alone is cheap
+            args += ['-c:a', 'aac']
+        return args
+    
+    def _overlay_filter_args(self, stream_id: str, stream: dict) -> list:
+        """-vf arguments burning overlays into the stream, if enabled"""
+        if not stream.get('burn_overlays'):
+            return []
+        graph = self.compositor.filter_graph(stream_id, (stream.get('probe') or {}).get('width'))
+        return ['-vf', graph] if graph else []
+    
+    def _video_filter_args(self, stream_id: str, stream: dict) -> list:
+        """-vf arguments gating the frame rate by motion, then burning in overlays, if enabled"""
+        if not stream.get('motion_gate'):
+            return self._overlay_filter_args(stream_id, stream)
+        gate = self.motion.filter_chain(stream_id)
+        overlay = self._overlay_filter_args(stream_id, stream)
+        graph = f'[in]{gate}[gated];' + overlay[1].replace('[in]', '[gated]', 1) if overlay else gate
+        # Idle frames are dropped, not duplicated back to a constant rate
+        return ['-vf', graph, '-fps_mode', 'vfr']
+    
+    def _hls_output(self, stream_id: str) -> dict:
+        """Output spec for a stream's HLS rendition"""
+        with self._lock:
+            stream = self.active_streams[stream_id]
+            return {
+                'maps': ['0:v:0', '0:a:0?'],
+                'codec_args': self._codec_args(stream) + self._video_filter_args(stream_id, stream),
+                'format': 'hls',
+                'options': [
+                    ('hls_time', str(stream['hls_time'])),
+                    ('hls_list_size', '3'),
+                    ('hls_flags', 'delete_segments'),
+                    # Unique segment names across restarts, so segments can be cached as immutable
+                    ('hls_start_number_source', 'epoch'),
+                ],
+                'path': stream['hls_path']
+            }
+    
+    def select_abr_ladder(self, rung_names: list, probe: Optional[dict]) -> list:
+        """
+        Rungs of a requested ladder, highest first, without upscaling: rungs
+        taller than the source are dropped (the smallest is always kept)
+        """
+        ladder = sorted(
+            (dict(ABR_RUNGS[name], name=name) for name in dict.fromkeys(rung_names)),
+            key=lambda rung: rung['height'],
+            reverse=True
+        )
+        source_height = (probe or {}).get('height')
+        if source_height:
+            ladder = [rung for rung in ladder if rung['height'] <= source_height] or ladder[-1:]
+        return ladder
+    
+    def _abr_hls_output(self, stream_id: str) -> dict:
+        """
+        Output spec for an ABR ladder: the source is decoded (and overlays
+        burned in) once, split and scaled per rung in one filter graph, and
+        written by a single hls muxer as variant playlists plus a master
+        playlist at the stream's usual playlist path
+        """
+        with self._lock:
+            stream = self.active_streams[stream_id]
+            ladder = stream['abr_ladder']
+            directory = os.path.dirname(stream['hls_path'])
+            has_audio = bool((stream.get('probe') or {}).get('audio_codec'))
+            # Pad labels are global to the ingest's -filter_complex
+            prefix = f'abr{stream_id}_'
+            
+            graph = []
+            source = '[0:v:0]'
+            if stream.get('burn_overlays'):
+                overlay = self.compositor.filter_graph(stream_id, (stream.get('probe') or {}).get('width'))
+                if overlay:
+                    graph.append(overlay.replace('[in]', source, 1).replace('[out]', f'[{prefix}ovl]'))
+                    source = f'[{prefix}ovl]'
+            graph.append(f'{source}split={len(ladder)}' +
+                         ''.join(f'[{prefix}s{index}]' for index in range(len(ladder))))
+            for index, rung in enumerate(ladder):
+                graph.append(f"[{prefix}s{index}]scale=-2:{rung['height']}[{prefix}v{index}]")
+            
+            maps = [f'[{prefix}v{index}]' for index in range(len(ladder))]
+            codec_args = [
+                '-c:v', 'libx264',
+                '-preset', 'veryfast',
+                # Keyframes aligned across renditions so players can switch at any segment
+                '-force_key_frames', f"expr:gte(t,n_forced*{stream['hls_time']})"
+            ]
+            for index, rung in enumerate(ladder):
+                codec_args += [
+                    f'-b:v:{index}', f"{rung['video_bitrate']}k",
+                    f'-maxrate:v:{index}', f"{rung['video_bitrate'] * 107 // 100}k",
+                    f'-bufsize:v:{index}', f"{rung['video_bitrate'] * 2}k"
+                ]
+            if has_audio:
+                # hls variants each carry their own audio; it is encoded once per rung
+                maps += ['0:a:0'] * len(ladder)
+                codec_args += ['-c:a', 'aac', '-b:a', ABR_AUDIO_BITRATE]
+            variants = [
+                f"v:{index},a:{index},name:{rung['name']}" if has_audio else f"v:{index},name:{rung['name']}"
+                for index, rung in enumerate(ladder)
+            ]
+            
+            return {
+                'maps': maps,
+                'codec_args': codec_args,
+                'filter_complex': ';'.join(graph),
+                'format': 'hls',
+                'options': [
+                    ('hls_time', str(stream['hls_time'])),
+                    ('hls_list_size', '3'),
+                    ('hls_flags', 'delete_segments+independent_segments'),
+                    ('hls_start_number_source', 'epoch'),
+                    ('hls_segment_filename', os.path.join(directory, f'{stream_id}_%v_%d.ts')),
+                    ('master_pl_name', os.path.basename(stream['hls_path'])),
+                    ('var_stream_map', ' '.join(variants)),
+                ],
+                'path': os.path.join(directory, f'{stream_id}_%v.m3u8'),
+                'watch_path': os.path.join(directory, f"{stream_id}_{ladder[0]['name']}.m3u8")
+            }
+    
+    def _ll_hls_output(self, stream_id: str) -> dict:
+        """
+        Output spec for a stream's low-latency rendition: video-only CMAF
+        written fragment by fragment by the dash muxer, from which the app
+        builds the LL-HLS playlist
+        """
+        with self._lock:
+            stream = self.active_streams[stream_id]
+            if stream['mode'] == 'copy':
+                # Segment boundaries follow the camera's keyframe interval
+                codec_args = ['-c:v', 'copy']
+            else:
+                codec_args = [
+                    '-c:v', 'libx264',
+                    '-preset', 'veryfast',
+                    '-tune', 'zerolatency',
+                    '-force_key_frames', f'expr:gte(t,n_forced*{LL_SEGMENT_DURATION})'
+                ] + self._overlay_filter_args(stream_id, stream)
+            return {
+                'maps': ['0:v:0'],
+                'codec_args': codec_args,
+                'format': 'dash',
+                'options': [
+                    ('seg_duration', str(LL_SEGMENT_DURATION)),
+                    ('frag_type', 'duration'),
+                    ('frag_duration', str(LL_PART_DURATION)),
+                    ('streaming', '1'),
+                    ('ldash', '1'),
+                    ('window_size', '6'),
+                    ('extra_window_size', '4'),
+                    ('use_template', '1'),
+                    ('use_timeline', '0'),
+                    ('init_seg_name', LL_INIT_NAME),
+                    ('media_seg_name', LL_SEGMENT_PATTERN),
+                    ('remove_at_exit', '1'),
+                ],
+                'path': os.path.join(os.path.dirname(stream['hls_path']), f'{stream_id}.mpd')
+            }
+    
+    def _record_output(self, stream_id: str) -> dict:
+        """
+        Output spec for a stream's recording: fMP4 segments spooled for the
+        recorder. The source is copied when its codec allows; otherwise the
+        arguments match the live rendition so both share one encode via tee.
+        Overlays are not burned into recordings.
+        """
+        with self._lock:
+            stream = self.active_streams[stream_id]
+            copy = (stream.get('probe') or {}).get('video_codec') in RECORD_COPY_VIDEO_CODECS
+            codec_args = self._codec_args(dict(stream, mode='copy' if copy else 'transcode'))
+        options, path = self.recorder.output_options(stream_id)
+        return {
+            'maps': ['0:v:0', '0:a:0?'],
+            'codec_args': codec_args,
+            'format': 'hls',
+            'options': options,
+            'path': path
+        }
+    
+    def _apply_copy_fallback(self, ingest: dict):
+        """
+        Switch auto-selected copy streams on this ingest to transcode when the
+        ingest keeps failing
+        """
+        worker = ingest['worker']
+        if not worker or worker.consecutive_failures < COPY_FALLBACK_AFTER:
+            return
+        for stream_id in {consumer.split(':', 1)[0] for consumer in ingest['consumers']}:
+            stream = self.active_streams.get(stream_id)
+            if stream and stream['mode'] == 'copy' and stream['requested_mode'] == 'auto':
+                stream['mode'] = 'transcode'
+                stream['mode_reason'] = 'copy failed, fell back to transcode'
+    
+    def _build_ingest_command(self, key: str) -> list:
+        """
+        Build one FFmpeg command that pulls the RTSP source once and writes
+        every attached output. Outputs with identical encoding share a single
+        encode through the tee muxer.
+        """
+        with self._lock:
+            ingest = self.ingests[key]
+            self._apply_copy_fallback(ingest)
+            outputs = [factory() for factory in ingest['consumers'].values()]
+            
+            groups = {}
+            for output in outputs:
+                group_key = (tuple(output['maps']), tuple(output['codec_args']))
+                groups.setdefault(group_key, []).append(output)
+            
+            # Machine-readable progress on stdout replaces the stderr stats line
+            cmd = ['ffmpeg', '-nostdin', '-nostats', '-progress', 'pipe:1']
+            if ingest['rtsp_url'].lower().startswith('rtsp://'):
+                cmd += ['-rtsp_transport', 'tcp']
+            cmd += ['-i', ingest['rtsp_url']]
+            # Filter graphs of all outputs (ABR split/scale) run in one -filter_complex
+            filter_graphs = [output['filter_complex'] for output in outputs if output.get('filter_complex')]
+            if filter_graphs:
+                cmd += ['-filter_complex', ';'.join(filter_graphs)]
+            for (maps, codec_args), group in groups.items():
+                for stream_map in maps:
+                    cmd += ['-map', stream_map]
+                cmd += list(codec_args)
+                if len(group) == 1:
+                    output = group[0]
+                    cmd += ['-f', output['format']]
+                    for name, value in output['options']:
+                        cmd += [f'-{name}', value]
+                    cmd += ['-y', output['path']]  # Overwrite output
+                else:
+                    slaves = []
+                    for output in group:
+                        options = ':'.join([f"f={output['format']}"] +
+                                           [f'{name}={value}' for name, value in output['options']])
+                        slaves.append(f"[{options}]{output['path']}")
+                    cmd += ['-f', 'tee', '|'.join(slaves)]
+            
+            # Watch the first HLS playlist (or any output) for stall detection
+            watch = next((o.get('watch_path', o['path']) for o in outputs if o['format'] == 'hls'),
+                         outputs[0].get('watch_path', outputs[0]['path']))
+            if ingest['worker']:
+                ingest['worker'].watch_path = watch
+                stream_ids = {consumer.split(':', 1)[0] for consumer in ingest['consumers']}
+                ingest['worker'].niceness, ingest['worker'].cpu_affinity = self.scheduler.placement(stream_ids)
+            return cmd
+    
+    def attach_output(self, rtsp_url: str, consumer_id: str, output_factory, hls_time: float = 2,
+                      restart: bool = True) -> str:
+        """
+        Attach an output to the shared ingest for rtsp_url, starting the ingest
+        if this is its first consumer. output_factory returns the output spec
+        and is re-evaluated on every (re)start. restart=False defers the
+        (re)start to the next attach, to add several outputs at once.
+        Returns the ingest key.
+        """
+        key = normalize_rtsp_url(rtsp_url)
+        with self._lock:
+            ingest = self.ingests.get(key)
+            if ingest is None:
+                ingest = {
+                    'rtsp_url': rtsp_url,
+                    'consumers': {},
+                    'worker': None,
+                    'started_at': time.time()
+                }
+                self.ingests[key] = ingest
+            ingest['consumers'][consumer_id] = output_factory
+            worker = ingest['worker']
+            if worker is None:
+                worker = FFmpegWorker(
+                    key,
+                    lambda: self._build_ingest_command(key),
+                    '',
+                    hls_time=hls_time,
+                    on_state=lambda state, reason: self._publish_ingest_state(key, state, reason)
+                )
+                ingest['worker'] = worker
+                self.ffmpeg_processes[key] = worker
+        
+        # FFmpeg cannot add outputs to a running process, so respawn it with
+        # the new output set; the RTSP session is still a single one
+        if restart and self._is_current(key, worker):
+            worker.restart()
+            self._ensure_monitor()
+        return key
+    
+    def _is_current(self, key: str, worker) -> bool:
+        """Whether worker still runs the ingest registered under key"""
+        with self._lock:
+            ingest = self.ingests.get(key)
+            return ingest is not None and ingest['worker'] is worker
+    
+    def _publish_ingest_state(self, key: str, state: str, reason: Optional[str]):
+        """Report a supervisor state change to the change feed, once per stream on the ingest"""
+        with self._lock:
+            ingest = self.ingests.get(key)
+            stream_ids = sorted({consumer.split(':', 1)[0] for consumer in ingest['consumers']}) if ingest else []
+            restarts = ingest['worker'].restarts if ingest else 0
+        for stream_id in stream_ids:
+            event_feed.publish(f'stream.{state}', {
+                'stream_id': stream_id,
+                'reason': reason,
+                'restarts': restarts
+            })
+    
+    def detach_output(self, key: str, consumer_id: str):
+        """
+        Remove an output from an ingest, tearing the ingest down when its last
+        consumer leaves
+        """
+        self.detach_outputs(key, [consumer_id])
+    
+    def detach_outputs(self, key: str, consumer_ids: list):
+        """Remove several outputs of an ingest with at most one ffmpeg restart"""
+        with self._lock:
+            ingest = self.ingests.get(key)
+            if ingest is None:
+                return
+            removed = [ingest['consumers'].pop(consumer_id, None) for consumer_id in consumer_ids]
+            if not any(removed):
+                return
+            worker = ingest['worker']
+            remaining = len(ingest['consumers'])
+            if not remaining:
+                del self.ingests[key]
+                self.ffmpeg_processes.pop(key, None)
+        
+        if worker:
+            if remaining:
+                if self._is_current(key, worker):
+                    worker.restart()
+            else:
+                worker.stop(timeout=5)
+    
+    def start_hls_conversion(self, rtsp_url: str, output_dir: str, stream_id: str,
+                             hls_time: int = 2, mode: str = 'auto', low_latency: bool = False,
+                             burn_overlays: bool = False, priority: str = 'normal',
+                             admission_timeout: Optional[float] = None,
+                             abr_ladder: Optional[list] = None, record: bool = False,
+                             motion_gate: bool = False) -> bool:
+        """
+        Convert RTSP stream to HLS for web playback.
+        mode is 'copy' (remux only), 'transcode' (libx264/aac) or 'auto'.
+        low_latency writes CMAF parts for LL-HLS instead of MPEG-TS segments.
+        burn_overlays composites the active overlays into the video (forces transcoding).
+        abr_ladder names ABR_RUNGS to encode from one decode behind a master
+        playlist (forces transcoding; ignored for low_latency streams).
+        record also writes the stream into the time-indexed recording store.
+        motion_gate drops the encoded frame rate of a transcoded stream while
+        its scene is static (needs NumPy and pyzmq; not for ABR or low latency).
+        Streams with the same RTSP URL share one ingest process.
+        The stream's estimated cost is admitted against the core budget first;
+        raises AdmissionError if it does not fit within admission_timeout.
         """
         try:
+            if mode not in ENCODE_MODES:
+                raise ValueError(f"Unknown encode mode: {mode}")
+            
             # Ensure output directory exists
             os.makedirs(output_dir, exist_ok=True)
             
             output_path = os.path.join(output_dir, f"{stream_id}.m3u8")
             
-            # FFmpeg command to convert RTSP to HLS
-            cmd = [
-                'ffmpeg',
-                '-i', rtsp_url,
-                '-c:v', 'libx264',
-                '-c:a', 'aac',
-                '-f', 'hls',
-                '-hls_time', '2',
-                '-hls_list_size', '3',
-                '-hls_wrap', '3',
-                '-hls_flags', 'delete_segments',
-                '-y',  # Overwrite output
-                output_path
-            ]
+            # Replace any previous outputs for this stream
+            self.stop_stream(stream_id)
             
-            # Start FFmpeg process
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
+            key = normalize_rtsp_url(rtsp_url)
+            probe = None
+            with self._lock:
+                # Reuse the probe of a running ingest instead of opening another session
+                for other in self.active_streams.values():
+                    if other['ingest_key'] == key and other.get('probe'):
+                        probe = other['probe']
+                        break
+            if low_latency:
+                abr_ladder = None
+            if probe is None and (mode != 'transcode' or burn_overlays or abr_ladder or record or motion_gate):
+                result = self.probes.probe(rtsp_url)
+                probe = result if result['reachable'] else None
             
-            # Store process reference
-            self.ffmpeg_processes[stream_id] = process
-            self.active_streams[stream_id] = {
-                'rtsp_url': rtsp_url,
-                'hls_path': output_path,
-                'started_at': time.time()
-            }
+            selected_mode = mode
+            mode_reason = 'probed' if mode == 'auto' else 'requested'
+            if mode == 'auto':
+                selected_mode = self.choose_encode_mode(probe)
+            if burn_overlays:
+                selected_mode = 'transcode'
+                mode_reason = 'overlay burn-in'
+                self.compositor.prepare((probe or {}).get('width'))
+            ladder = None
+            if abr_ladder:
+                ladder = self.select_abr_ladder(abr_ladder, probe)
+                selected_mode = 'transcode'
+                mode_reason = 'ABR ladder' if not burn_overlays else mode_reason
+            
+            # Gating saves encoder work, so it only applies to a single transcoded rendition
+            gated = (motion_gate and selected_mode == 'transcode' and not low_latency and not ladder
+                     and self.motion.available)
             
+            # Blocks in the admission queue while the host is at capacity
+            cost = self.scheduler.estimate_cost(probe, selected_mode, low_latency, burn_overlays,
+                                                [rung['height'] for rung in ladder] if ladder else None)
+            self.scheduler.admit(stream_id, cost, priority, admission_timeout)
+            
+            # Store stream state before attaching; the output spec is built from it
+            with self._lock:
+                self.active_streams[stream_id] = {
+                    'rtsp_url': rtsp_url,
+                    'ingest_key': key,
+                    'hls_path': output_path,
+                    'hls_time': LL_SEGMENT_DURATION if low_latency else hls_time,
+                    'low_latency': low_latency,
+                    'requested_mode': mode,
+                    'mode': selected_mode,
+                    'mode_reason': mode_reason,
+                    'burn_overlays': burn_overlays,
+                    'abr_ladder': ladder,
+                    'priority': priority,
+                    'cost': cost,
+                    'probe': probe,
+                    'record': record,
+                    'motion_gate': gated,
+                    'outputs': [f'{stream_id}:hls'] + ([f'{stream_id}:record'] if record else []) +
+                               ([f'{stream_id}:motion'] if gated else []),
+                    'started_at': time.time()
+                }
+            
+            # Further outputs (recording, motion analysis) are added before one ffmpeg (re)start
+            extras = []
+            if record:
+                extras.append(('record', lambda: self._record_output(stream_id)))
+            if gated:
+                self.motion.register(stream_id, (probe or {}).get('fps'))
+                extras.append(('motion', lambda: self.motion.analysis_output(stream_id)))
+            if low_latency:
+                self.attach_output(rtsp_url, f'{stream_id}:hls', lambda: self._ll_hls_output(stream_id),
+                                   hls_time=LL_SEGMENT_DURATION, restart=not extras)
+            elif ladder:
+                self.attach_output(rtsp_url, f'{stream_id}:hls', lambda: self._abr_hls_output(stream_id),
+                                   hls_time=hls_time, restart=not extras)
+            else:
+                self.attach_output(rtsp_url, f'{stream_id}:hls', lambda: self._hls_output(stream_id),
+                                   hls_time=hls_time, restart=not extras)
+            for index, (name, factory) in enumerate(extras):
+                self.attach_output(rtsp_url, f'{stream_id}:{name}', factory, restart=index == len(extras) - 1)
+            if record:
+                self.recorder.track(stream_id)
+            
+            event_feed.publish('stream.started', {
+                'stream_id': stream_id,
+                'mode': selected_mode,
+                'low_latency': low_latency,
+                'priority': priority
+            })
             return True
             
+        except AdmissionError:
+            raise
         except Exception as e:
             print(f"Error starting HLS conversion: {e}")
+            self.stop_stream(stream_id)
             return False
     
+    def update_overlays(self, overlays: list):
+        """
+        Apply the current overlay rows (to_dict() form) to every stream with
+        burn-in: hot-update running filter graphs, restarting only the
+        encoders whose graph structure changed
+        """
+        for stream_id in self.compositor.set_overlays(overlays):
+            with self._lock:
+                worker = self._stream_worker(stream_id)
+            if worker:
+                worker.restart()
+    
+    def _ensure_monitor(self):
+        """Start the supervisor thread on first use"""
+        with self._lock:
+            if self._monitor_thread and self._monitor_thread.is_alive():
+                return
+            self._monitor_thread = threading.Thread(
+                target=self._monitor_loop,
+                name='rtsp-supervisor',
+                daemon=True
+            )
+            self._monitor_thread.start()
+    
+    def _monitor_loop(self):
+        """Periodically check every worker for exits and stalls"""
+        while True:
+            with self._lock:
+                workers = list(self.ffmpeg_processes.values())
+            for worker in workers:
+                try:
+                    worker.check()
+                except Exception as e:
+                    print(f"Error supervising stream {worker.name}: {e}")
+            time.sleep(self.monitor_interval)
+    
     def stop_stream(self, stream_id: str) -> bool:
         """
-        Stop streaming and cleanup
+        Stop streaming and cleanup. The shared ingest is only torn down when
+        no other stream uses it.
         """
         try:
-            if stream_id in self.ffmpeg_processes:
-                process = self.ffmpeg_processes[stream_id]
-                process.terminate()
-                process.wait(timeout=5)
-                del self.ffmpeg_processes[stream_id]
+            with self._lock:
+                stream = self.active_streams.pop(stream_id, None)
+            self.compositor.forget(stream_id)
             
-            if stream_id in self.active_streams:
-                del self.active_streams[stream_id]
+            if stream:
+                # All at once: a shared ingest restarts with only the other streams' outputs
+                self.detach_outputs(stream['ingest_key'], stream['outputs'])
+                if stream.get('record'):
+                    self.recorder.untrack(stream_id)
+            self.motion.forget(stream_id)
+            self.scheduler.release(stream_id)
+            if stream:
+                event_feed.publish('stream.stopped', {'stream_id': stream_id})
             
             return True
             
@@ -102,24 +652,119 @@ class RTSPHandler:
             print(f"Error stopping stream: {e}")
             return False
     
+    def _stream_worker(self, stream_id: str):
+        stream = self.active_streams.get(stream_id)
+        ingest = self.ingests.get(stream['ingest_key']) if stream else None
+        return ingest['worker'] if ingest else None
+    
     def get_stream_info(self, stream_id: str) -> Optional[dict]:
         """
-        Get information about an active stream
+        Get information about an active stream, including supervisor state
         """
-        return self.active_streams.get(stream_id)
+        with self._lock:
+            info = self.active_streams.get(stream_id)
+            worker = self._stream_worker(stream_id)
+            if info is None:
+                return None
+            info = dict(info)
+            info['outputs'] = list(info['outputs'])
+            ingest = self.ingests.get(info['ingest_key'])
+            info['ingest_consumers'] = len(ingest['consumers']) if ingest else 0
+        info['motion'] = self.motion.status(stream_id)
+        if worker:
+            info.update(worker.status())
+        return info
+    
+    def get_stream_summary(self, stream_id: str) -> Optional[dict]:
+        """
+        Compact runtime state of a stream for list payloads
+        """
+        with self._lock:
+            info = self.active_streams.get(stream_id)
+            worker = self._stream_worker(stream_id)
+            if info is None:
+                return None
+            return {
+                'state': worker.state if worker else None,
+                'mode': info['mode'],
+                'low_latency': info['low_latency'],
+                'priority': info['priority'],
+                'renditions': [rung['name'] for rung in info['abr_ladder']] if info['abr_ladder'] else None,
+                'recording': info.get('record', False),
+                'motion': (self.motion.status(stream_id) or {}).get('state'),
+                'restarts': worker.restarts if worker else 0,
+                'started_at': info['started_at']
+            }
+    
+    def stream_metrics(self) -> list:
+        """
+        Per-stream encoder samples for the metrics endpoint. Streams sharing an
+        ingest report the same ffmpeg process.
+        """
+        with self._lock:
+            streams = [(stream_id, info['mode'], self._stream_worker(stream_id))
+                       for stream_id, info in self.active_streams.items()]
+        samples = []
+        for stream_id, mode, worker in streams:
+            if worker is None:
+                continue
+            samples.append({
+                'stream_id': stream_id,
+                'mode': mode,
+                'state': worker.state,
+                'restarts': worker.restarts,
+                'progress': dict(worker.progress),
+                'resources': worker.resource_usage(),
+                'last_segment_at': worker.last_output_at(),
+                'segment_interval': worker.segment_interval
+            })
+        return samples
     
     def list_active_streams(self) -> dict:
         """
         List all active streams
         """
-        return self.active_streams.copy()
+        with self._lock:
+            return self.active_streams.copy()
     
     def cleanup_all(self):
         """
         Stop all active streams and cleanup
         """
-        for stream_id in list(self.ffmpeg_processes.keys()):
+        for stream_id in list(self.active_streams.keys()):
             self.stop_stream(stream_id)
+        with self._lock:
+            ingests = list(self.ingests.items())
+        for key, ingest in ingests:
+            for consumer_id in list(ingest['consumers']):
+                self.detach_output(key, consumer_id)
+
+def normalize_rtsp_url(rtsp_url: str) -> str:
+    """
+    Canonical form of an RTSP URL used to share ingests: lowercase scheme and
+    host, explicit default port, no trailing slash, sorted query parameters
+    """
+    parts = urlsplit(rtsp_url.strip())
+    host = (parts.hostname or '').lower()
+    if ':' in host:
+        host = f'[{host}]'
+    netloc = f'{host}:{parts.port or 554}'
+    if parts.username is not None:
+        userinfo = parts.username
+        if parts.password is not None:
+            userinfo += f':{parts.password}'
+        netloc = f'{userinfo}@{netloc}'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), netloc, parts.path.rstrip('/') or '/', query, ''))
+
+def _parse_frame_rate(rate: Optional[str]) -> Optional[float]:
+    """Convert an ffprobe rational such as '30000/1001' to a float"""
+    try:
+        num, _, den = (rate or '').partition('/')
+        value = float(num) / float(den or 1)
+        return round(value, 3) if value > 0 else None
+    except (ValueError, ZeroDivisionError):
+        return None
 
 # Global RTSP handler instance
 rtsp_handler = RTSPHandler()
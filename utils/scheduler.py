@@ -0,0 +1,187 @@
+import itertools
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Priority classes of StreamSettings.priority, most important first
+PRIORITY_CLASSES = ('critical', 'high', 'normal', 'low')
+# Share of the core budget a class may fill; the remainder is kept for higher classes
+PRIORITY_BUDGET_SHARE = {'critical': 1.0, 'high': 1.0, 'normal': 0.85, 'low': 0.6}
+# Niceness applied to the encoder (raising priority would need privileges)
+PRIORITY_NICENESS = {'critical': 0, 'high': 2, 'normal': 5, 'low': 10}
+
+# libx264 veryfast decode + encode, in cores per million pixels per second
+# (1080p30 is ~62 Mpx/s, ~1.6 cores)
+TRANSCODE_CORES_PER_MPIXEL_S = 0.025
+# Part of a transcode's cost spent decoding the source; an ABR ladder decodes
+# once and pays the encode part per rendition, scaled by its pixel count
+DECODE_COST_SHARE = 0.2
+# drawtext/overlay filters and the LL-HLS keyframe cadence cost extra
+OVERLAY_COST_FACTOR = 1.15
+LOW_LATENCY_COST_FACTOR = 1.1
+# Remuxing is dominated by I/O
+COPY_COST = 0.05
+# Assumed when the source could not be probed
+DEFAULT_WIDTH = 1920
+DEFAULT_HEIGHT = 1080
+DEFAULT_FPS = 30.0
+# Encoders at least this expensive are pinned to dedicated cores
+PIN_MIN_COST = 0.5
+
+class AdmissionError(Exception):
+    """Raised when a stream cannot be admitted within the core budget"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AdmissionScheduler:
+    """
+    CPU-aware admission control for ffmpeg encoders.
+    Each stream reserves its estimated cost (in cores) from a host-wide budget.
+    Starts beyond the budget wait in a priority-ordered queue for up to
+    queue_timeout seconds and are then rejected with AdmissionError. Admitted
+    transcodes are assigned the least-loaded cores to pin to and a niceness
+    derived from their priority class.
+    """
+
+    def __init__(self, core_budget: Optional[float] = None, queue_timeout: float = 10.0):
+        self.cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') \
+            else list(range(os.cpu_count() or 1))
+        # Leave headroom for the web app, ffprobe and the kernel
+        self.core_budget = core_budget or max(1.0, len(self.cores) * 0.85)
+        self.queue_timeout = queue_timeout
+        self.reservations: Dict[str, dict] = {}
+        self.core_load = {core: 0.0 for core in self.cores}
+        self.waiting: List[Tuple[int, int, str]] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def configure(self, core_budget: Optional[float] = None, queue_timeout: Optional[float] = None):
+        """Apply application configuration"""
+        with self._condition:
+            if core_budget:
+                self.core_budget = core_budget
+            if queue_timeout is not None:
+                self.queue_timeout = queue_timeout
+            self._condition.notify_all()
+
+    def estimate_cost(self, probe: Optional[dict], mode: str, low_latency: bool = False,
+                      burn_overlays: bool = False, ladder_heights: Optional[List[int]] = None) -> float:
+        """Estimated cores used by one stream's encoder (or ABR ladder)"""
+        if mode == 'copy':
+            return COPY_COST
+        probe = probe or {}
+        height = probe.get('height') or DEFAULT_HEIGHT
+        pixels = (probe.get('width') or DEFAULT_WIDTH) * height
+        cost = pixels * (probe.get('fps') or DEFAULT_FPS) / 1e6 * TRANSCODE_CORES_PER_MPIXEL_S
+        if ladder_heights:
+            encode_share = sum((rung / height) ** 2 for rung in ladder_heights)
+            cost *= DECODE_COST_SHARE + (1 - DECODE_COST_SHARE) * encode_share
+        if burn_overlays:
+            cost *= OVERLAY_COST_FACTOR
+        if low_latency:
+            cost *= LOW_LATENCY_COST_FACTOR
+        return round(cost, 3)
+
+    def used(self) -> float:
+        return sum(reservation['cost'] for reservation in self.reservations.values())
+
+    def _limit(self, priority: str) -> float:
+        return self.core_budget * PRIORITY_BUDGET_SHARE[priority]
+
+    def admit(self, stream_id: str, cost: float, priority: str = 'normal',
+              timeout: Optional[float] = None) -> dict:
+        """
+        Reserve cost cores for a stream, waiting up to timeout seconds
+        (queue_timeout by default) behind higher-priority and earlier starts.
+        A stream costlier than its class may fill reserves the whole class
+        share instead, so it still starts once nothing else holds the cores.
+        Returns the reservation; raises AdmissionError if it does not fit.
+        """
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class: {priority}")
+        timeout = self.queue_timeout if timeout is None else timeout
+
+        with self._condition:
+            # A restart replaces the stream's previous reservation
+            self._release(stream_id)
+            cost = min(cost, self._limit(priority))
+
+            ticket = (PRIORITY_CLASSES.index(priority), next(self._sequence), stream_id)
+            self.waiting.append(ticket)
+            self.waiting.sort()
+            deadline = time.time() + timeout
+            try:
+                while self.waiting[0] != ticket or self.used() + cost > self._limit(priority):
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        available = max(0.0, self._limit(priority) - self.used())
+                        raise AdmissionError(
+                            f'Transcode capacity exhausted: stream needs {cost:.2f} cores, '
+                            f'{available:.2f} of {self.core_budget:.2f} available to {priority} streams',
+                            retry_after=max(5, round(self.queue_timeout))
+                        )
+                    self._condition.wait(remaining)
+            finally:
+                self.waiting.remove(ticket)
+                self._condition.notify_all()
+
+            reservation = {
+                'cost': cost,
+                'priority': priority,
+                'niceness': PRIORITY_NICENESS[priority],
+                'cores': self._assign_cores(cost) if cost >= PIN_MIN_COST else None,
+                'admitted_at': time.time()
+            }
+            self.reservations[stream_id] = reservation
+            return dict(reservation)
+
+    def _assign_cores(self, cost: float) -> List[int]:
+        """Spread an encoder over the least-loaded cores, ceil(cost) of them"""
+        count = min(len(self.cores), max(1, math.ceil(cost)))
+        cores = sorted(self.cores, key=lambda core: (self.core_load[core], core))[:count]
+        for core in cores:
+            self.core_load[core] += cost / count
+        return sorted(cores)
+
+    def _release(self, stream_id: str):
+        reservation = self.reservations.pop(stream_id, None)
+        if reservation and reservation['cores']:
+            for core in reservation['cores']:
+                self.core_load[core] -= reservation['cost'] / len(reservation['cores'])
+
+    def release(self, stream_id: str):
+        """Return a stopped stream's cores to the budget"""
+        with self._condition:
+            self._release(stream_id)
+            self._condition.notify_all()
+
+    def placement(self, stream_ids: Iterable[str]) -> Tuple[int, Optional[List[int]]]:
+        """
+        Niceness and CPU affinity for an ffmpeg process serving the given
+        streams: the most important stream's niceness and the union of their
+        cores (None, i.e. unpinned, if any of them is unpinned)
+        """
+        with self._condition:
+            reservations = [self.reservations[s] for s in stream_ids if s in self.reservations]
+        if not reservations:
+            return 0, None
+        niceness = min(reservation['niceness'] for reservation in reservations)
+        if any(reservation['cores'] is None for reservation in reservations):
+            return niceness, None
+        return niceness, sorted({core for reservation in reservations for core in reservation['cores']})
+
+    def status(self) -> dict:
+        """Budget usage for API payloads"""
+        with self._condition:
+            used = self.used()
+            return {
+                'core_budget': self.core_budget,
+                'cores_reserved': round(used, 3),
+                'cores_available': round(max(0.0, self.core_budget - used), 3),
+                'queued': len(self.waiting),
+                'reservations': {stream_id: dict(reservation) for stream_id, reservation in self.reservations.items()}
+            }
@@ -0,0 +1,168 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+_URI_ATTRIBUTE = re.compile(r'URI="([^"]+)"')
+
+class SegmentCache:
+    """
+    In-memory LRU store for HLS playlists and segments, bounded by total bytes.
+    Reading a changed playlist preloads the segments it references, so segments
+    are usually in memory before the first viewer asks for them. Segment names
+    are never reused (sequence numbers start at the epoch), so cached segments
+    never need revalidation against disk.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, max_segment_bytes: int = 16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_segment_bytes = max_segment_bytes
+        self.entries = OrderedDict()
+        self.playlists = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def configure(self, max_bytes: int):
+        """Apply application configuration"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def get_playlist(self, path: str) -> Optional[dict]:
+        """
+        Current playlist at path, re-read only when its mtime changes.
+        Returns None if the playlist does not exist.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            entry = self.playlists.get(path)
+            if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                return entry
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        entry = parse_playlist(data)
+        entry.update({
+            'data': data,
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'etag': f'{stat.st_mtime_ns:x}-{len(data):x}'
+        })
+        with self._lock:
+            self.playlists[path] = entry
+
+        # Preload newly listed segments while they are hot
+        directory = os.path.dirname(path)
+        for uri in entry['uris']:
+            # Variant playlists of a master playlist are not segments
+            if '://' in uri or uri.startswith('/') or uri.split('?', 1)[0].endswith('.m3u8'):
+                continue
+            segment_path = os.path.normpath(os.path.join(directory, uri.split('?', 1)[0]))
+            if os.path.dirname(segment_path) == directory:
+                self.load_segment(segment_path)
+        return entry
+
+    def get_segment(self, path: str) -> Optional[dict]:
+        """Cached segment at path, or None on a miss"""
+        with self._lock:
+            entry = self.entries.get(path)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(path)
+            self.hits += 1
+            return entry
+
+    def load_segment(self, path: str) -> Optional[dict]:
+        """Read a segment from disk into the cache unless it is already present"""
+        with self._lock:
+            if path in self.entries:
+                return self.entries[path]
+        try:
+            stat = os.stat(path)
+            if stat.st_size > self.max_segment_bytes:
+                return None
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        entry = {
+            'data': data,
+            'etag': f'{stat.st_mtime_ns:x}-{len(data):x}',
+            'mtime': stat.st_mtime
+        }
+        with self._lock:
+            if path not in self.entries:
+                self.entries[path] = entry
+                self.size += len(data)
+                self._evict()
+        return entry
+
+    def forget(self, directory: str):
+        """Drop every cached file under a directory (stream stopped)"""
+        prefix = os.path.join(directory, '')
+        with self._lock:
+            for path in [p for p in self.entries if p.startswith(prefix)]:
+                self.size -= len(self.entries.pop(path)['data'])
+            for path in [p for p in self.playlists if p.startswith(prefix)]:
+                del self.playlists[path]
+
+    def _evict(self):
+        while self.size > self.max_bytes and self.entries:
+            _, entry = self.entries.popitem(last=False)
+            self.size -= len(entry['data'])
+
+    def stats(self) -> dict:
+        """Cache counters"""
+        with self._lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+def parse_playlist(data: bytes) -> dict:
+    """
+    Extract media sequence, target duration and referenced URIs from an
+    HLS media playlist
+    """
+    media_sequence = 0
+    target_duration = None
+    segments = 0
+    uris = []
+    for raw in data.decode('utf-8', 'replace').splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith('#'):
+            if line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+                media_sequence = int(line.split(':', 1)[1])
+            elif line.startswith('#EXT-X-TARGETDURATION:'):
+                target_duration = float(line.split(':', 1)[1])
+            uris.extend(_URI_ATTRIBUTE.findall(line))
+        else:
+            segments += 1
+            uris.append(line)
+    return {
+        'media_sequence': media_sequence,
+        'last_sequence': media_sequence + segments - 1,
+        'target_duration': target_duration,
+        'uris': uris
+    }
+
+# Global segment cache instance
+segment_cache = SegmentCache()
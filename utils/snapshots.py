@@ -0,0 +1,168 @@
+import hashlib
+import os
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+from utils.gop_cache import latest_gop
+from utils.stream_jobs import stream_jobs
+
+# Still image formats: MIME type and ffmpeg encoder arguments
+SNAPSHOT_FORMATS = {
+    'jpeg': ('image/jpeg', ['-pix_fmt', 'yuvj420p', '-c:v', 'mjpeg', '-q:v', '4', '-f', 'image2pipe']),
+    'webp': ('image/webp', ['-c:v', 'libwebp', '-quality', '75', '-f', 'webp']),
+}
+
+# Bounds for requested image sizes, in pixels
+MAX_SNAPSHOT_SIZE = 3840
+MIN_SNAPSHOT_SIZE = 16
+
+class SnapshotService:
+    """
+    Still images of running streams without another RTSP session.
+
+    Every HLS segment the ingest writes starts with a keyframe, so a
+    snapshot decodes just that one frame of the newest complete segment.
+    Images are cached per stream, size and format, and re-decoded only when
+    a newer segment exists: any number of viewers costs at most one small
+    ffmpeg run per segment interval.
+    """
+
+    def __init__(self, max_entries: int = 1024, decode_timeout: float = 10.0):
+        self.max_entries = max_entries
+        self.decode_timeout = decode_timeout
+        self.entries = OrderedDict()
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def _decode(self, path: Optional[str], data: Optional[bytes], width: Optional[int],
+                height: Optional[int], fmt: str) -> Optional[bytes]:
+        """Encode the first keyframe of a segment as an image"""
+        cmd = ['ffmpeg', '-nostdin', '-v', 'error', '-skip_frame', 'nokey', '-i', path or 'pipe:0',
+               '-frames:v', '1']
+        if width or height:
+            if width and height:
+                scale = f'scale={width}:{height}:force_original_aspect_ratio=decrease'
+            else:
+                scale = f'scale={width or -2}:{height or -2}'
+            cmd += ['-vf', scale]
+        cmd += SNAPSHOT_FORMATS[fmt][1] + ['pipe:1']
+        try:
+            result = subprocess.run(cmd, input=data, capture_output=True, timeout=self.decode_timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"Error decoding snapshot: {e}")
+            return None
+        if result.returncode != 0 or not result.stdout:
+            print(f"Error decoding snapshot: {result.stderr.decode('utf-8', 'replace').strip()}")
+            return None
+        return result.stdout
+
+    def _cached(self, key, signature, build) -> Optional[dict]:
+        """Entry for key if still built from signature, else rebuild it once"""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry['signature'] == signature:
+                self.entries.move_to_end(key)
+                return entry
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Concurrent requests for the same image wait for one decode
+        with key_lock:
+            with self._lock:
+                entry = self.entries.get(key)
+                if entry is not None and entry['signature'] == signature:
+                    return entry
+            data = build()
+            if data is None:
+                return None
+            entry = {
+                'signature': signature,
+                'data': data,
+                'etag': hashlib.sha1(data).hexdigest()
+            }
+            with self._lock:
+                self.entries[key] = entry
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    evicted, _ = self.entries.popitem(last=False)
+                    self._key_locks.pop(evicted, None)
+            return entry
+
+    def snapshot(self, stream_id: str, width: Optional[int] = None, height: Optional[int] = None,
+                 fmt: str = 'jpeg') -> Optional[dict]:
+        """
+        Latest keyframe of a stream as an image entry (data, etag), or None
+        if the stream has not written a segment yet
+        """
+        source = latest_gop(stream_id)
+        if source is None:
+            return None
+        name, path, data, _ = source
+        return self._cached(('snapshot', stream_id, width, height, fmt), name,
+                            lambda: self._decode(path, data, width, height, fmt))
+
+    def mosaic(self, stream_ids: List[Optional[str]], columns: int, tile_width: int,
+               fmt: str = 'jpeg') -> Optional[dict]:
+        """
+        Grid of the latest keyframes of many streams, row by row, in one
+        image. Tiles are decoded in parallel on the stream job pool; None
+        entries and streams without a snapshot yet are drawn as black tiles.
+        """
+        tile_height = max(MIN_SNAPSHOT_SIZE, round(tile_width * 9 / 16 / 2) * 2)
+        tiles = stream_jobs.map(
+            lambda stream_id: self.snapshot(stream_id, tile_width, tile_height, 'jpeg') if stream_id else None,
+            stream_ids)
+        signature = tuple(tile['etag'] if tile else None for tile in tiles)
+        key = ('mosaic', tuple(stream_ids), columns, tile_width, fmt)
+        return self._cached(key, signature,
+                            lambda: self._compose(tiles, columns, tile_width, tile_height, fmt))
+
+    def _compose(self, tiles: List[Optional[dict]], columns: int, tile_width: int, tile_height: int,
+                 fmt: str) -> Optional[bytes]:
+        """Stack tile images into a grid with ffmpeg's xstack filter"""
+        rows = -(-len(tiles) // columns)
+        with tempfile.TemporaryDirectory(prefix='mosaic-') as directory:
+            cmd = ['ffmpeg', '-nostdin', '-v', 'error']
+            graph = []
+            present = [index for index, tile in enumerate(tiles) if tile]
+            for input_index, index in enumerate(present):
+                path = os.path.join(directory, f'{index}.jpg')
+                with open(path, 'wb') as f:
+                    f.write(tiles[index]['data'])
+                cmd += ['-i', path]
+                graph.append(f'[{input_index}:v]scale={tile_width}:{tile_height}:force_original_aspect_ratio=decrease,'
+                             f'pad={tile_width}:{tile_height}:(ow-iw)/2:(oh-ih)/2,setsar=1,format=yuv420p[t{index}]')
+            blanks = rows * columns - len(present)
+            if blanks:
+                cmd += ['-f', 'lavfi', '-i', f'color=c=black:s={tile_width}x{tile_height}:d=1,format=yuv420p']
+                outputs = ''.join(f'[b{n}]' for n in range(blanks))
+                graph.append(f'[{len(present)}:v]split={blanks}{outputs}' if blanks > 1 else f'[{len(present)}:v]null[b0]')
+
+            labels, blank = [], 0
+            for index in range(rows * columns):
+                if index < len(tiles) and tiles[index]:
+                    labels.append(f'[t{index}]')
+                else:
+                    labels.append(f'[b{blank}]')
+                    blank += 1
+            if len(labels) == 1:
+                graph.append(f'{labels[0]}null[out]')
+            else:
+                layout = '|'.join(f'{(index % columns) * tile_width}_{(index // columns) * tile_height}'
+                                  for index in range(len(labels)))
+                graph.append(f"{''.join(labels)}xstack=inputs={len(labels)}:layout={layout}[out]")
+            cmd += ['-filter_complex', ';'.join(graph), '-map', '[out]', '-frames:v', '1']
+            cmd += SNAPSHOT_FORMATS[fmt][1] + ['pipe:1']
+            try:
+                result = subprocess.run(cmd, capture_output=True, timeout=self.decode_timeout)
+            except (OSError, subprocess.TimeoutExpired) as e:
+                print(f"Error composing mosaic: {e}")
+                return None
+        if result.returncode != 0 or not result.stdout:
+            print(f"Error composing mosaic: {result.stderr.decode('utf-8', 'replace').strip()}")
+            return None
+        return result.stdout
+
+# Global snapshot service instance
+snapshot_service = SnapshotService()
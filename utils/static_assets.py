@@ -0,0 +1,182 @@
+"""
+Fingerprinted, precompressed dashboard assets.
+
+    python -m utils.static_assets [--static-dir static]
+
+builds <static-dir>/dist: every asset copied under a content-hashed name
+(app.js -> app.3f2a9c1b7d4e.js) with .gz and, when the brotli module is
+installed, .br siblings, plus manifest.json mapping logical names to
+fingerprinted ones. /static/... references inside CSS and HTML are rewritten
+to the fingerprinted names; HTML pages keep their own names, since they are
+entry points. Run it after changing anything under static/.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import threading
+from typing import Optional
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # Brotli variants need the brotli module; gzip is always built
+    brotli = None
+
+MANIFEST_NAME = 'manifest.json'
+# Fingerprinted names never change content
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Anything else is revalidated against its ETag on every load
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+# Encodings in order of preference, with the suffix of their precompressed file
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+# Files too small to be worth compressing
+MIN_COMPRESS_BYTES = 256
+STATIC_REFERENCE = re.compile(r'/static/([\w\-./]+)')
+
+def _fingerprint(name: str, data: bytes) -> str:
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+def build(static_dir: str) -> dict:
+    """Write the fingerprinted, precompressed build to static_dir/dist; returns the manifest"""
+    output_dir = os.path.join(static_dir, 'dist')
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+
+    sources = []
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != output_dir]
+        sources += [os.path.relpath(os.path.join(root, f), static_dir).replace(os.sep, '/') for f in files]
+    # Referenced files first: CSS may reference images, HTML references everything
+    order = {'.css': 1, '.html': 2, '.htm': 2}
+    sources.sort(key=lambda name: (order.get(os.path.splitext(name)[1].lower(), 0), name))
+
+    assets = {}
+    files = {}
+    for name in sources:
+        with open(os.path.join(static_dir, name), 'rb') as f:
+            data = f.read()
+        ext = os.path.splitext(name)[1].lower()
+        if ext in ('.css', '.html', '.htm'):
+            text = data.decode('utf-8')
+            text = STATIC_REFERENCE.sub(lambda m: '/static/' + assets.get(m.group(1), m.group(1)), text)
+            data = text.encode('utf-8')
+        built_name = name if ext in ('.html', '.htm') else _fingerprint(name, data)
+        assets[name] = built_name
+
+        path = os.path.join(output_dir, built_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        encodings = []
+        if len(data) >= MIN_COMPRESS_BYTES:
+            compressed = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                compressed['br'] = brotli.compress(data, quality=11)
+            for encoding, suffix in ENCODINGS:
+                if encoding in compressed and len(compressed[encoding]) < len(data):
+                    with open(path + suffix, 'wb') as f:
+                        f.write(compressed[encoding])
+                    encodings.append(encoding)
+        files[built_name] = {
+            'etag': hashlib.sha256(data).hexdigest()[:16],
+            'encodings': encodings,
+            'immutable': built_name != name
+        }
+
+    manifest = {'assets': assets, 'files': files}
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+class StaticAssets:
+    """
+    Serves the dashboard's static files from the build when there is one:
+    the best precompressed encoding the client accepts (no compression per
+    request), an ETag per encoding and long-lived immutable caching for
+    fingerprinted names. Without a build, files are served as they are,
+    revalidated by ETag.
+    """
+
+    def __init__(self, static_dir: str = 'static'):
+        self.static_dir = static_dir
+        self.assets = {}
+        self.files = {}
+        self._lock = threading.Lock()
+
+    @property
+    def output_dir(self) -> str:
+        return os.path.join(self.static_dir, 'dist')
+
+    def configure(self, static_dir: str):
+        """Apply application configuration and load the build manifest, if any"""
+        self.static_dir = static_dir
+        self.reload()
+
+    def reload(self):
+        """Pick up a new build"""
+        try:
+            with open(os.path.join(self.output_dir, MANIFEST_NAME)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        with self._lock:
+            self.assets = manifest.get('assets', {})
+            self.files = manifest.get('files', {})
+
+    def url(self, name: str) -> str:
+        """URL of an asset for templates: fingerprinted when built"""
+        with self._lock:
+            return '/static/' + self.assets.get(name, name)
+
+    def _encoding(self, available: list) -> Optional[str]:
+        for encoding, _ in ENCODINGS:
+            if encoding in available and request.accept_encodings[encoding] > 0:
+                return encoding
+        return None
+
+    def serve(self, filename: str):
+        """Response for /static/<filename>"""
+        with self._lock:
+            built_name = self.assets.get(filename, filename)
+            entry = self.files.get(built_name)
+        if entry is None:
+            response = send_from_directory(self.static_dir, filename, conditional=True, etag=True)
+            response.headers['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+            return response
+
+        encoding = self._encoding(entry['encodings'])
+        suffix = dict(ENCODINGS)[encoding] if encoding else ''
+        mimetype = mimetypes.guess_type(built_name)[0] or 'application/octet-stream'
+        response = send_from_directory(self.output_dir, built_name + suffix, mimetype=mimetype,
+                                       conditional=True, etag=f"{entry['etag']}-{encoding or 'identity'}")
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if entry['encodings']:
+            response.vary.add('Accept-Encoding')
+        # A logical name (app.js) serves the current build but may change
+        immutable = entry['immutable'] and built_name == filename
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+        return response
+
+# Global static asset instance
+static_assets = StaticAssets()
+
+def main():
+    parser = argparse.ArgumentParser(description='Build fingerprinted, precompressed dashboard assets')
+    parser.add_argument('--static-dir', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static'))
+    args = parser.parse_args()
+    manifest = build(args.static_dir)
+    for name, built_name in sorted(manifest['assets'].items()):
+        encodings = manifest['files'][built_name]['encodings']
+        print(f"{name} -> {built_name}" + (f" ({', '.join(encodings)})" if encodings else ''))
+    if brotli is None:
+        print('brotli is not installed; only gzip variants were built')
+
+if __name__ == '__main__':
+    main()
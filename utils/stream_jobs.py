@@ -0,0 +1,177 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from utils.event_feed import event_feed
+from utils.on_demand import on_demand
+from utils.rtsp_handler import rtsp_handler
+from utils.segment_cache import segment_cache
+
+# Lifecycle operations a job can run on its streams
+JOB_ACTIONS = ('start', 'stop', 'restart')
+
+class StreamJobs:
+    """
+    Background start/stop/restart of streams.
+
+    A job fans its streams out over a shared thread pool and returns at
+    once; probing a source and waiting for ffmpeg to exit take seconds each,
+    so a request thread never runs them. Starting 100 cameras costs 100
+    pool tasks, not 100 blocked requests, and runs as wide as the pool.
+    Job state (queued, running, then succeeded, partial or failed; counts
+    and per-stream results) is kept for the most recent max_jobs jobs, and
+    a job.finished event is published when the last stream is done.
+    """
+
+    def __init__(self, handler, manager, max_workers: int = 32, max_jobs: int = 200):
+        self.handler = handler
+        self.on_demand = manager
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self._pending_overlays = None
+        self._applying_overlays = False
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def configure(self, max_workers: Optional[int] = None):
+        """Apply application configuration (pool size applies before first use)"""
+        with self._lock:
+            if max_workers and self._executor is None:
+                self.max_workers = max_workers
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='stream-job')
+        return self._executor
+
+    def submit(self, action: str, targets: List[dict]) -> dict:
+        """
+        Queue action for every target ({'stream_id', 'rtsp_url', 'options'};
+        stop needs only stream_id). Returns the job's initial status.
+        """
+        if action not in JOB_ACTIONS:
+            raise ValueError(f"Unknown job action: {action}")
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'action': action,
+            'state': 'queued',
+            'total': len(targets),
+            'completed': 0,
+            'failed': 0,
+            'created_at': time.time(),
+            'finished_at': None,
+            'streams': {target['stream_id']: {'state': 'queued', 'error': None} for target in targets}
+        }
+        with self._lock:
+            self.jobs[job_id] = job
+            # Forget the oldest finished jobs beyond the limit
+            for old_id in [old_id for old_id, old in self.jobs.items() if old['finished_at']]:
+                if len(self.jobs) <= self.max_jobs:
+                    break
+                del self.jobs[old_id]
+            pool = self._pool()
+        if not targets:
+            self._finish(job)
+        for target in targets:
+            pool.submit(self._run, job, action, target)
+        return self.get(job_id)
+
+    def map(self, fn, items: list) -> list:
+        """fn applied to every item on the shared pool, results in order"""
+        with self._lock:
+            pool = self._pool()
+        return list(pool.map(fn, items))
+
+    def update_overlays(self, overlays: list):
+        """
+        Apply an overlay set to the encoders in the background: rasterizing
+        logos, zmq round trips and encoder restarts never run on a request
+        thread. Sets queued while one is being applied collapse into the
+        newest, and are applied in order by a single pool task.
+        """
+        with self._lock:
+            self._pending_overlays = overlays
+            if self._applying_overlays:
+                return
+            self._applying_overlays = True
+            pool = self._pool()
+        pool.submit(self._apply_overlays)
+
+    def _apply_overlays(self):
+        while True:
+            with self._lock:
+                overlays, self._pending_overlays = self._pending_overlays, None
+                if overlays is None:
+                    self._applying_overlays = False
+                    return
+            try:
+                self.handler.update_overlays(overlays)
+            except Exception as e:
+                print(f"Error applying overlays: {e}")
+
+    def _run(self, job: dict, action: str, target: dict):
+        stream_id = target['stream_id']
+        with self._lock:
+            job['state'] = 'running'
+            job['streams'][stream_id]['state'] = 'running'
+        error = None
+        # Explicitly started streams stay up until explicitly stopped; a
+        # restart keeps whatever the stream had
+        pinned = action == 'start' or stream_id in self.on_demand.pinned
+        try:
+            if action in ('stop', 'restart'):
+                if action == 'stop':
+                    self.on_demand.release(stream_id)
+                if not self.handler.stop_stream(stream_id):
+                    error = 'Failed to stop stream'
+                segment_cache.forget(self.on_demand.output_dir(stream_id))
+            if action in ('start', 'restart') and error is None:
+                error = self.on_demand.start(stream_id, target['rtsp_url'], pinned=pinned, **target['options'])
+        except Exception as e:
+            print(f"Error running {action} job for stream {stream_id}: {e}")
+            error = str(e)
+
+        with self._lock:
+            job['streams'][stream_id] = {'state': 'failed' if error else 'succeeded', 'error': error}
+            job['completed'] += 1
+            if error:
+                job['failed'] += 1
+            done = job['completed'] == job['total']
+        if done:
+            self._finish(job)
+
+    def _finish(self, job: dict):
+        with self._lock:
+            if not job['failed']:
+                job['state'] = 'succeeded'
+            else:
+                job['state'] = 'failed' if job['failed'] == job['total'] else 'partial'
+            job['finished_at'] = time.time()
+        event_feed.publish('job.finished', self._summary(job))
+
+    def _summary(self, job: dict) -> dict:
+        summary = {key: value for key, value in job.items() if key != 'streams'}
+        summary['progress'] = round(job['completed'] / job['total'], 3) if job['total'] else 1.0
+        return summary
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Status of a job with per-stream results, or None if unknown or expired"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            status = self._summary(job)
+            status['streams'] = {stream_id: dict(result) for stream_id, result in job['streams'].items()}
+            return status
+
+    def recent(self, limit: int = 50) -> list:
+        """Summaries of the most recent jobs, newest first"""
+        with self._lock:
+            return [self._summary(job) for job in list(self.jobs.values())[::-1][:limit]]
+
+# Global stream job runner instance
+stream_jobs = StreamJobs(rtsp_handler, on_demand)
@@ -0,0 +1,177 @@
+import os
+import threading
+from multiprocessing.managers import BaseManager
+from typing import Optional
+from utils.event_feed import collection_versions, event_feed
+from utils.on_demand import on_demand
+from utils.rtsp_handler import rtsp_handler
+from utils.stream_jobs import stream_jobs
+
+class StreamService:
+    """
+    Stream operations used by the web layer. Runs in the process that owns
+    the ffmpeg encoders: the web process itself by default, or the stream
+    supervisor when web workers are scaled out.
+    """
+
+    def __init__(self, handler, manager, jobs):
+        self.handler = handler
+        self.on_demand = manager
+        self.jobs = jobs
+
+    def touch(self, stream_id: str, viewer: Optional[str] = None):
+        self.on_demand.touch(stream_id, viewer)
+
+    def ensure_started(self, stream_id: str, rtsp_url: str, pinned: bool = False, **options) -> bool:
+        return self.on_demand.ensure_started(stream_id, rtsp_url, pinned=pinned, **options)
+
+    def release(self, stream_id: str):
+        self.on_demand.release(stream_id)
+
+    def start_error(self, stream_id: str) -> Optional[dict]:
+        return self.on_demand.start_error(stream_id)
+
+    def get_activity(self, stream_id: str) -> Optional[dict]:
+        return self.on_demand.get_activity(stream_id)
+
+    def stop_stream(self, stream_id: str) -> bool:
+        return self.handler.stop_stream(stream_id)
+
+    def submit_job(self, action: str, targets: list) -> dict:
+        return self.jobs.submit(action, targets)
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        return self.jobs.get(job_id)
+
+    def recent_jobs(self, limit: int = 50) -> list:
+        return self.jobs.recent(limit)
+
+    def get_stream_info(self, stream_id: str) -> Optional[dict]:
+        return self.handler.get_stream_info(stream_id)
+
+    def get_stream_summary(self, stream_id: str) -> Optional[dict]:
+        return self.handler.get_stream_summary(stream_id)
+
+    def stream_metrics(self) -> list:
+        return self.handler.stream_metrics()
+
+    def capacity(self) -> dict:
+        return self.handler.scheduler.status()
+
+    def update_overlays(self, overlays: list):
+        self.jobs.update_overlays(overlays)
+
+    def probe_many(self, rtsp_urls: list, timeout: float, force: bool = False) -> dict:
+        return self.handler.probes.probe_many(rtsp_urls, timeout=timeout, force=force)
+
+    def publish(self, event_type: str, data: dict) -> int:
+        return event_feed.publish(event_type, data)
+
+    def events_since(self, last_id: Optional[int], timeout: float = 15.0) -> tuple:
+        return event_feed.since(last_id, timeout)
+
+    def collection_version(self, collection: str) -> int:
+        return collection_versions.version(collection)
+
+    def record_write(self, collection: str, deleted_ids: list = ()) -> int:
+        return collection_versions.record_write(collection, deleted_ids)
+
+    def deleted_since(self, collection: str, since) -> tuple:
+        return collection_versions.deleted_since(collection, since)
+
+    def runtime_state(self, stream_ids: list) -> dict:
+        """Live state of many streams in one call: runtime, activity, start_error"""
+        return {
+            stream_id: {
+                'runtime': self.handler.get_stream_summary(stream_id),
+                'activity': self.on_demand.get_activity(stream_id),
+                'start_error': self.on_demand.start_error(stream_id)
+            }
+            for stream_id in stream_ids
+        }
+
+    def ping(self) -> int:
+        """Process id of the encoder owner"""
+        return os.getpid()
+
+class SupervisorManager(BaseManager):
+    """Serves the StreamService of the supervisor process on a Unix socket"""
+
+# Client side of the 'streams' typeid; run_supervisor binds it to the service
+SupervisorManager.register('streams')
+
+class StreamRegistry:
+    """
+    Entry point for stream state in the web layer.
+
+    With a single web process the StreamService runs in-process. Under
+    gunicorn with several workers, one supervisor process (run_supervisor)
+    owns every encoder and the workers call it over a local Unix socket, so
+    all of them see the same streams and never duplicate an encoder. Calls
+    are forwarded by name: registry.touch(...) runs StreamService.touch.
+    """
+
+    def __init__(self, service: StreamService):
+        self.local_service = service
+        self.socket_path: Optional[str] = None
+        self.authkey: Optional[bytes] = None
+        self._proxy = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_remote(self) -> bool:
+        return self.socket_path is not None
+
+    def connect(self, socket_path: str, authkey: bytes):
+        """Forward calls to the supervisor at socket_path (connects lazily)"""
+        with self._lock:
+            self.socket_path = socket_path
+            self.authkey = authkey
+            self._proxy = None
+
+    def _service(self, reconnect: bool = False):
+        if not self.is_remote:
+            return self.local_service
+        with self._lock:
+            # Connections do not survive a fork; gunicorn forks after loading the app
+            if self._proxy is None or reconnect or self._pid != os.getpid():
+                manager = SupervisorManager(address=self.socket_path, authkey=self.authkey)
+                manager.connect()
+                self._proxy = manager.streams()
+                self._pid = os.getpid()
+            return self._proxy
+
+    def __getattr__(self, name: str):
+        if name.startswith('_') or not hasattr(StreamService, name):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            try:
+                return getattr(self._service(), name)(*args, **kwargs)
+            except (ConnectionError, EOFError, OSError):
+                if not self.is_remote:
+                    raise
+                # The supervisor restarted; retry once on a fresh connection
+                return getattr(self._service(reconnect=True), name)(*args, **kwargs)
+        return call
+
+def run_supervisor(socket_path: str, authkey: bytes):
+    """Serve the in-process StreamService to web workers until killed"""
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    service = registry.local_service
+    SupervisorManager.register('streams', callable=lambda: service)
+    manager = SupervisorManager(address=socket_path, authkey=authkey)
+    server = manager.get_server()
+    print(f"Stream supervisor {os.getpid()} listening on {socket_path}")
+    server.serve_forever()
+
+# Global registry; local until connect() points it at a supervisor
+registry = StreamRegistry(StreamService(rtsp_handler, on_demand, stream_jobs))
+
+if __name__ == '__main__':
+    # python -m utils.stream_registry: run the encoder-owning supervisor
+    from main import create_app
+    app = create_app(supervisor=True)
+    run_supervisor(app.config["STREAM_SUPERVISOR_SOCKET"], app.config["STREAM_SUPERVISOR_AUTHKEY"])